@@ -2,26 +2,43 @@
 
 from __future__ import annotations
 
+import atexit
 import base64
+import bisect
 import csv
+import gzip
+import hashlib
 import json
 import os
+import queue
 import re
 import sqlite3
 import ipaddress
-from collections import defaultdict
-from dataclasses import dataclass, field
+import threading
+import time
+from array import array
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta, timezone
 from functools import lru_cache
-from math import asin, ceil, cos, radians, sin, sqrt
+from math import asin, ceil, cos, isfinite, log, pi, radians, sin, sqrt, tan
 from pathlib import Path
-from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
-from urllib.error import HTTPError, URLError
-from urllib.parse import parse_qsl, urlparse
-from urllib.request import Request, urlopen
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, quote, urlparse
 
 import requests
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional speed-up
+    np = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional compression
+    brotli = None
+
 from flask import (
     Flask,
     abort,
@@ -32,11 +49,24 @@ from flask import (
     render_template,
     request,
     session,
-    send_from_directory,
+    send_file,
     url_for,
 )
-from werkzeug.security import check_password_hash, generate_password_hash
+from werkzeug.datastructures import MultiDict
+from werkzeug.security import check_password_hash, generate_password_hash, safe_join
 from werkzeug.utils import secure_filename
+from werkzeug.utils import send_file as werkzeug_send_file
+
+from tile_store import (
+    TILE_CACHE_ROOT,
+    TILE_INDEX_PATH,
+    TILE_URL_TEMPLATE,
+    TILE_USER_AGENT,
+    StoredTile,
+    TileCacheIndex,
+    open_tile_store,
+    tile_etag,
+)
 
 
 APP_ROOT = Path(__file__).resolve().parent
@@ -49,8 +79,8 @@ DATABASE = Path(
 DATABASE.parent.mkdir(parents=True, exist_ok=True)
 UPLOAD_ROOT = APP_ROOT.joinpath("static", "uploads")
 USER_DOC_ROOT = UPLOAD_ROOT.joinpath("user_docs")
-TILE_CACHE_ROOT = APP_ROOT.joinpath("tile_cache")
 STATE_CODE_FILE = APP_ROOT.joinpath("state_codes.csv")
+PINCODE_FILE = APP_ROOT.joinpath("IN.csv")
 INDIA_TZ = timezone(timedelta(hours=5, minutes=30))
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
 DOCUMENT_EXTENSIONS = {"png", "jpg", "jpeg", "pdf"}
@@ -83,18 +113,131 @@ DEFAULT_FUEL_TYPES: List[str] = [
     "LPG",
 ]
 DELIVERY_DISTANCE_CHOICES: List[int] = [25, 50, 100, 200]
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LATITUDE = 111.195
+CAR_GRID_CELL_DEGREES = 0.25
+CAR_GRID_REFRESH_SECONDS = 300
+REVERSE_GEOCODE_MAX_KM = 100.0
+SEARCH_CACHE_CELL_DEGREES = 0.02
+SEARCH_CACHE_INVALIDATION_DEGREES = 0.05
+SEARCH_CACHE_MAX_INVALIDATION_CELLS = 36
+# Level n invalidation cells are SEARCH_CACHE_INVALIDATION_DEGREES * 2**n wide; 12 spans the globe.
+SEARCH_CACHE_MAX_INVALIDATION_LEVEL = 12
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("CARRENTAL_SEARCH_CACHE_ENTRIES", "512"))
+SEARCH_CACHE_TTL_SECONDS = float(os.environ.get("CARRENTAL_SEARCH_CACHE_TTL", "60"))
+SEARCH_DEFAULT_RADIUS_KM = 10.0
+SEARCH_MAX_RADIUS_KM = 200.0
+SEARCH_API_DEFAULT_PAGE_SIZE = 20
+SEARCH_API_MAX_PAGE_SIZE = 100
+DEFAULT_TRIP_HOURS = 4
+NEAREST_DEFAULT_COUNT = 20
+NEAREST_MAX_COUNT = 100
+NEAREST_START_RADIUS_KM = 5.0
+NEAREST_MAX_RADIUS_KM = 640.0
+CITY_SUGGEST_DEFAULT_RESULTS = 8
+CITY_SUGGEST_MAX_RESULTS = 20
+CITY_SUGGEST_CACHE_SECONDS = 300
+# Admin fleet map: cluster cells are 1/4 of a 256 px tile (64 px) at each zoom.
+FLEET_CLUSTER_CELL_SHIFT = 2
+FLEET_CLUSTER_MAX_ZOOM = 13
+FLEET_CLUSTER_REFRESH_SECONDS = 60
+FLEET_MAP_MAX_VEHICLES = 2000
+# Search demand: events are written off the request path in batches and rolled
+# up into (geohash, hour) buckets; precision 5 cells are roughly 5 km across.
+SEARCH_DEMAND_GEOHASH_PRECISION = 5
+SEARCH_DEMAND_DEFAULT_HOURS = 24 * 7
+SEARCH_DEMAND_MAX_HOURS = 24 * 90
+SEARCH_EVENT_BATCH_SIZE = 200
+SEARCH_EVENT_FLUSH_SECONDS = float(os.environ.get("CARRENTAL_SEARCH_EVENT_FLUSH", "2"))
+SEARCH_EVENT_MAX_PENDING = int(os.environ.get("CARRENTAL_SEARCH_EVENT_MAX_PENDING", "10000"))
+# Rentals that hold a car. idx_rentals_open_windows is a partial index over
+# exactly these rows, so queries must repeat the predicate verbatim to use it.
+OPEN_RENTAL_PREDICATE = "rentals.status IN ('booked', 'active')"
+# Overlap with a requested [start, end) window; parameters are (end, start).
+# A trip that is already active keeps the car until it is completed, even
+# when it runs past its scheduled end.
+RENTAL_OVERLAP_PREDICATE = (
+    "rentals.start_time < ?"
+    " AND (rentals.status = 'active' OR COALESCE(rentals.end_time, rentals.start_time) > ?)"
+)
+PINCODE_MATCH_MAX_KM = 15.0
+# Radius-search prefilter: "rtree" (shared SQLite R*Tree), "grid" (per-worker
+# in-memory grid) or "none" (scan every active car).
+CAR_GEO_PREFILTER = os.environ.get("CARRENTAL_CAR_GEO_PREFILTER", "rtree").strip().lower()
+# How stored tiles and uploads reach the client: "python" reads tiles into the
+# worker; "sendfile" passes the open file to the WSGI server's wsgi.file_wrapper
+# (gunicorn sends it with os.sendfile); "x-accel" and "x-sendfile" answer with an
+# empty body naming the file, and nginx (an ``internal`` location aliased to the
+# tile cache / upload folder) or Apache/lighttpd send it instead.
+FILE_SERVING_MODE = os.environ.get("CARRENTAL_FILE_SERVING", "python").strip().lower()
+X_ACCEL_TILES_LOCATION = os.environ.get("CARRENTAL_X_ACCEL_TILES", "/_internal/tiles/")
+X_ACCEL_UPLOADS_LOCATION = os.environ.get("CARRENTAL_X_ACCEL_UPLOADS", "/_internal/uploads/")
 MAX_TILE_ZOOM = 19
-OSM_TILE_TEMPLATE = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
-OSM_TILE_USER_AGENT = "CarRentalNTravel/1.0 (support@carrentalntravel.com)"
+TILE_MEMORY_CACHE_BYTES = int(os.environ.get("CARRENTAL_TILE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+# Cross-worker marker files for tiles being fetched upstream. A marker older than
+# the stale limit (longer than the upstream timeout) belongs to a dead worker.
+TILE_LOCK_ROOT = DATA_ROOT.joinpath("tile_locks")
+TILE_LOCK_STALE_SECONDS = 15.0
+TILE_LOCK_POLL_SECONDS = 0.05
+TILE_FETCH_WAIT_SECONDS = 10.0
+TILE_UPSTREAM_TIMEOUT_SECONDS = 8
+TILE_UPSTREAM_CONNECT_TIMEOUT_SECONDS = 3.05
+TILE_UPSTREAM_POOL_SIZE = int(os.environ.get("CARRENTAL_TILE_UPSTREAM_POOL", "8"))
+# Circuit breaker: once half of the last 20 upstream calls failed (at least 10
+# seen), skip upstream for 30 s, then let a single trial request through.
+TILE_BREAKER_WINDOW = 20
+TILE_BREAKER_MIN_CALLS = 10
+TILE_BREAKER_FAILURE_RATIO = 0.5
+TILE_BREAKER_COOLDOWN_SECONDS = 30.0
+# Negative cache: tiles upstream reported missing, or failed to deliver, are
+# answered with EMPTY_TILE_BYTES without another attempt for a short while.
+TILE_MISSING_TTL_SECONDS = 300.0
+TILE_FAILED_TTL_SECONDS = 30.0
+TILE_NEGATIVE_CACHE_MAX_ENTRIES = 10000
+# Disk budget for stored tiles (0 = unlimited). When exceeded, the evictor trims
+# least recently used tiles down to 90% of the budget; with
+# CARRENTAL_TILE_EVICT_HIGH_ZOOM set, tiles at that zoom or deeper go first.
+TILE_CACHE_MAX_BYTES = int(os.environ.get("CARRENTAL_TILE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+TILE_CACHE_TRIM_RATIO = 0.9
+TILE_EVICT_HIGH_ZOOM_FROM = (
+    int(os.environ["CARRENTAL_TILE_EVICT_HIGH_ZOOM"]) if os.environ.get("CARRENTAL_TILE_EVICT_HIGH_ZOOM") else None
+)
+TILE_EVICT_INTERVAL_SECONDS = 60.0
+TILE_BROWSER_MAX_AGE_SECONDS = 86400
+# Stale-while-revalidate: tiles stored longer ago than this are still served
+# at once, and a background pool fetches a fresh copy for later requests.
+TILE_STALE_WHILE_REVALIDATE = os.environ.get("CARRENTAL_TILE_SWR", "1").strip() not in ("0", "false", "no")
+TILE_STALE_AFTER_SECONDS = float(os.environ.get("CARRENTAL_TILE_STALE_SECONDS", str(30 * 86400)))
+TILE_REFRESH_WORKERS = 2
+TILE_REFRESH_RETRY_SECONDS = 600.0
+OSM_TILE_TEMPLATE = TILE_URL_TEMPLATE
+OSM_TILE_USER_AGENT = TILE_USER_AGENT
 EMPTY_TILE_BYTES = base64.b64decode(
     "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR4nGMAAQAABQABDQottAAAAABJRU5ErkJggg=="
 )
 
 IP_LOOKUP_ENDPOINT = "https://ipapi.co/{ip}/json/"
 IP_LOOKUP_TIMEOUT = 4.0
+# Most unknown IPs a visit-log batch looks up; the rest are stored without a location.
+IP_LOOKUP_MAX_PER_BATCH = 20
 VISIT_LOG_MAX_USER_AGENT = 400
 VISIT_LOG_MAX_REFERER = 500
-VISIT_LOG_EXCLUDE_PREFIXES: Tuple[str, ...] = ("/static/", "/uploads/", "/favicon", "/healthz")
+# Page views only: JSON/XHR endpoints fire per keystroke or map move and would
+# flood visit_logs (and the IP lookup) with one row each.
+VISIT_LOG_EXCLUDE_PREFIXES: Tuple[str, ...] = (
+    "/static/",
+    "/uploads/",
+    "/favicon",
+    "/healthz",
+    "/api/",
+    "/cities.",
+    "/admin/map/",
+)
+# Visits are queued by the request and written, with IP locations resolved, by
+# a background writer; past VISIT_EVENT_MAX_PENDING queued rows they are dropped.
+VISIT_EVENT_BATCH_SIZE = 200
+VISIT_EVENT_FLUSH_SECONDS = float(os.environ.get("CARRENTAL_VISIT_EVENT_FLUSH", "2"))
+VISIT_EVENT_MAX_PENDING = int(os.environ.get("CARRENTAL_VISIT_EVENT_MAX_PENDING", "10000"))
 BOT_USER_AGENT_KEYWORDS: Tuple[str, ...] = (
     "bot",
     "spider",
@@ -190,6 +333,7 @@ DEFAULT_STATE_CODES: Dict[str, str] = {
 UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
 USER_DOC_ROOT.mkdir(parents=True, exist_ok=True)
 TILE_CACHE_ROOT.mkdir(parents=True, exist_ok=True)
+TILE_LOCK_ROOT.mkdir(parents=True, exist_ok=True)
 
 COMPANY_SUPPORT_EMAIL = "support@carrentalntravel.com"
 COMPANY_SUPPORT_PHONE = "+91 98540 50567"
@@ -222,42 +366,546 @@ app.config.update(
 app.logger.setLevel("INFO")
 
 
-def get_tile_cache_path(z: int, x: int, y: int) -> Path:
-    return TILE_CACHE_ROOT.joinpath(str(z), str(x), f"{y}.png")
+# Backend and location come from CARRENTAL_TILE_CACHE_BACKEND / CARRENTAL_TILE_MBTILES_PATH;
+# ``python tile_store.py migrate`` imports an existing tile_cache tree into MBTiles.
+tile_store = open_tile_store()
 
 
-def fetch_osm_tile(z: int, x: int, y: int) -> Optional[bytes]:
-    if z < 0 or z > MAX_TILE_ZOOM:
-        return None
-    limit = 2 ** z
-    if not (0 <= x < limit and 0 <= y < limit):
-        return None
-    cache_path = get_tile_cache_path(z, x, y)
-    if cache_path.exists():
+class TileMemoryCache:
+    """Byte-bounded LRU of tile payloads kept in front of the on-disk tile cache.
+
+    Each worker holds its own copy. A stale tile served from here schedules a
+    background refresh; whichever worker refreshes it replaces its own entry, and
+    the others pick the new copy up from the tile store when their refresh runs.
+    A single tile larger than an eighth of the budget is never kept, so one
+    oversized payload cannot flush the whole cache.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[int, int, int], StoredTile]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[int, int, int]) -> Optional[StoredTile]:
+        with self._lock:
+            tile = self._entries.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def put(self, key: Tuple[int, int, int], tile: StoredTile) -> None:
+        if len(tile.data) > self.max_bytes // 8:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.data)
+            self._entries[key] = tile
+            self._size += len(tile.data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.data)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "tiles": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+tile_memory_cache = TileMemoryCache(TILE_MEMORY_CACHE_BYTES)
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result."""
+
+    class _Call:
+        __slots__ = ("done", "result", "error")
+
+        def __init__(self) -> None:
+            self.done = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self) -> None:
+        self._calls: Dict[Any, "SingleFlight._Call"] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def run(self, key: Any, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.followers}
+
+
+tile_fetches = SingleFlight()
+tile_fetch_counters: Dict[str, int] = {
+    "upstream": 0,
+    "waited_on_other_worker": 0,
+    "stale_locks": 0,
+    "refresh_queued": 0,
+    "refreshed": 0,
+    "refreshed_from_store": 0,
+    "refresh_failed": 0,
+    "short_circuited": 0,
+}
+
+
+def acquire_tile_lock(z: int, x: int, y: int) -> Optional[Path]:
+    """Create the cross-worker marker for a tile; None when another worker holds it."""
+    path = TILE_LOCK_ROOT.joinpath(f"{z}-{x}-{y}.lock")
+    for _ in range(2):
         try:
-            return cache_path.read_bytes()
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                age = time.time() - path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if age < TILE_LOCK_STALE_SECONDS:
+                return None
+            tile_fetch_counters["stale_locks"] += 1
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            continue
         except OSError:
-            pass
-    url = OSM_TILE_TEMPLATE.format(z=z, x=x, y=y)
-    request = Request(url, headers={"User-Agent": OSM_TILE_USER_AGENT})
+            # Without a usable lock directory, fall back to fetching without coordination.
+            return TILE_LOCK_ROOT
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return path
+    return None
+
+
+def release_tile_lock(path: Path) -> None:
+    if path == TILE_LOCK_ROOT:
+        return
     try:
-        with urlopen(request, timeout=8) as response:
-            if getattr(response, "status", 200) != 200:
+        path.unlink()
+    except OSError:
+        pass
+
+
+class CircuitBreaker:
+    """Fail fast while an upstream keeps failing.
+
+    Closed: calls go through and outcomes are kept for the last ``window`` calls.
+    Open: once the failure ratio crosses the threshold, calls are refused until
+    the cooldown has passed. Half-open: one trial call is let through; success
+    closes the breaker, failure opens it for another cooldown.
+    """
+
+    def __init__(self, window: int, min_calls: int, failure_ratio: float, cooldown_seconds: float) -> None:
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.cooldown_seconds = cooldown_seconds
+        self._outcomes: "deque[bool]" = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                self._trial_in_flight = False
+                if success:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                else:
+                    self._opened_at = time.monotonic()
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_ratio * len(self._outcomes):
+                self._opened_at = time.monotonic()
+                self.opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "recent_calls": len(self._outcomes),
+            "recent_failures": self._outcomes.count(False),
+            "times_opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class TileNegativeCache:
+    """Short-lived memory of tiles that upstream reported missing or failed to serve."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int, int], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def get(self, key: Tuple[int, int, int]) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
                 return None
-            data = response.read()
-    except (HTTPError, URLError, TimeoutError):
-        if cache_path.exists():
-            try:
-                return cache_path.read_bytes()
-            except OSError:
+            if entry[0] < time.monotonic():
+                del self._entries[key]
                 return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple[int, int, int], reason: str, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + ttl_seconds, reason)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits}
+
+
+tile_breaker = CircuitBreaker(
+    TILE_BREAKER_WINDOW, TILE_BREAKER_MIN_CALLS, TILE_BREAKER_FAILURE_RATIO, TILE_BREAKER_COOLDOWN_SECONDS
+)
+tile_negative_cache = TileNegativeCache(TILE_NEGATIVE_CACHE_MAX_ENTRIES)
+_tile_session: Optional[Tuple[int, requests.Session, requests.adapters.HTTPAdapter]] = None
+_tile_session_lock = threading.Lock()
+
+
+def get_tile_session() -> Tuple[requests.Session, requests.adapters.HTTPAdapter]:
+    """Keep-alive session for the tile server, created once per worker process."""
+    global _tile_session
+    current = _tile_session
+    if current is None or current[0] != os.getpid():
+        with _tile_session_lock:
+            current = _tile_session
+            if current is None or current[0] != os.getpid():
+                session = requests.Session()
+                session.headers["User-Agent"] = OSM_TILE_USER_AGENT
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1, pool_maxsize=TILE_UPSTREAM_POOL_SIZE, max_retries=0
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                current = _tile_session = (os.getpid(), session, adapter)
+    return current[1], current[2]
+
+
+def tile_upstream_stats() -> Dict[str, Any]:
+    pools = []
+    if _tile_session is not None and _tile_session[0] == os.getpid():
+        manager = _tile_session[2].poolmanager
+        pools = [manager.pools[key] for key in manager.pools.keys()]
+    return {
+        "pool_size": TILE_UPSTREAM_POOL_SIZE,
+        "hosts": len(pools),
+        "connections_opened": sum(pool.num_connections for pool in pools),
+        "requests_sent": sum(pool.num_requests for pool in pools),
+        # urllib3 pre-fills each pool with None placeholders; count real connections only.
+        "idle_connections": sum(
+            sum(1 for conn in list(pool.pool.queue) if conn is not None) for pool in pools if pool.pool is not None
+        ),
+        "breaker": tile_breaker.stats(),
+        "negative_cache": tile_negative_cache.stats(),
+    }
+
+
+def download_osm_tile(z: int, x: int, y: int) -> Optional[bytes]:
+    """GET a tile through the pooled session; None when missing, failing or short-circuited."""
+    if not tile_breaker.allow():
+        tile_fetch_counters["short_circuited"] += 1
         return None
+    session, _ = get_tile_session()
+    tile_fetch_counters["upstream"] += 1
     try:
-        cache_path.parent.mkdir(parents=True, exist_ok=True)
-        cache_path.write_bytes(data)
-    except OSError:
-        pass
-    return data
+        response = session.get(
+            OSM_TILE_TEMPLATE.format(z=z, x=x, y=y),
+            timeout=(TILE_UPSTREAM_CONNECT_TIMEOUT_SECONDS, TILE_UPSTREAM_TIMEOUT_SECONDS),
+        )
+    except requests.RequestException:
+        tile_breaker.record(False)
+        tile_negative_cache.put((z, x, y), "failed", TILE_FAILED_TTL_SECONDS)
+        return None
+    if response.status_code == 200 and response.content:
+        tile_breaker.record(True)
+        return response.content
+    if response.status_code in (404, 410):
+        # The server is healthy; the tile just does not exist.
+        tile_breaker.record(True)
+        tile_negative_cache.put((z, x, y), "missing", TILE_MISSING_TTL_SECONDS)
+        return None
+    tile_breaker.record(False)
+    tile_negative_cache.put((z, x, y), "failed", TILE_FAILED_TTL_SECONDS)
+    return None
+
+
+class TileCacheJanitor:
+    """Keeps the tile cache within ``TILE_CACHE_MAX_BYTES``.
+
+    Requests only note which tiles they read or stored in a dict. A daemon thread
+    in each worker folds those notes into the sidecar ``TileCacheIndex`` every
+    ``TILE_EVICT_INTERVAL_SECONDS`` and trims the store when the index shows it
+    is over budget. The first run indexes whatever the store already holds.
+    """
+
+    def __init__(self, index_path: Path, interval_seconds: float) -> None:
+        self.index_path = index_path
+        self.interval_seconds = interval_seconds
+        self._accesses: Dict[Tuple[int, int, int], int] = {}
+        self._writes: Dict[Tuple[int, int, int], Tuple[int, int]] = {}
+        self._index: Optional[TileCacheIndex] = None
+        self._run_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self.runs = 0
+        self.evicted_tiles = 0
+        self.evicted_bytes = 0
+        self.indexed_tiles = 0
+        self.indexed_bytes = 0
+        self.last_run_at: Optional[float] = None
+
+    def touched(self, key: Tuple[int, int, int]) -> None:
+        self._accesses[key] = int(time.time())
+        self._ensure_started()
+
+    def stored(self, key: Tuple[int, int, int], tile: StoredTile) -> None:
+        self._writes[key] = (len(tile.data), tile.modified)
+        self._ensure_started()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tile-evictor", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                app.logger.exception("Tile cache eviction failed")
+            time.sleep(self.interval_seconds)
+
+    def run_once(self) -> Tuple[int, int]:
+        """Flush pending notes, trim if over budget and return ``(tiles, bytes)`` evicted."""
+        with self._run_lock:
+            store = tile_store
+            index = self._index
+            if index is None or index.location != store.location:
+                index = self._index = TileCacheIndex(self.index_path, store.location)
+            if not index.is_built:
+                index.rebuild(store)
+            # Swapping the dicts may drop a note racing with the swap; that only costs LRU precision.
+            accesses, self._accesses = self._accesses, {}
+            writes, self._writes = self._writes, {}
+            index.record(
+                writes=[(z, x, y, size, modified) for (z, x, y), (size, modified) in writes.items()],
+                accesses=[(z, x, y, at) for (z, x, y), at in accesses.items()],
+            )
+            evicted = (0, 0)
+            self.indexed_tiles, self.indexed_bytes = index.usage()
+            if TILE_CACHE_MAX_BYTES and self.indexed_bytes > TILE_CACHE_MAX_BYTES:
+                evicted = index.trim(
+                    store, int(TILE_CACHE_MAX_BYTES * TILE_CACHE_TRIM_RATIO), TILE_EVICT_HIGH_ZOOM_FROM
+                )
+                self.evicted_tiles += evicted[0]
+                self.evicted_bytes += evicted[1]
+                self.indexed_tiles, self.indexed_bytes = index.usage()
+            self.runs += 1
+            self.last_run_at = time.time()
+            return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_bytes": TILE_CACHE_MAX_BYTES,
+            "evict_high_zoom_from": TILE_EVICT_HIGH_ZOOM_FROM,
+            "indexed_tiles": self.indexed_tiles,
+            "indexed_bytes": self.indexed_bytes,
+            "evicted_tiles": self.evicted_tiles,
+            "evicted_bytes": self.evicted_bytes,
+            "runs": self.runs,
+            "last_run_seconds_ago": round(time.time() - self.last_run_at, 1) if self.last_run_at else None,
+            "pending_notes": len(self._accesses) + len(self._writes),
+        }
+
+
+tile_cache_janitor = TileCacheJanitor(TILE_INDEX_PATH, TILE_EVICT_INTERVAL_SECONDS)
+
+
+def store_downloaded_tile(z: int, x: int, y: int, data: bytes) -> StoredTile:
+    try:
+        tile = tile_store.write(z, x, y, data)
+    except (OSError, sqlite3.Error):
+        return StoredTile(data, int(time.time()))
+    tile_cache_janitor.stored((z, x, y), tile)
+    return tile
+
+
+def _fetch_missing_tile(z: int, x: int, y: int) -> Optional[StoredTile]:
+    """Fetch a tile that is not stored yet, unless another worker is already fetching it."""
+    deadline = time.monotonic() + TILE_FETCH_WAIT_SECONDS
+    waited = False
+    while True:
+        lock = acquire_tile_lock(z, x, y)
+        if lock is not None:
+            try:
+                # The previous holder may have stored it just before releasing.
+                tile = tile_store.read_tile(z, x, y)
+                if tile is None:
+                    data = download_osm_tile(z, x, y)
+                    if data is not None:
+                        tile = store_downloaded_tile(z, x, y, data)
+            finally:
+                release_tile_lock(lock)
+            break
+        if not waited:
+            waited = True
+            tile_fetch_counters["waited_on_other_worker"] += 1
+        time.sleep(TILE_LOCK_POLL_SECONDS)
+        tile = tile_store.read_tile(z, x, y)
+        if tile is not None or time.monotonic() >= deadline:
+            break
+    if tile is not None:
+        tile_memory_cache.put((z, x, y), tile)
+    return tile
+
+
+tile_refresh_pool = ThreadPoolExecutor(max_workers=TILE_REFRESH_WORKERS, thread_name_prefix="tile-refresh")
+_tile_refresh_attempts: Dict[Tuple[int, int, int], float] = {}
+_tile_refresh_lock = threading.Lock()
+
+
+def _refresh_tile(z: int, x: int, y: int) -> None:
+    lock = acquire_tile_lock(z, x, y)
+    if lock is None:
+        # Another worker is already fetching this tile.
+        return
+    try:
+        # Another worker may already have refreshed it; only our memory copy is old.
+        stored = tile_store.read_tile(z, x, y)
+        if stored is not None and time.time() - stored.modified < TILE_STALE_AFTER_SECONDS:
+            tile_memory_cache.put((z, x, y), stored)
+            tile_fetch_counters["refreshed_from_store"] += 1
+            return
+        data = download_osm_tile(z, x, y)
+        if data is None:
+            tile_fetch_counters["refresh_failed"] += 1
+            return
+        tile_memory_cache.put((z, x, y), store_downloaded_tile(z, x, y, data))
+        tile_fetch_counters["refreshed"] += 1
+    finally:
+        release_tile_lock(lock)
+
+
+def schedule_tile_refresh(z: int, x: int, y: int, modified: int) -> bool:
+    """Queue a background refetch of a stale tile; at most one attempt per tile every few minutes."""
+    if not TILE_STALE_WHILE_REVALIDATE or time.time() - modified < TILE_STALE_AFTER_SECONDS:
+        return False
+    key = (z, x, y)
+    now = time.monotonic()
+    with _tile_refresh_lock:
+        last = _tile_refresh_attempts.get(key)
+        if last is not None and now - last < TILE_REFRESH_RETRY_SECONDS:
+            return False
+        if len(_tile_refresh_attempts) > 10000:
+            cutoff = now - TILE_REFRESH_RETRY_SECONDS
+            for stale_key in [k for k, at in _tile_refresh_attempts.items() if at < cutoff]:
+                del _tile_refresh_attempts[stale_key]
+        _tile_refresh_attempts[key] = now
+    tile_fetch_counters["refresh_queued"] += 1
+    tile_refresh_pool.submit(_refresh_tile, z, x, y)
+    return True
+
+
+def fetch_osm_tile(z: int, x: int, y: int) -> Optional[StoredTile]:
+    if z < 0 or z > MAX_TILE_ZOOM:
+        return None
+    limit = 2 ** z
+    if not (0 <= x < limit and 0 <= y < limit):
+        return None
+    key = (z, x, y)
+    cached = tile_memory_cache.get(key)
+    if cached is not None:
+        tile_cache_janitor.touched(key)
+        return cached
+    tile = tile_store.read_tile(z, x, y)
+    if tile is not None:
+        tile_memory_cache.put(key, tile)
+        tile_cache_janitor.touched(key)
+        return tile
+    if tile_negative_cache.get(key) is not None:
+        return None
+    # Requests in this worker share one fetch; other workers wait on the lock file.
+    return tile_fetches.run(key, lambda: _fetch_missing_tile(z, x, y))
 
 
 def make_png_response(payload: bytes, max_age: int = 86400):
@@ -267,6 +915,57 @@ def make_png_response(payload: bytes, max_age: int = 86400):
     return response
 
 
+def send_file_offloaded(path: Path, internal_uri: str, **kwargs: Any):
+    """``send_file`` that never copies the file through Python.
+
+    In "x-accel" and "x-sendfile" mode the body is empty and a header tells the
+    fronting web server which file to send (``internal_uri`` for nginx, the
+    absolute path otherwise); conditional requests are still answered here.
+    """
+    if FILE_SERVING_MODE not in ("x-accel", "x-sendfile"):
+        return send_file(path, **kwargs)
+    response = werkzeug_send_file(
+        str(path), request.environ, use_x_sendfile=True, response_class=app.response_class, **kwargs
+    )
+    if "X-Sendfile" in response.headers:
+        # The body really is empty; the web server sets the length of the file it sends.
+        response.content_length = 0
+        if FILE_SERVING_MODE == "x-accel":
+            del response.headers["X-Sendfile"]
+            response.headers["X-Accel-Redirect"] = quote(internal_uri)
+    return response
+
+
+def send_upload(filename: str, **kwargs: Any):
+    """Serve a file below ``UPLOAD_ROOT`` the configured way; 404 if it is missing or outside."""
+    path = safe_join(str(UPLOAD_ROOT), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    return send_file_offloaded(Path(path), X_ACCEL_UPLOADS_LOCATION + filename, **kwargs)
+
+
+def tile_file_response(z: int, x: int, y: int):
+    """Serve a stored tile straight from its file, or ``None`` if it is not on disk."""
+    path = tile_store.path(z, x, y)
+    try:
+        info = path.stat()
+        modified = int(info.st_mtime)
+        response = send_file_offloaded(
+            path,
+            f"{X_ACCEL_TILES_LOCATION}{z}/{x}/{y}.png",
+            mimetype="image/png",
+            etag=tile_etag(modified, info.st_size),
+            last_modified=modified,
+            max_age=TILE_BROWSER_MAX_AGE_SECONDS,
+        )
+    except OSError:
+        # Not fetched yet, or evicted between the stat and the open.
+        return None
+    tile_cache_janitor.touched((z, x, y))
+    schedule_tile_refresh(z, x, y, modified)
+    return response
+
+
 def naive_utcnow() -> datetime:
     """Return a timezone-naive India Standard Time timestamp compatible with legacy data."""
     return datetime.now(INDIA_TZ).replace(tzinfo=None)
@@ -316,6 +1015,138 @@ def close_db(_: BaseException | None) -> None:
         db.close()
 
 
+class BackgroundBatchWriter:
+    """Collect rows on the request path and write them from a daemon thread in batches.
+
+    ``write_batch(conn, rows)`` runs in one transaction on a connection owned by
+    the writer. The queue is bounded: when the database falls behind, new rows
+    are dropped and counted rather than making requests wait. Whatever is still
+    queued is flushed when the interpreter exits, through ``write_batch_at_exit``
+    when given, so shutdown can skip slow work such as network calls.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        write_batch: Callable[[sqlite3.Connection, List[Any]], None],
+        *,
+        batch_size: int,
+        flush_seconds: float,
+        max_pending: int,
+        write_batch_at_exit: Optional[Callable[[sqlite3.Connection, List[Any]], None]] = None,
+    ) -> None:
+        self.name = name
+        self.write_batch = write_batch
+        self.write_batch_at_exit = write_batch_at_exit
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_pending)
+        self._buffer: List[Any] = []
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._start_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        atexit.register(self.flush, at_exit=True)
+
+    def submit(self, row: Any) -> bool:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent's queue and thread did not come along.
+                self._queue = queue.Queue(maxsize=self.max_pending)
+                self._pid = os.getpid()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+                self._thread.start()
+
+    def _take(self) -> List[Any]:
+        with self._buffer_lock:
+            batch, self._buffer = self._buffer, []
+        return batch
+
+    def _write(
+        self, batch: List[Any], write_batch: Optional[Callable[[sqlite3.Connection, List[Any]], None]] = None
+    ) -> None:
+        with self._write_lock:
+            conn = sqlite3.connect(DATABASE, timeout=30)
+            try:
+                with conn:
+                    (write_batch or self.write_batch)(conn, batch)
+                self.written += len(batch)
+                self.batches += 1
+            except sqlite3.Error:
+                self.failed += len(batch)
+                app.logger.exception("%s writer dropped a batch of %s rows", self.name, len(batch))
+            finally:
+                conn.close()
+
+    def _run(self) -> None:
+        first_at: Optional[float] = None
+        while True:
+            if first_at is None:
+                timeout = self.flush_seconds
+            else:
+                timeout = max(0.0, first_at + self.flush_seconds - time.monotonic())
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                with self._buffer_lock:
+                    self._buffer.append(row)
+                    size = len(self._buffer)
+                if first_at is None:
+                    first_at = time.monotonic()
+                if size < self.batch_size and time.monotonic() - first_at < self.flush_seconds:
+                    continue
+            first_at = None
+            with self._write_lock:
+                batch = self._take()
+                if batch:
+                    self._write(batch)
+
+    def flush(self, at_exit: bool = False) -> None:
+        """Write everything queued so far from the calling thread."""
+        write_batch = (self.write_batch_at_exit if at_exit else None) or self.write_batch
+        with self._write_lock:
+            while True:
+                batch = self._take()
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                self._write(batch, write_batch)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._queue.qsize() + len(self._buffer),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
 def normalize_contact(username: str) -> Tuple[str, str]:
     """Return contact type ('email' or 'phone') and normalized value."""
     value = username.strip()
@@ -536,31 +1367,16 @@ def infer_state_code_for_rental(rental: Dict[str, Any]) -> str:
     delivery_address = (rental.get("delivery_address") or "").strip()
     _append_state(extract_state_from_label(delivery_address))
 
-    destinations = rental.get("trip_destinations_list") or []
-    if isinstance(destinations, list):
-        for destination in destinations:
-            if isinstance(destination, str):
-                state_name = extract_state_from_label(destination)
-                if state_name:
-                    _append_state(state_name)
-                    break
-            elif isinstance(destination, dict):
-                label = (
-                    destination.get("name")
-                    or destination.get("label")
-                    or destination.get("display")
-                    or ""
-                )
-                state_name = extract_state_from_label(label)
-                if state_name:
-                    _append_state(state_name)
-                    break
-
     for candidate in state_candidates:
         key = candidate.lower()
         if key in mapping:
             return mapping[key]
 
+    # Resolved once at booking time from the first destination naming a state.
+    destination_code = rental.get("destination_state_code")
+    if destination_code in valid_codes:
+        return destination_code
+
     licence_plate = (rental.get("licence_plate") or "").upper()
     if licence_plate:
         match = re.search(r"([A-Z]{2})", licence_plate)
@@ -607,7 +1423,12 @@ def generate_booking_identifier_map() -> Dict[int, Dict[str, str]]:
                rentals.owner_response_at,
                rentals.payment_confirmed_at,
                rentals.payment_due_at,
-               rentals.trip_destinations,
+               (
+                   SELECT state_code FROM rental_destinations
+                   WHERE rental_destinations.rental_id = rentals.id AND state_code IS NOT NULL
+                   ORDER BY ordinal
+                   LIMIT 1
+               ) AS destination_state_code,
                rentals.delivery_address,
                cars.city AS car_city,
                cars.licence_plate
@@ -620,12 +1441,6 @@ def generate_booking_identifier_map() -> Dict[int, Dict[str, str]]:
     mapping: Dict[int, Dict[str, str]] = {}
     for row in rows:
         rental = dict(row)
-        try:
-            rental["trip_destinations_list"] = json.loads(
-                rental.get("trip_destinations") or "[]"
-            )
-        except (TypeError, json.JSONDecodeError):
-            rental["trip_destinations_list"] = []
         state_code = infer_state_code_for_rental(rental)
         sort_dt = _booking_reference_datetime(rental)
         date_str = sort_dt.strftime("%Y%m%d")
@@ -740,6 +1555,28 @@ def init_db() -> None:
             pincode TEXT
         );
 
+        CREATE TABLE IF NOT EXISTS dataset_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+
+        INSERT OR IGNORE INTO dataset_versions (name, version) VALUES ('cities', 0);
+
+        CREATE TRIGGER IF NOT EXISTS trg_cities_version_insert AFTER INSERT ON cities
+        BEGIN
+            UPDATE dataset_versions SET version = version + 1 WHERE name = 'cities';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_cities_version_update AFTER UPDATE ON cities
+        BEGIN
+            UPDATE dataset_versions SET version = version + 1 WHERE name = 'cities';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_cities_version_delete AFTER DELETE ON cities
+        BEGIN
+            UPDATE dataset_versions SET version = version + 1 WHERE name = 'cities';
+        END;
+
         CREATE TABLE IF NOT EXISTS user_payout_details (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL UNIQUE,
@@ -788,6 +1625,41 @@ def init_db() -> None:
             FOREIGN KEY (owner_id) REFERENCES users(id) ON DELETE CASCADE
         );
 
+        INSERT OR IGNORE INTO dataset_versions (name, version) VALUES ('car_cities', 0);
+
+        CREATE TRIGGER IF NOT EXISTS trg_car_cities_version_insert AFTER INSERT ON cars
+        BEGIN
+            UPDATE dataset_versions SET version = version + 1 WHERE name = 'car_cities';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_car_cities_version_update AFTER UPDATE OF city, is_active ON cars
+        BEGIN
+            UPDATE dataset_versions SET version = version + 1 WHERE name = 'car_cities';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_car_cities_version_delete AFTER DELETE ON cars
+        BEGIN
+            UPDATE dataset_versions SET version = version + 1 WHERE name = 'car_cities';
+        END;
+
+        INSERT OR IGNORE INTO dataset_versions (name, version) VALUES ('car_positions', 0);
+
+        CREATE TRIGGER IF NOT EXISTS trg_car_positions_version_insert AFTER INSERT ON cars
+        BEGIN
+            UPDATE dataset_versions SET version = version + 1 WHERE name = 'car_positions';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_car_positions_version_update
+        AFTER UPDATE OF latitude, longitude, is_active ON cars
+        BEGIN
+            UPDATE dataset_versions SET version = version + 1 WHERE name = 'car_positions';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_car_positions_version_delete AFTER DELETE ON cars
+        BEGIN
+            UPDATE dataset_versions SET version = version + 1 WHERE name = 'car_positions';
+        END;
+
         CREATE TABLE IF NOT EXISTS rentals (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             car_id INTEGER NOT NULL,
@@ -837,6 +1709,17 @@ def init_db() -> None:
             FOREIGN KEY (renter_id) REFERENCES users(id) ON DELETE CASCADE
         );
 
+        CREATE TABLE IF NOT EXISTS rental_destinations (
+            rental_id INTEGER NOT NULL,
+            ordinal INTEGER NOT NULL,
+            label TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            state_code TEXT,
+            PRIMARY KEY (rental_id, ordinal),
+            FOREIGN KEY (rental_id) REFERENCES rentals(id) ON DELETE CASCADE
+        );
+
         CREATE TABLE IF NOT EXISTS rental_activity_logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             rental_id INTEGER NOT NULL,
@@ -881,6 +1764,27 @@ def init_db() -> None:
             created_at TEXT NOT NULL
         );
 
+        CREATE TABLE IF NOT EXISTS search_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            radius_km REAL,
+            geohash TEXT NOT NULL,
+            result_count INTEGER NOT NULL DEFAULT 0,
+            filters TEXT,
+            user_id INTEGER
+        );
+
+        CREATE TABLE IF NOT EXISTS search_demand (
+            geohash TEXT NOT NULL,
+            hour TEXT NOT NULL,
+            searches INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (geohash, hour)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_search_demand_hour ON search_demand(hour);
+
         CREATE TABLE IF NOT EXISTS car_images (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             car_id INTEGER NOT NULL,
@@ -1075,6 +1979,18 @@ def init_db() -> None:
         )
     except sqlite3.OperationalError:
         pass
+    if db.execute("PRAGMA user_version").fetchone()[0] < 1:
+        # Bookings used to clear cars.is_available until the rental ended. It now
+        # only records whether the owner lists the car, so hand back cars that
+        # were cleared by a booking that is still open.
+        db.execute(
+            f"""
+            UPDATE cars SET is_available = 1
+            WHERE is_available = 0 AND is_active = 1
+              AND EXISTS(SELECT 1 FROM rentals WHERE rentals.car_id = cars.id AND {OPEN_RENTAL_PREDICATE})
+            """
+        )
+        db.execute("PRAGMA user_version = 1")
     db.commit()
     db.execute(
         "CREATE INDEX IF NOT EXISTS idx_cities_name ON cities(name COLLATE NOCASE)"
@@ -1085,8 +2001,31 @@ def init_db() -> None:
     db.execute(
         "CREATE INDEX IF NOT EXISTS idx_visit_logs_ip ON visit_logs(ip_address)"
     )
+    db.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_rentals_open_windows
+        ON rentals(car_id, start_time, end_time)
+        WHERE {OPEN_RENTAL_PREDICATE}
+        """
+    )
     db.commit()
+    ensure_car_location_rtree(db)
+    ensure_search_cell_versions(db)
     seed_cities_if_needed(db)
+    has_cities = db.execute("SELECT 1 FROM cities LIMIT 1").fetchone()
+    has_pincodes = db.execute("SELECT 1 FROM cities WHERE pincode IS NOT NULL LIMIT 1").fetchone()
+    if has_cities and not has_pincodes:
+        filled = backfill_city_pincodes(db)
+        if filled:
+            print(f"Filled PIN codes for {filled} cities.")
+    if db.execute("PRAGMA user_version").fetchone()[0] < 2:
+        # One-off move of destinations out of the legacy JSON column; rentals
+        # that could not be parsed would otherwise be retried on every start.
+        filled = backfill_rental_destinations(db)
+        if filled:
+            print(f"Stored destinations for {filled} rentals.")
+        db.execute("PRAGMA user_version = 2")
+        db.commit()
     db.execute(
         "INSERT OR IGNORE INTO company_payout_config (id, updated_at) VALUES (1, ?)",
         (naive_utcnow_iso(),),
@@ -1183,6 +2122,130 @@ def fetch_car_images(car_ids: List[int]) -> Dict[int, List[str]]:
     return images
 
 
+def fetch_rental_destinations(rental_ids: List[int]) -> Dict[int, List[Dict[str, object]]]:
+    """Return each rental's geocoded trip destinations in booking order."""
+    if not rental_ids:
+        return {}
+    placeholders = ",".join("?" for _ in rental_ids)
+    db = get_db()
+    rows = db.execute(
+        f"""
+        SELECT rental_id, label, latitude, longitude, state_code
+        FROM rental_destinations
+        WHERE rental_id IN ({placeholders})
+        ORDER BY rental_id, ordinal
+        """,
+        rental_ids,
+    ).fetchall()
+    destinations: Dict[int, List[Dict[str, object]]] = {}
+    for row in rows:
+        destinations.setdefault(row["rental_id"], []).append(
+            {
+                "name": row["label"],
+                "latitude": row["latitude"],
+                "longitude": row["longitude"],
+                "state_code": row["state_code"],
+            }
+        )
+    return destinations
+
+
+def apply_rental_destinations(rentals: List[Dict[str, Any]]) -> None:
+    """Attach ``trip_destinations_list`` (labels) and ``trip_destinations_map`` (with coordinates)."""
+    destinations = fetch_rental_destinations([rental["id"] for rental in rentals])
+    for rental in rentals:
+        entries = destinations.get(rental["id"], [])
+        rental["trip_destinations_list"] = [entry["name"] for entry in entries]
+        rental["trip_destinations_map"] = [
+            {"name": entry["name"], "latitude": entry["latitude"], "longitude": entry["longitude"]}
+            if entry["latitude"] is not None and entry["longitude"] is not None
+            else {"name": entry["name"]}
+            for entry in entries
+        ]
+
+
+def geocode_trip_destinations(labels: Iterable[str]) -> List[Tuple[str, Optional[float], Optional[float], Optional[str]]]:
+    """Resolve destination labels to ``(label, latitude, longitude, state_code)`` rows.
+
+    Coordinates come from the city resolver, then from an exact ``name, state``
+    label or its name part; the state code comes from the label itself.
+    """
+    state_codes = load_state_code_mapping()
+    label_lookup: Optional[Dict[str, Tuple[float, float]]] = None
+    resolved: List[Tuple[str, Optional[float], Optional[float], Optional[str]]] = []
+    for label in labels:
+        coords = lookup_city_coordinates(label)
+        if not coords:
+            if label_lookup is None:
+                label_lookup = {}
+                for entry in get_city_list().entries:
+                    if entry.get("latitude") is None or entry.get("longitude") is None:
+                        continue
+                    key = _format_city_label(entry["name"], entry["state"]).strip().lower()
+                    label_lookup.setdefault(key, (float(entry["latitude"]), float(entry["longitude"])))
+            coords = label_lookup.get(label.strip().lower())
+            if not coords and "," in label:
+                coords = label_lookup.get(label.split(",", 1)[0].strip().lower())
+        state_name = extract_state_from_label(label)
+        resolved.append(
+            (
+                label,
+                coords[0] if coords else None,
+                coords[1] if coords else None,
+                state_codes.get(state_name.lower()) if state_name else None,
+            )
+        )
+    return resolved
+
+
+def store_rental_destinations(db: sqlite3.Connection, rental_id: int, labels: Iterable[str]) -> int:
+    """Geocode ``labels`` once and write them to ``rental_destinations``; caller commits."""
+    rows = geocode_trip_destinations(labels)
+    db.executemany(
+        """
+        INSERT OR REPLACE INTO rental_destinations (rental_id, ordinal, label, latitude, longitude, state_code)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        [(rental_id, ordinal, *row) for ordinal, row in enumerate(rows)],
+    )
+    return len(rows)
+
+
+def _legacy_destination_labels(raw: Optional[str]) -> List[str]:
+    try:
+        destinations = json.loads(raw or "[]")
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(destinations, list):
+        return []
+    labels: List[str] = []
+    for destination in destinations:
+        if isinstance(destination, dict):
+            destination = (
+                destination.get("name") or destination.get("label") or destination.get("display") or ""
+            )
+        if isinstance(destination, (str, int, float)) and str(destination).strip():
+            labels.append(str(destination).strip())
+    return labels
+
+
+def backfill_rental_destinations(db: sqlite3.Connection) -> int:
+    """Move destinations of older bookings out of the ``trip_destinations`` JSON column."""
+    rows = db.execute(
+        """
+        SELECT id, trip_destinations FROM rentals
+        WHERE trip_destinations NOT IN ('', '[]')
+          AND NOT EXISTS (SELECT 1 FROM rental_destinations WHERE rental_destinations.rental_id = rentals.id)
+        """
+    ).fetchall()
+    filled = 0
+    for row in rows:
+        if store_rental_destinations(db, row["id"], _legacy_destination_labels(row["trip_destinations"])):
+            filled += 1
+    db.commit()
+    return filled
+
+
 def fetch_car_delivery_options(car_ids: List[int]) -> Dict[int, Dict[int, float]]:
     if not car_ids:
         return {}
@@ -1255,6 +2318,7 @@ def anonymize_user_account(db: sqlite3.Connection, user_id: int, *, release_user
         "UPDATE cars SET is_active = 0, is_available = 0, updated_at = ? WHERE owner_id = ?",
         (now_iso, user_id),
     )
+    search_result_cache.clear()
 
 
 def ensure_user_profile(user_id: int) -> dict:
@@ -1629,30 +2693,18 @@ def get_client_ip() -> str:
     return remote_addr.strip()
 
 
-def lookup_ip_location(ip_address_text: str) -> Dict[str, Any]:
-    """Return cached or freshly fetched location metadata for an IP address."""
-    if not ip_address_text or not _is_public_ip(ip_address_text):
-        return {}
-    db = get_db()
-    cached = db.execute(
-        """
-        SELECT city, region, country, latitude, longitude, org
-        FROM ip_location_cache
-        WHERE ip_address = ?
-        """,
-        (ip_address_text,),
-    ).fetchone()
-    if cached:
-        return dict(cached)
-    try:
-        response = requests.get(
-            IP_LOOKUP_ENDPOINT.format(ip=ip_address_text),
-            timeout=IP_LOOKUP_TIMEOUT,
-        )
-    except requests.RequestException:
-        return {}
+def fetch_ip_location(ip_address_text: str) -> Dict[str, Any]:
+    """Ask the lookup service about an IP; ``{}`` if it has nothing usable.
+
+    Network errors and non-200 answers (rate limits included) are raised as
+    ``requests.RequestException`` so a batch can stop calling the service.
+    """
+    response = requests.get(
+        IP_LOOKUP_ENDPOINT.format(ip=ip_address_text),
+        timeout=IP_LOOKUP_TIMEOUT,
+    )
     if response.status_code != 200:
-        return {}
+        raise requests.HTTPError(f"IP lookup answered {response.status_code}", response=response)
     try:
         payload = response.json()
     except ValueError:
@@ -1675,16 +2727,54 @@ def lookup_ip_location(ip_address_text: str) -> Dict[str, Any]:
         longitude_val = None
     location_data["latitude"] = latitude_val
     location_data["longitude"] = longitude_val
-    try:
-        db.execute(
-            """
-            INSERT OR REPLACE INTO ip_location_cache (
-                ip_address, city, region, country, latitude, longitude, org, updated_at
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
+    return location_data
+
+
+def resolve_ip_locations(
+    conn: sqlite3.Connection,
+    ip_addresses: Iterable[str],
+    max_lookups: int = IP_LOOKUP_MAX_PER_BATCH,
+) -> Dict[str, Dict[str, Any]]:
+    """Location metadata for the public IPs among ``ip_addresses``, cached or freshly fetched.
+
+    At most ``max_lookups`` unknown IPs are looked up (0 reads the cache only).
+    After the first failed lookup the rest go without a location, so a service
+    that is down or rate limiting us cannot stall the caller.
+    """
+    public = sorted({ip for ip in ip_addresses if ip and _is_public_ip(ip)})
+    if not public:
+        return {}
+    placeholders = ",".join("?" for _ in public)
+    locations: Dict[str, Dict[str, Any]] = {}
+    for ip, city, region, country, latitude, longitude, org in conn.execute(
+        f"""
+        SELECT ip_address, city, region, country, latitude, longitude, org
+        FROM ip_location_cache
+        WHERE ip_address IN ({placeholders})
+        """,
+        public,
+    ):
+        locations[ip] = {
+            "city": city,
+            "region": region,
+            "country": country,
+            "latitude": latitude,
+            "longitude": longitude,
+            "org": org,
+        }
+    fetched: List[Tuple[Any, ...]] = []
+    unknown = [ip for ip in public if ip not in locations]
+    for ip in unknown[:max(0, max_lookups)]:
+        try:
+            location_data = fetch_ip_location(ip)
+        except requests.RequestException:
+            break
+        if not location_data:
+            continue
+        locations[ip] = location_data
+        fetched.append(
             (
-                ip_address_text,
+                ip,
                 location_data["city"],
                 location_data["region"],
                 location_data["country"],
@@ -1692,12 +2782,19 @@ def lookup_ip_location(ip_address_text: str) -> Dict[str, Any]:
                 location_data["longitude"],
                 location_data["org"],
                 naive_utcnow_iso(),
-            ),
+            )
         )
-        db.commit()
-    except sqlite3.Error:
-        pass
-    return location_data
+    if fetched:
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO ip_location_cache (
+                ip_address, city, region, country, latitude, longitude, org, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            fetched,
+        )
+    return locations
 
 
 def _is_probable_bot_agent(user_agent: str) -> bool:
@@ -1761,70 +2858,102 @@ def _should_track_request() -> bool:
     return True
 
 
+def _write_visit_events(
+    conn: sqlite3.Connection, events: List[Tuple[Any, ...]], max_lookups: int = IP_LOOKUP_MAX_PER_BATCH
+) -> None:
+    """Store queued visits, marking each IP's first visit and attaching its location."""
+    ip_addresses = sorted({event[0] for event in events})
+    placeholders = ",".join("?" for _ in ip_addresses)
+    seen = {
+        row[0]
+        for row in conn.execute(
+            f"SELECT DISTINCT ip_address FROM visit_logs WHERE ip_address IN ({placeholders})",
+            ip_addresses,
+        )
+    }
+    # Lookups happen before the first write, so no transaction is held while waiting on the network.
+    locations = resolve_ip_locations(conn, ip_addresses, max_lookups)
+    rows = []
+    for ip_address_text, path, method, user_agent, referer, traffic_source, is_bot_flag, created_at in events:
+        location = locations.get(ip_address_text, {})
+        rows.append(
+            (
+                ip_address_text,
+                path,
+                method,
+                user_agent,
+                referer,
+                location.get("city"),
+                location.get("region"),
+                location.get("country"),
+                location.get("latitude"),
+                location.get("longitude"),
+                0 if ip_address_text in seen else 1,
+                traffic_source,
+                is_bot_flag,
+                created_at,
+            )
+        )
+        seen.add(ip_address_text)
+    conn.executemany(
+        """
+        INSERT INTO visit_logs (
+            ip_address,
+            path,
+            method,
+            user_agent,
+            referer,
+            city,
+            region,
+            country,
+            latitude,
+            longitude,
+            is_new_visitor,
+            traffic_source,
+            is_bot,
+            created_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+
+
+visit_event_writer = BackgroundBatchWriter(
+    "visit-events",
+    _write_visit_events,
+    batch_size=VISIT_EVENT_BATCH_SIZE,
+    flush_seconds=VISIT_EVENT_FLUSH_SECONDS,
+    max_pending=VISIT_EVENT_MAX_PENDING,
+    # Shutdown writes cached locations only rather than waiting on the lookup service.
+    write_batch_at_exit=lambda conn, events: _write_visit_events(conn, events, max_lookups=0),
+)
+
+
 def record_visit() -> None:
+    """Queue the current page view for ``visit_logs``; never touches the database."""
     if not _should_track_request():
         return
     ip_address_text = get_client_ip()
     if not ip_address_text:
         return
-    db = get_db()
-    try:
-        existing = db.execute(
-            "SELECT 1 FROM visit_logs WHERE ip_address = ? LIMIT 1",
-            (ip_address_text,),
-        ).fetchone()
-    except sqlite3.Error:
-        return
-    is_new = 0 if existing else 1
     user_agent_header = request.headers.get("User-Agent") or ""
     referer_header = request.headers.get("Referer") or ""
-    user_agent = user_agent_header[:VISIT_LOG_MAX_USER_AGENT]
-    referer = referer_header[:VISIT_LOG_MAX_REFERER]
     traffic_source = classify_campaign_source(referer_header, request.args)
     is_bot_flag = 1 if _is_probable_bot_agent(user_agent_header) else 0
     if is_bot_flag and traffic_source == "other":
         return
-    location = lookup_ip_location(ip_address_text)
-    try:
-        db.execute(
-            """
-            INSERT INTO visit_logs (
-                ip_address,
-                path,
-                method,
-                user_agent,
-                referer,
-                city,
-                region,
-                country,
-                latitude,
-                longitude,
-                is_new_visitor,
-                traffic_source,
-                is_bot,
-                created_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                ip_address_text,
-                request.path,
-                request.method,
-                user_agent,
-                referer,
-                location.get("city"),
-                location.get("region"),
-                location.get("country"),
-                location.get("latitude"),
-                location.get("longitude"),
-                is_new,
-                traffic_source,
-                is_bot_flag,
-                naive_utcnow_iso(),
-            ),
+    visit_event_writer.submit(
+        (
+            ip_address_text,
+            request.path,
+            request.method,
+            user_agent_header[:VISIT_LOG_MAX_USER_AGENT],
+            referer_header[:VISIT_LOG_MAX_REFERER],
+            traffic_source,
+            is_bot_flag,
+            naive_utcnow_iso(),
         )
-        db.commit()
-    except sqlite3.Error:
-        db.rollback()
+    )
 
 
 @app.before_request
@@ -1893,7 +3022,7 @@ def admin_required(view: Callable) -> Callable:
 
 
 def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    radius = 6371.0
+    radius = EARTH_RADIUS_KM
     lat1_rad, lon1_rad, lat2_rad, lon2_rad = map(
         radians, [lat1, lon1, lat2, lon2])
     dlat = lat2_rad - lat1_rad
@@ -1903,67 +3032,1313 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return radius * c
 
 
-def reverse_geocode_city(latitude: float, longitude: float) -> Optional[str]:
-    try:
-        import reverse_geocoder as rg  # type: ignore
-    except ImportError:
+def haversine_km_batch(
+    latitude: float,
+    longitude: float,
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+) -> Sequence[float]:
+    """Return distances from one origin to many points, vectorized when NumPy is available."""
+    if np is None:
+        return [
+            haversine_km(latitude, longitude, lat, lng)
+            for lat, lng in zip(latitudes, longitudes)
+        ]
+    lat_rad = np.radians(np.ascontiguousarray(latitudes, dtype=np.float64))
+    lng_rad = np.radians(np.ascontiguousarray(longitudes, dtype=np.float64))
+    origin_lat = radians(latitude)
+    origin_lng = radians(longitude)
+    a = (
+        np.sin((lat_rad - origin_lat) / 2) ** 2
+        + cos(origin_lat) * np.cos(lat_rad) * np.sin((lng_rad - origin_lng) / 2) ** 2
+    )
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def rank_by_distance(
+    latitude: float,
+    longitude: float,
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    tie_breakers: Sequence[int],
+    radius_km: Optional[float] = None,
+) -> List[Tuple[int, float]]:
+    """Return ``(position, distance_km)`` for points inside the radius, nearest first.
+
+    Ties are broken by ``tie_breakers`` (normally car ids) so paging is stable.
+    """
+    if not len(latitudes):
+        return []
+    distances = haversine_km_batch(latitude, longitude, latitudes, longitudes)
+    if np is None:
+        ranked = [
+            (index, distance)
+            for index, distance in enumerate(distances)
+            if not radius_km or distance <= radius_km
+        ]
+        ranked.sort(key=lambda item: (item[1], tie_breakers[item[0]]))
+        return ranked
+    positions = np.arange(len(distances))
+    if radius_km:
+        positions = positions[distances <= radius_km]
+    ties = np.asarray(tie_breakers, dtype=np.int64)[positions]
+    order = positions[np.lexsort((ties, distances[positions]))]
+    return [(int(index), float(distances[index])) for index in order]
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Return (min_lat, max_lat, min_lng, max_lng) fully enclosing a search circle."""
+    lat_delta = radius_km / KM_PER_DEGREE_LATITUDE
+    min_lat = max(-90.0, latitude - lat_delta)
+    max_lat = min(90.0, latitude + lat_delta)
+    widest = max(abs(min_lat), abs(max_lat))
+    cos_lat = cos(radians(widest))
+    if widest >= 89.9 or cos_lat <= 0:
+        return min_lat, max_lat, -180.0, 180.0
+    lng_delta = radius_km / (KM_PER_DEGREE_LATITUDE * cos_lat)
+    if lng_delta >= 180.0:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, longitude - lng_delta, longitude + lng_delta
+
+
+_car_rtree_available: Optional[bool] = None
+
+
+def car_rtree_available(db: sqlite3.Connection) -> bool:
+    """Return whether the car_locations R*Tree exists (SQLite may lack the module)."""
+    global _car_rtree_available
+    if _car_rtree_available is None:
+        row = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'car_locations'"
+        ).fetchone()
+        _car_rtree_available = row is not None
+    return _car_rtree_available
+
+
+def ensure_car_location_rtree(db: sqlite3.Connection) -> None:
+    """Create the car_locations R*Tree and the triggers that mirror cars into it.
+
+    Active cars are stored as zero-area boxes so every gunicorn worker can narrow
+    a radius search to a bounding box inside SQLite instead of in Python memory.
+    """
+    exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'car_locations'"
+    ).fetchone()
+    if exists is None:
+        try:
+            db.execute(
+                "CREATE VIRTUAL TABLE car_locations USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+            )
+        except sqlite3.OperationalError as exc:
+            app.logger.warning("R*Tree unavailable, falling back to grid prefilter: %s", exc)
+            return
+    db.executescript(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_cars_location_insert AFTER INSERT ON cars
+        WHEN NEW.is_active = 1 AND NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO car_locations (id, min_lat, max_lat, min_lng, max_lng)
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_cars_location_update
+        AFTER UPDATE OF latitude, longitude, is_active ON cars
+        BEGIN
+            DELETE FROM car_locations WHERE id = OLD.id;
+            INSERT INTO car_locations (id, min_lat, max_lat, min_lng, max_lng)
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.is_active = 1 AND NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_cars_location_delete AFTER DELETE ON cars
+        BEGIN
+            DELETE FROM car_locations WHERE id = OLD.id;
+        END;
+        """
+    )
+    if exists is None:
+        db.execute(
+            """
+            INSERT OR REPLACE INTO car_locations (id, min_lat, max_lat, min_lng, max_lng)
+            SELECT id, latitude, latitude, longitude, longitude
+            FROM cars
+            WHERE is_active = 1 AND latitude IS NOT NULL AND longitude IS NOT NULL
+            """
+        )
+    db.commit()
+
+
+def _bump_search_cells_sql(row: str, source: str = "search_cache_levels", where: str = "") -> str:
+    """``SELECT`` of every invalidation cell holding ``row``'s location, for the cell triggers."""
+    conditions = [f"{row}.latitude IS NOT NULL", f"{row}.longitude IS NOT NULL"]
+    if where:
+        conditions.insert(0, where)
+    return (
+        f"SELECT level, CAST(({row}.latitude + 90.0) / degrees AS INTEGER),"
+        f" CAST(({row}.longitude + 180.0) / degrees AS INTEGER), 1"
+        f" FROM {source} WHERE {' AND '.join(conditions)}"
+    )
+
+
+def ensure_search_cell_versions(db: sqlite3.Connection) -> None:
+    """Create the per-cell change counters the search cache checks its entries against.
+
+    Triggers bump the counter of every invalidation cell, at every level, that
+    holds a car which was added, changed, moved or removed, or whose bookings
+    changed. Every worker writes through the same triggers, so a cached search is
+    only dropped when something inside the area it covers changes.
+    """
+    upsert = "ON CONFLICT (level, cell_row, cell_col) DO UPDATE SET version = version + 1;"
+    insert = "INSERT INTO search_cell_versions (level, cell_row, cell_col, version)"
+    booked_cars = "cars, search_cache_levels"
+    db.executescript(
+        f"""
+        DROP TRIGGER IF EXISTS trg_car_listings_version_insert;
+        DROP TRIGGER IF EXISTS trg_car_listings_version_update;
+        DROP TRIGGER IF EXISTS trg_car_listings_version_delete;
+        DROP TRIGGER IF EXISTS trg_rentals_listings_version_insert;
+        DROP TRIGGER IF EXISTS trg_rentals_listings_version_update;
+        DROP TRIGGER IF EXISTS trg_rentals_listings_version_delete;
+        DELETE FROM dataset_versions WHERE name = 'car_listings';
+
+        CREATE TABLE IF NOT EXISTS search_cache_levels (
+            level INTEGER PRIMARY KEY,
+            degrees REAL NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS search_cell_versions (
+            level INTEGER NOT NULL,
+            cell_row INTEGER NOT NULL,
+            cell_col INTEGER NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (level, cell_row, cell_col)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_cells_car_insert AFTER INSERT ON cars
+        BEGIN
+            {insert}
+            {_bump_search_cells_sql("NEW")}
+            {upsert}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_cells_car_update AFTER UPDATE ON cars
+        BEGIN
+            {insert}
+            {_bump_search_cells_sql("OLD")}
+            UNION
+            {_bump_search_cells_sql("NEW")}
+            {upsert}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_cells_car_delete AFTER DELETE ON cars
+        BEGIN
+            {insert}
+            {_bump_search_cells_sql("OLD")}
+            {upsert}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_cells_rental_insert AFTER INSERT ON rentals
+        BEGIN
+            {insert}
+            {_bump_search_cells_sql("cars", booked_cars, "cars.id = NEW.car_id")}
+            {upsert}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_cells_rental_update
+        AFTER UPDATE OF status, start_time, end_time, car_id ON rentals
+        BEGIN
+            {insert}
+            {_bump_search_cells_sql("cars", booked_cars, "cars.id IN (OLD.car_id, NEW.car_id)")}
+            {upsert}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_cells_rental_delete AFTER DELETE ON rentals
+        BEGIN
+            {insert}
+            {_bump_search_cells_sql("cars", booked_cars, "cars.id = OLD.car_id")}
+            {upsert}
+        END;
+        """
+    )
+    db.executemany(
+        "INSERT OR REPLACE INTO search_cache_levels (level, degrees) VALUES (?, ?)",
+        [
+            (level, SEARCH_CACHE_INVALIDATION_DEGREES * (1 << level))
+            for level in range(SEARCH_CACHE_MAX_INVALIDATION_LEVEL + 1)
+        ],
+    )
+    db.commit()
+
+
+def search_area_version(cells: List[Tuple[int, int, int]]) -> int:
+    """Return a fingerprint of the change counters over an entry's invalidation cells.
+
+    ``cells`` is one rectangle on one level. Counters only ever grow, so their
+    sum moves whenever any cell inside the rectangle is bumped.
+    """
+    level = cells[0][0]
+    row = get_db().execute(
+        """
+        SELECT COALESCE(SUM(version), 0) FROM search_cell_versions
+        WHERE level = ? AND cell_row BETWEEN ? AND ? AND cell_col BETWEEN ? AND ?
+        """,
+        (
+            level,
+            min(cell[1] for cell in cells),
+            max(cell[1] for cell in cells),
+            min(cell[2] for cell in cells),
+            max(cell[2] for cell in cells),
+        ),
+    ).fetchone()
+    return int(row[0])
+
+def grid_cell(latitude: float, longitude: float, cell_degrees: float) -> Tuple[int, int]:
+    # Same arithmetic as the CAST(... AS INTEGER) in the search cell triggers.
+    return (
+        int((latitude + 90.0) / cell_degrees),
+        int((longitude + 180.0) / cell_degrees),
+    )
+
+
+def grid_cells_for_radius(
+    latitude: float, longitude: float, radius_km: float, cell_degrees: float
+) -> List[Tuple[int, int]]:
+    """Return every grid cell overlapping the bounding box of a search circle."""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    low_row, low_col = grid_cell(min_lat, min_lng, cell_degrees)
+    high_row, high_col = grid_cell(max_lat, max_lng, cell_degrees)
+    return [
+        (row, col)
+        for row in range(low_row, high_row + 1)
+        for col in range(low_col, high_col + 1)
+    ]
+
+
+class CarSpatialIndex:
+    """Fixed latitude/longitude grid over active cars used to prefilter radius searches.
+
+    The grid only narrows candidates; the SQL predicates and the exact haversine
+    check in ``fetch_available_cars`` still decide what is returned. A car missing
+    from the grid, or filed under an old cell, is silently left out of results, so
+    each worker's copy must track every write: local writes update it immediately,
+    and the whole grid is reloaded whenever the trigger-maintained
+    ``car_positions`` counter moves (a car added, moved, deactivated or deleted by
+    any worker) and at least every ``CAR_GRID_REFRESH_SECONDS`` as a backstop.
+    """
+
+    def __init__(self, cell_degrees: float = CAR_GRID_CELL_DEGREES) -> None:
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], set[int]] = defaultdict(set)
+        self._positions: Dict[int, Tuple[int, int]] = {}
+        self._loaded_at: Optional[float] = None
+        self._version: Optional[int] = None
+        self._lock = threading.RLock()
+
+    def cell_for(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return grid_cell(latitude, longitude, self.cell_degrees)
+
+    def is_stale(self, version: Optional[int] = None) -> bool:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > CAR_GRID_REFRESH_SECONDS:
+            return True
+        return version is not None and version != self._version
+
+    def load(self, rows: Iterable[Tuple[int, float, float]], version: Optional[int] = None) -> None:
+        cells: Dict[Tuple[int, int], set[int]] = defaultdict(set)
+        positions: Dict[int, Tuple[int, int]] = {}
+        for car_id, latitude, longitude in rows:
+            if latitude is None or longitude is None:
+                continue
+            cell = self.cell_for(float(latitude), float(longitude))
+            cells[cell].add(int(car_id))
+            positions[int(car_id)] = cell
+        with self._lock:
+            self._cells = cells
+            self._positions = positions
+            self._loaded_at = time.monotonic()
+            self._version = version
+
+    def upsert(self, car_id: int, latitude: float, longitude: float) -> None:
+        cell = self.cell_for(latitude, longitude)
+        with self._lock:
+            previous = self._positions.get(car_id)
+            if previous == cell:
+                return
+            if previous is not None:
+                self._cells[previous].discard(car_id)
+            self._cells[cell].add(car_id)
+            self._positions[car_id] = cell
+
+    def discard(self, car_id: int) -> None:
+        with self._lock:
+            previous = self._positions.pop(car_id, None)
+            if previous is not None:
+                self._cells[previous].discard(car_id)
+
+    def cells_for_radius(self, latitude: float, longitude: float, radius_km: float) -> List[Tuple[int, int]]:
+        return grid_cells_for_radius(latitude, longitude, radius_km, self.cell_degrees)
+
+    def candidates(self, latitude: float, longitude: float, radius_km: float) -> set[int]:
+        found: set[int] = set()
+        with self._lock:
+            for cell in self.cells_for_radius(latitude, longitude, radius_km):
+                ids = self._cells.get(cell)
+                if ids:
+                    found.update(ids)
+        return found
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+
+car_spatial_index = CarSpatialIndex()
+
+
+def get_car_spatial_index() -> CarSpatialIndex:
+    """Return the process-wide car grid, reloading it when any worker has moved a car."""
+    version = get_dataset_version("car_positions")
+    if car_spatial_index.is_stale(version):
+        rows = get_db().execute(
+            "SELECT id, latitude, longitude FROM cars WHERE is_active = 1"
+        ).fetchall()
+        car_spatial_index.load(((row[0], row[1], row[2]) for row in rows), version)
+    return car_spatial_index
+
+
+def refresh_car_spatial_index(car_id: int) -> None:
+    """Re-read one car after a write and move it to its current grid cell."""
+    if car_spatial_index.is_stale():
+        return
+    row = get_db().execute(
+        "SELECT latitude, longitude, is_active FROM cars WHERE id = ?",
+        (car_id,),
+    ).fetchone()
+    if row is None or not row["is_active"] or row["latitude"] is None or row["longitude"] is None:
+        car_spatial_index.discard(car_id)
+        return
+    car_spatial_index.upsert(car_id, float(row["latitude"]), float(row["longitude"]))
+
+
+def notify_car_changed(car_id: int) -> None:
+    """Propagate a committed change to a car or its bookings into in-process indexes."""
+    refresh_car_spatial_index(car_id)
+    row = get_db().execute(
+        "SELECT latitude, longitude FROM cars WHERE id = ?", (car_id,)
+    ).fetchone()
+    location = None
+    if row is not None and row["latitude"] is not None and row["longitude"] is not None:
+        location = (float(row["latitude"]), float(row["longitude"]))
+    search_result_cache.invalidate_car(car_id, location)
+
+
+def mercator_cell(latitude: float, longitude: float, level: int) -> Tuple[int, int]:
+    """Return the web-mercator grid cell (like a tile x/y) containing a point at ``level``."""
+    scale = 1 << level
+    lat = radians(min(85.05112878, max(-85.05112878, latitude)))
+    x = int((longitude + 180.0) / 360.0 * scale)
+    y = int((1.0 - log(tan(lat) + 1.0 / cos(lat)) / pi) / 2.0 * scale)
+    return min(scale - 1, max(0, x)), min(scale - 1, max(0, y))
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int) -> str:
+    """Return the base-32 geohash of a point, ``precision`` characters long."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars: List[str] = []
+    value = bits = 0
+    even = True
+    while len(chars) < precision:
+        span, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            span[0] = middle
+        else:
+            value *= 2
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            value = bits = 0
+    return "".join(chars)
+
+
+def geohash_bounds(code: str) -> Tuple[float, float, float, float]:
+    """Return ``(south, west, north, east)`` for a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in code:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            span = lng_range if even else lat_range
+            middle = (span[0] + span[1]) / 2
+            if value >> shift & 1:
+                span[0] = middle
+            else:
+                span[1] = middle
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+class FleetClusterIndex:
+    """Pre-aggregated vehicle counts on a quadtree of web-mercator cells.
+
+    Only the finest level is built from cars; every coarser level sums four
+    child cells, so a rebuild costs one pass over the fleet plus the (far
+    smaller) cell counts. Each cell stores ``[vehicles, active trips, sum of
+    latitudes, sum of longitudes]`` so clusters can be drawn at their centroid.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[float, float, bool]], max_level: int) -> None:
+        self.max_level = max_level
+        finest: Dict[Tuple[int, int], List[float]] = {}
+        total = 0
+        for latitude, longitude, active in rows:
+            key = mercator_cell(latitude, longitude, max_level)
+            cell = finest.get(key)
+            if cell is None:
+                cell = finest[key] = [0, 0, 0.0, 0.0]
+            cell[0] += 1
+            cell[1] += 1 if active else 0
+            cell[2] += latitude
+            cell[3] += longitude
+            total += 1
+        self.total = total
+        self.levels: List[Dict[Tuple[int, int], List[float]]] = [{} for _ in range(max_level)] + [finest]
+        for level in range(max_level - 1, -1, -1):
+            parents = self.levels[level]
+            for (x, y), child in self.levels[level + 1].items():
+                parent = parents.get((x >> 1, y >> 1))
+                if parent is None:
+                    parents[(x >> 1, y >> 1)] = list(child)
+                else:
+                    for slot in range(4):
+                        parent[slot] += child[slot]
+        self.built_at = time.monotonic()
+
+    def clusters(self, west: float, south: float, east: float, north: float, zoom: int) -> List[Dict[str, float]]:
+        level = max(0, min(self.max_level, zoom + FLEET_CLUSTER_CELL_SHIFT))
+        cells = self.levels[level]
+        min_x, min_y = mercator_cell(north, west, level)
+        max_x, max_y = mercator_cell(south, east, level)
+        found: List[Dict[str, float]] = []
+        if (max_x - min_x + 1) * (max_y - min_y + 1) <= len(cells):
+            candidates = (
+                cells.get((x, y)) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)
+            )
+        else:
+            candidates = (
+                cell for (x, y), cell in cells.items() if min_x <= x <= max_x and min_y <= y <= max_y
+            )
+        for cell in candidates:
+            if cell:
+                found.append(
+                    {
+                        "latitude": round(cell[2] / cell[0], 5),
+                        "longitude": round(cell[3] / cell[0], 5),
+                        "count": int(cell[0]),
+                        "active": int(cell[1]),
+                    }
+                )
+        return found
+
+
+_fleet_cluster_index: Optional[FleetClusterIndex] = None
+_fleet_cluster_lock = threading.Lock()
+
+
+def get_fleet_cluster_index() -> FleetClusterIndex:
+    """Return this worker's fleet cluster index, rebuilt every ``FLEET_CLUSTER_REFRESH_SECONDS``."""
+    global _fleet_cluster_index
+    index = _fleet_cluster_index
+    if index is not None and time.monotonic() - index.built_at < FLEET_CLUSTER_REFRESH_SECONDS:
+        return index
+    with _fleet_cluster_lock:
+        index = _fleet_cluster_index
+        if index is None or time.monotonic() - index.built_at >= FLEET_CLUSTER_REFRESH_SECONDS:
+            db = get_db()
+            on_trip = {row[0] for row in db.execute("SELECT DISTINCT car_id FROM rentals WHERE status = 'active'")}
+            rows = db.execute(
+                "SELECT id, latitude, longitude FROM cars"
+                " WHERE is_active = 1 AND latitude IS NOT NULL AND longitude IS NOT NULL"
+            ).fetchall()
+            index = FleetClusterIndex(
+                ((float(row[1]), float(row[2]), row[0] in on_trip) for row in rows),
+                FLEET_CLUSTER_MAX_ZOOM + FLEET_CLUSTER_CELL_SHIFT,
+            )
+            _fleet_cluster_index = index
+    return index
+
+
+def _write_search_events(conn: sqlite3.Connection, events: List[Tuple[Any, ...]]) -> None:
+    """Store raw search events and fold them into the hourly demand buckets."""
+    conn.executemany(
+        """
+        INSERT INTO search_events (
+            created_at, latitude, longitude, radius_km, geohash, result_count, filters, user_id
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        events,
+    )
+    buckets: Dict[Tuple[str, str], int] = defaultdict(int)
+    for event in events:
+        buckets[(event[4], event[0][:13])] += 1
+    conn.executemany(
+        """
+        INSERT INTO search_demand (geohash, hour, searches) VALUES (?, ?, ?)
+        ON CONFLICT(geohash, hour) DO UPDATE SET searches = searches + excluded.searches
+        """,
+        [(geohash, hour, count) for (geohash, hour), count in buckets.items()],
+    )
+
+
+search_event_writer = BackgroundBatchWriter(
+    "search-events",
+    _write_search_events,
+    batch_size=SEARCH_EVENT_BATCH_SIZE,
+    flush_seconds=SEARCH_EVENT_FLUSH_SECONDS,
+    max_pending=SEARCH_EVENT_MAX_PENDING,
+)
+
+
+def record_search_event(
+    latitude: float,
+    longitude: float,
+    radius_km: Optional[float],
+    result_count: int,
+    filters: Mapping[str, Any],
+    user_id: Optional[int],
+) -> None:
+    """Queue a search for the demand heatmap; never blocks the request."""
+    search_event_writer.submit(
+        (
+            naive_utcnow_iso(),
+            latitude,
+            longitude,
+            radius_km,
+            encode_geohash(latitude, longitude, SEARCH_DEMAND_GEOHASH_PRECISION),
+            result_count,
+            json.dumps(filters, sort_keys=True, default=str),
+            user_id,
+        )
+    )
+
+
+_listing_geohash_counts: Tuple[float, Dict[str, int]] = (float("-inf"), {})
+_listing_geohash_lock = threading.Lock()
+
+
+def get_listing_geohash_counts() -> Dict[str, int]:
+    """Active listings per demand bucket, recounted every ``FLEET_CLUSTER_REFRESH_SECONDS``."""
+    global _listing_geohash_counts
+    built_at, counts = _listing_geohash_counts
+    if time.monotonic() - built_at < FLEET_CLUSTER_REFRESH_SECONDS:
+        return counts
+    with _listing_geohash_lock:
+        built_at, counts = _listing_geohash_counts
+        if time.monotonic() - built_at >= FLEET_CLUSTER_REFRESH_SECONDS:
+            counts = defaultdict(int)
+            for latitude, longitude in get_db().execute(
+                "SELECT latitude, longitude FROM cars"
+                " WHERE is_active = 1 AND latitude IS NOT NULL AND longitude IS NOT NULL"
+            ):
+                counts[encode_geohash(float(latitude), float(longitude), SEARCH_DEMAND_GEOHASH_PRECISION)] += 1
+            counts = dict(counts)
+            _listing_geohash_counts = (time.monotonic(), counts)
+    return counts
+
+
+def get_dataset_version(name: str) -> int:
+    """Return the trigger-maintained change counter for a reference table.
+
+    The value is read at most once per request so per-row callers stay cheap.
+    """
+    cache = g.setdefault("_dataset_versions", {})
+    if name not in cache:
+        row = get_db().execute(
+            "SELECT version FROM dataset_versions WHERE name = ?", (name,)
+        ).fetchone()
+        cache[name] = int(row[0]) if row else 0
+    return cache[name]
+
+
+class _TrieNode:
+    __slots__ = ("children", "best")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, _TrieNode] = {}
+        self.best: Optional[Tuple[float, float]] = None
+
+
+class CityGazetteer:
+    """In-memory city resolver that answers the same rules as the old SQL cascade.
+
+    Rows are ranked like ``ORDER BY (pincode IS NULL), pincode, id`` so the first
+    match for a name, prefix or substring is the row SQLite would have returned.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, str, Optional[float], Optional[float], Optional[str]]]) -> None:
+        ranked = sorted(
+            (
+                (pincode is None, pincode or "", city_id, (name or "").strip().lower(), float(lat), float(lng))
+                for city_id, name, lat, lng, pincode in rows
+                if lat is not None and lng is not None and (name or "").strip()
+            ),
+        )
+        self._exact: Dict[str, Tuple[float, float]] = {}
+        self._root = _TrieNode()
+        self._names: List[Tuple[str, Tuple[float, float]]] = []
+        for *_, name, lat, lng in ranked:
+            coords = (lat, lng)
+            self._exact.setdefault(name, coords)
+            self._names.append((name, coords))
+            node = self._root
+            for char in name:
+                node = node.children.setdefault(char, _TrieNode())
+                if node.best is None:
+                    node.best = coords
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def exact(self, name: str) -> Optional[Tuple[float, float]]:
+        return self._exact.get(name)
+
+    def prefix(self, text: str) -> Optional[Tuple[float, float]]:
+        node = self._root
+        for char in text:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node.best
+
+    def substring(self, text: str) -> Optional[Tuple[float, float]]:
+        for name, coords in self._names:
+            if text in name:
+                return coords
         return None
+
+    def resolve(self, city_name: str) -> Optional[Tuple[float, float]]:
+        lowered = (city_name or "").strip().lower()
+        if not lowered:
+            return None
+        exact = self.exact(lowered)
+        if exact:
+            return exact
+        tokens = [part.strip() for part in re.split(r",|\s+", lowered) if part.strip()]
+        for size in range(len(tokens), 0, -1):
+            result = self.exact(" ".join(tokens[:size]))
+            if result:
+                return result
+        return self.prefix(lowered) or self.substring(lowered)
+
+
+_city_structures: Dict[str, Tuple[Tuple[int, ...], Any]] = {}
+_city_structures_lock = threading.RLock()
+
+
+def _get_city_structure(
+    key: str,
+    builder: Callable[[sqlite3.Connection], Any],
+    datasets: Tuple[str, ...] = ("cities",),
+) -> Any:
+    """Return a process-wide structure derived from ``cities``, rebuilt when the table changes.
+
+    ``datasets`` names every ``dataset_versions`` counter the structure depends on.
+    """
+    version = tuple(get_dataset_version(name) for name in datasets)
+    cached = _city_structures.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _city_structures_lock:
+        cached = _city_structures.get(key)
+        if cached is None or cached[0] != version:
+            cached = (version, builder(get_db()))
+            _city_structures[key] = cached
+    return cached[1]
+
+
+def get_city_gazetteer() -> CityGazetteer:
+    """Return the process-wide gazetteer, rebuilding it when the cities table changes."""
+
+    def _build(db: sqlite3.Connection) -> CityGazetteer:
+        rows = db.execute(
+            "SELECT id, name, latitude, longitude, pincode FROM cities"
+        ).fetchall()
+        return CityGazetteer(tuple(row) for row in rows)
+
+    return _get_city_structure("gazetteer", _build)
+
+
+class PincodeIndex:
+    """Compact lookup of Indian postal codes: one dict slot per PIN into parallel arrays."""
+
+    def __init__(self, rows: Iterable[Tuple[int, str, str, float, float]]) -> None:
+        self._slots: Dict[int, int] = {}
+        self.pincodes = array("i")
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.places: List[str] = []
+        self.states: List[str] = []
+        for pincode, place, state, latitude, longitude in rows:
+            if pincode in self._slots:
+                continue
+            self._slots[pincode] = len(self.pincodes)
+            self.pincodes.append(pincode)
+            self.latitudes.append(latitude)
+            self.longitudes.append(longitude)
+            self.places.append(place)
+            self.states.append(state)
+
+    def __len__(self) -> int:
+        return len(self.pincodes)
+
+    def slot(self, pincode: str | int) -> Optional[int]:
+        try:
+            return self._slots.get(int(pincode))
+        except (TypeError, ValueError):
+            return None
+
+    def coordinates(self, pincode: str | int) -> Optional[Tuple[float, float]]:
+        slot = self.slot(pincode)
+        if slot is None:
+            return None
+        return self.latitudes[slot], self.longitudes[slot]
+
+    def label(self, pincode: str | int) -> Optional[str]:
+        slot = self.slot(pincode)
+        if slot is None:
+            return None
+        place = _format_city_label(self.places[slot], self.states[slot])
+        return f"{place} ({self.pincodes[slot]})"
+
+
+@lru_cache(maxsize=2)
+def _load_pincode_index_cached(mtime: Optional[float]) -> PincodeIndex:
+    """Parse IN.csv (GeoNames postal-code dump), memoized by file mtime."""
+    rows: List[Tuple[int, str, str, float, float]] = []
+    if mtime is not None:
+        try:
+            with PINCODE_FILE.open(newline="", encoding="utf-8") as handle:
+                for row in csv.DictReader(handle):
+                    digits = re.sub(r"\D", "", row.get("key") or "")
+                    try:
+                        latitude = float(row.get("latitude") or "")
+                        longitude = float(row.get("longitude") or "")
+                    except ValueError:
+                        continue
+                    if len(digits) != 6:
+                        continue
+                    rows.append(
+                        (
+                            int(digits),
+                            (row.get("place_name") or "").strip(),
+                            (row.get("admin_name1") or "").strip(),
+                            latitude,
+                            longitude,
+                        )
+                    )
+        except (OSError, csv.Error):
+            pass
+    return PincodeIndex(rows)
+
+
+def load_pincode_index() -> PincodeIndex:
+    """Return the postal-code index for the bundled IN.csv."""
     try:
-        result = rg.search((latitude, longitude), mode=1)
-    except Exception:
-        return None
-    if result:
-        return result[0].get("name")
+        mtime = PINCODE_FILE.stat().st_mtime
+    except OSError:
+        mtime = None
+    return _load_pincode_index_cached(mtime)
+
+
+def normalize_pincode(value: Optional[str]) -> Optional[str]:
+    """Return the 6-digit PIN if the value is a PIN code (spaces allowed), else None."""
+    compact = re.sub(r"\s+", "", value or "")
+    if re.fullmatch(r"[1-9]\d{5}", compact):
+        return compact
     return None
 
 
+def backfill_city_pincodes(conn: sqlite3.Connection) -> int:
+    """Fill ``cities.pincode`` from IN.csv and return the number of rows updated.
+
+    A city takes the lowest PIN whose post office name matches it in the same
+    state, then any state; otherwise the closest post office within
+    ``PINCODE_MATCH_MAX_KM``.
+    """
+    index = load_pincode_index()
+    if not len(index):
+        return 0
+    by_place: Dict[str, List[int]] = defaultdict(list)
+    for slot, place in enumerate(index.places):
+        by_place[place.lower()].append(slot)
+    tree = KDTree(list(zip(index.latitudes, index.longitudes)))
+    rows = conn.execute(
+        "SELECT id, name, state, latitude, longitude FROM cities WHERE pincode IS NULL"
+    ).fetchall()
+    updates: List[Tuple[str, int]] = []
+    for city_id, name, state, latitude, longitude in rows:
+        slots = by_place.get((name or "").strip().lower(), [])
+        state_key = (state or "").strip().lower()
+        same_state = [slot for slot in slots if index.states[slot].lower() == state_key]
+        candidates = same_state or slots
+        chosen: Optional[int] = None
+        if candidates:
+            chosen = min(candidates, key=lambda slot: index.pincodes[slot])
+        elif latitude is not None and longitude is not None:
+            found = tree.nearest(float(latitude), float(longitude))
+            if found and found[1] <= PINCODE_MATCH_MAX_KM:
+                chosen = found[0]
+        if chosen is not None:
+            updates.append((str(index.pincodes[chosen]), city_id))
+    if updates:
+        conn.executemany("UPDATE cities SET pincode = ? WHERE id = ?", updates)
+        conn.commit()
+    return len(updates)
+
+
 def lookup_city_coordinates(city_name: str) -> Optional[Tuple[float, float]]:
-    """Return latitude/longitude for a city, tolerating state or region suffixes."""
+    """Return latitude/longitude for a city or 6-digit PIN, tolerating state or region suffixes."""
     cleaned = (city_name or "").strip()
     if not cleaned:
         return None
-    db = get_db()
+    pincode = normalize_pincode(cleaned)
+    if pincode:
+        return load_pincode_index().coordinates(pincode)
+    return get_city_gazetteer().resolve(cleaned)
 
-    def _query(value: str, comparator: str = "=") -> Optional[Tuple[float, float]]:
-        row = db.execute(
-            f"""
-            SELECT latitude, longitude
+
+def _unit_vector(latitude: float, longitude: float) -> Tuple[float, float, float]:
+    lat_rad = radians(latitude)
+    lng_rad = radians(longitude)
+    return (cos(lat_rad) * cos(lng_rad), cos(lat_rad) * sin(lng_rad), sin(lat_rad))
+
+
+class KDTree:
+    """Static 3-d tree over points on the unit sphere for nearest-neighbour lookups.
+
+    Points are stored as unit vectors so straight-line (chord) distance orders
+    neighbours exactly like great-circle distance, with no dateline or polar cases.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float]]) -> None:
+        self._vectors = [_unit_vector(lat, lng) for lat, lng in points]
+        # Flat node arrays: point index, split axis, left child, right child.
+        self._point: List[int] = []
+        self._axis: List[int] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._root = self._build(list(range(len(self._vectors))), 0)
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def _build(self, indices: List[int], depth: int) -> int:
+        if not indices:
+            return -1
+        axis = depth % 3
+        indices.sort(key=lambda index: self._vectors[index][axis])
+        middle = len(indices) // 2
+        node = len(self._point)
+        self._point.append(indices[middle])
+        self._axis.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._left[node] = self._build(indices[:middle], depth + 1)
+        self._right[node] = self._build(indices[middle + 1:], depth + 1)
+        return node
+
+    def nearest(self, latitude: float, longitude: float) -> Optional[Tuple[int, float]]:
+        """Return ``(point_index, distance_km)`` of the closest stored point."""
+        if self._root < 0:
+            return None
+        target = _unit_vector(latitude, longitude)
+        best_index = -1
+        best_dist = float("inf")
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            index = self._point[node]
+            vector = self._vectors[index]
+            dist = (
+                (vector[0] - target[0]) ** 2
+                + (vector[1] - target[1]) ** 2
+                + (vector[2] - target[2]) ** 2
+            )
+            if dist < best_dist:
+                best_dist, best_index = dist, index
+            delta = target[self._axis[node]] - vector[self._axis[node]]
+            near, far = (self._left[node], self._right[node]) if delta < 0 else (self._right[node], self._left[node])
+            if delta * delta < best_dist:
+                stack.append(far)
+            stack.append(near)
+        chord = sqrt(best_dist)
+        return best_index, 2 * EARTH_RADIUS_KM * asin(min(1.0, chord / 2))
+
+
+class CityLocator:
+    """Nearest-city reverse geocoder over the ``cities`` table."""
+
+    def __init__(self, rows: Iterable[Tuple[str, Optional[str], Optional[float], Optional[float]]]) -> None:
+        points: List[Tuple[float, float]] = []
+        self.labels: List[str] = []
+        for name, state, lat, lng in rows:
+            label = _format_city_label(name or "", state or "")
+            if not label or lat is None or lng is None:
+                continue
+            points.append((float(lat), float(lng)))
+            self.labels.append(label)
+        self.tree = KDTree(points)
+
+    def nearest(
+        self, latitude: float, longitude: float, max_distance_km: Optional[float] = None
+    ) -> Optional[Tuple[str, float]]:
+        found = self.tree.nearest(latitude, longitude)
+        if found is None:
+            return None
+        index, distance = found
+        if max_distance_km is not None and distance > max_distance_km:
+            return None
+        return self.labels[index], distance
+
+
+def get_city_locator() -> CityLocator:
+    """Return the process-wide nearest-city tree, rebuilt when the cities table changes."""
+
+    def _build(db: sqlite3.Connection) -> CityLocator:
+        rows = db.execute(
+            """
+            SELECT name, state, latitude, longitude
             FROM cities
-            WHERE LOWER(name) {comparator} LOWER(?)
-              AND latitude IS NOT NULL
-              AND longitude IS NOT NULL
-            ORDER BY (pincode IS NULL), pincode
-            LIMIT 1
-            """,
-            (value,),
-        ).fetchone()
-        if row and row["latitude"] is not None and row["longitude"] is not None:
-            return float(row["latitude"]), float(row["longitude"])
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            ORDER BY (pincode IS NULL), pincode, id
+            """
+        ).fetchall()
+        return CityLocator(tuple(row) for row in rows)
+
+    return _get_city_structure("locator", _build)
+
+
+@dataclass(frozen=True)
+class CityListArtifact:
+    """The city picker list as one immutable JSON document plus compressed copies."""
+
+    entries: List[Dict[str, object]]
+    digest: str
+    body: bytes
+    encoded: Dict[str, bytes]
+
+    @classmethod
+    def build(cls, entries: List[Dict[str, object]]) -> "CityListArtifact":
+        body = json.dumps(entries, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        encoded = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            encoded["br"] = brotli.compress(body, quality=11)
+        return cls(
+            entries=entries,
+            digest=hashlib.sha256(body).hexdigest()[:16],
+            body=body,
+            encoded=encoded,
+        )
+
+
+def get_city_list() -> CityListArtifact:
+    """Return the city list artifact for the current ``cities`` dataset version."""
+    return _get_city_structure(
+        "city_list", lambda db: CityListArtifact.build(load_city_entries(include_coordinates=True))
+    )
+
+
+def city_list_url() -> str:
+    """Content-addressed URL of the city list, safe for browsers and CDNs to cache forever."""
+    return url_for("city_list", digest=get_city_list().digest)
+
+
+class CitySuggester:
+    """Ranked ``name, state`` completions for the city pickers.
+
+    Every word start of every city name is a key in one sorted list, so a query
+    is a binary search for its key range. Matches at the start of the name rank
+    ahead of matches on a later word, then cities with more active cars, then
+    name order; an exact name match always comes first. One and two letter
+    prefixes have huge ranges, so their top results are computed up front.
+    """
+
+    _PRECOMPUTED_PREFIX = 2
+
+    def __init__(self, entries: Iterable[Mapping[str, object]], car_counts: Mapping[str, int]) -> None:
+        self.entries: List[Dict[str, object]] = []
+        self._names: List[str] = []
+        self._states: List[str] = []
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+        keyed: List[Tuple[str, Tuple[bool, int, str, int]]] = []
+        for entry in entries:
+            name = str(entry.get("name") or "").strip()
+            if not name:
+                continue
+            state = str(entry.get("state") or "").strip()
+            lowered = " ".join(name.lower().split())
+            cars = car_counts.get(lowered, 0)
+            index = len(self.entries)
+            self.entries.append(
+                {
+                    "label": _format_city_label(name, state),
+                    "name": name,
+                    "state": state,
+                    "latitude": entry.get("latitude"),
+                    "longitude": entry.get("longitude"),
+                    "cars": cars,
+                }
+            )
+            self._names.append(lowered)
+            self._states.append(state.lower())
+            self._exact[lowered].append(index)
+            for match in re.finditer(r"[^\s\-(/]+", lowered):
+                keyed.append((lowered[match.start():], (match.start() > 0, -cars, lowered, index)))
+        keyed.sort()
+        self._keys = [key for key, _ in keyed]
+        self._ranks = [rank for _, rank in keyed]
+        self._popular = sorted(
+            range(len(self.entries)), key=lambda index: (-self.entries[index]["cars"], self._names[index])
+        )
+        self._short: Dict[str, List[int]] = {}
+        for length in range(1, self._PRECOMPUTED_PREFIX + 1):
+            grouped: Dict[str, List[Tuple[bool, int, str, int]]] = defaultdict(list)
+            for key, rank in keyed:
+                if len(key) >= length:
+                    grouped[key[:length]].append(rank)
+            for prefix, ranks in grouped.items():
+                self._short[prefix] = self._dedupe(rank[3] for rank in sorted(ranks))[:CITY_SUGGEST_MAX_RESULTS]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def _dedupe(indexes: Iterable[int]) -> List[int]:
+        seen: set[int] = set()
+        return [index for index in indexes if not (index in seen or seen.add(index))]
+
+    def suggest(self, query: str, limit: int = CITY_SUGGEST_DEFAULT_RESULTS) -> List[Dict[str, object]]:
+        name_part, _, state_part = (query or "").partition(",")
+        text = " ".join(name_part.lower().split())
+        state_text = state_part.strip().lower()
+        if not text:
+            ordered = self._popular
+        elif not state_text and text in self._short:
+            ordered = self._short[text]
+        else:
+            start = bisect.bisect_left(self._keys, text)
+            stop = bisect.bisect_left(self._keys, text + "\uffff", lo=start)
+            ordered = [rank[3] for rank in sorted(self._ranks[start:stop])]
+        ordered = self._dedupe([*self._exact.get(text, ()), *ordered])
+        if state_text:
+            ordered = [index for index in ordered if self._states[index].startswith(state_text)]
+        return [self.entries[index] for index in ordered[:limit]]
+
+
+def get_city_suggester() -> CitySuggester:
+    """Return the suggestion index, rebuilt when cities or the cities of active cars change."""
+
+    def _build(db: sqlite3.Connection) -> CitySuggester:
+        car_counts: Dict[str, int] = defaultdict(int)
+        for row in db.execute(
+            "SELECT city, COUNT(*) AS total FROM cars WHERE is_active = 1 AND city <> '' GROUP BY city"
+        ):
+            car_counts[" ".join(row["city"].split(",")[0].lower().split())] += row["total"]
+        return CitySuggester(get_city_list().entries, car_counts)
+
+    return _get_city_structure("suggester", _build, ("cities", "car_cities"))
+
+
+def reverse_geocode_cities(points: Iterable[Tuple[float, float]]) -> List[Optional[str]]:
+    """Return the nearest ``"name, state"`` label for each point (None when too far away)."""
+    locator = get_city_locator()
+    labels: List[Optional[str]] = []
+    for latitude, longitude in points:
+        found = locator.nearest(latitude, longitude, REVERSE_GEOCODE_MAX_KM)
+        labels.append(found[0] if found else None)
+    return labels
+
+
+def _reverse_geocode_with_package(latitude: float, longitude: float) -> Optional[str]:
+    try:
+        import reverse_geocoder as rg  # type: ignore
+    except ImportError:
+        return None
+    try:
+        result = rg.search((latitude, longitude), mode=1)
+    except Exception:
         return None
+    if result:
+        return result[0].get("name")
+    return None
 
-    lowered = cleaned.lower()
-
-    exact = _query(lowered)
-    if exact:
-        return exact
 
-    tokens = [part.strip()
-              for part in re.split(r",|\s+", lowered) if part.strip()]
-    for size in range(len(tokens), 0, -1):
-        attempt = " ".join(tokens[:size])
-        result = _query(attempt)
-        if result:
-            return result
+def reverse_geocode_city(latitude: float, longitude: float) -> Optional[str]:
+    """Return our own ``"name, state"`` label for the city nearest to a point."""
+    if len(get_city_locator().tree):
+        return reverse_geocode_cities([(latitude, longitude)])[0]
+    # Only reached before the cities table has been seeded.
+    return _reverse_geocode_with_package(latitude, longitude)
+
+
+class SearchResultCache:
+    """Bounded LRU + TTL cache of radius-search candidates keyed by a snapped location.
+
+    Searches whose origin falls in the same ``SEARCH_CACHE_CELL_DEGREES`` cell and
+    share radius and filters reuse one candidate list, queried around the cell
+    centre with the radius widened by the cell's half-diagonal. Each request then
+    re-ranks those candidates from its exact origin, so snapping never changes
+    results. Covered areas are registered on the finest invalidation grid level
+    that needs at most ``SEARCH_CACHE_MAX_INVALIDATION_CELLS`` cells, so an entry
+    costs O(1) cells whatever its radius. Each entry is stamped with
+    ``search_area_version`` over those cells and is ignored once any worker's
+    write to a car or booking inside them has moved the stamp on. Within this
+    worker, writes also drop entries holding the car or covering its location
+    straight away.
+    """
 
-    prefix = _query(lowered + "%", comparator="LIKE")
-    if prefix:
-        return prefix
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[Any, ...], Tuple[float, int, List[Car], List[Tuple[int, int, int]]]]" = OrderedDict()
+        self._keys_by_cell: Dict[Tuple[int, int, int], set] = defaultdict(set)
+        self._levels: set[int] = set()
+        self._keys_by_car: Dict[int, set] = defaultdict(set)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    @staticmethod
+    def snap(latitude: float, longitude: float, radius_km: float) -> Tuple[Tuple[int, int], float, float, float]:
+        """Return the origin cell, its centre and the radius that covers any origin inside it."""
+        cell = grid_cell(latitude, longitude, SEARCH_CACHE_CELL_DEGREES)
+        centre_lat = (cell[0] + 0.5) * SEARCH_CACHE_CELL_DEGREES - 90.0
+        centre_lng = (cell[1] + 0.5) * SEARCH_CACHE_CELL_DEGREES - 180.0
+        half_diagonal_km = SEARCH_CACHE_CELL_DEGREES * KM_PER_DEGREE_LATITUDE * sqrt(2) / 2
+        return cell, centre_lat, centre_lng, radius_km + half_diagonal_km
+
+    @staticmethod
+    def invalidation_cells(latitude: float, longitude: float, radius_km: float) -> List[Tuple[int, int, int]]:
+        """Return ``(level, row, col)`` cells covering a search circle on the coarsest level it needs.
+
+        Level ``n`` cells are ``SEARCH_CACHE_INVALIDATION_DEGREES * 2**n`` wide.
+        """
+        min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+        level = 0
+        while True:
+            degrees = SEARCH_CACHE_INVALIDATION_DEGREES * (1 << level)
+            low_row, low_col = grid_cell(min_lat, min_lng, degrees)
+            high_row, high_col = grid_cell(max_lat, max_lng, degrees)
+            if (high_row - low_row + 1) * (high_col - low_col + 1) <= SEARCH_CACHE_MAX_INVALIDATION_CELLS:
+                break
+            if level == SEARCH_CACHE_MAX_INVALIDATION_LEVEL:
+                break
+            level += 1
+        return [
+            (level, row, col)
+            for row in range(low_row, high_row + 1)
+            for col in range(low_col, high_col + 1)
+        ]
+
+    def get(self, key: Tuple[Any, ...], version: int) -> Optional[List[Car]]:
+        """Return the entry's cars if it is live and was stamped with ``version``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic() or entry[1] != version:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Tuple[Any, ...], cars: List[Car], cells: List[Tuple[int, int, int]], version: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, version, cars, cells)
+            self._levels.add(cells[0][0])
+            for cell in cells:
+                self._keys_by_cell[cell].add(key)
+            for car in cars:
+                self._keys_by_car[car.id].add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key: Tuple[Any, ...]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        _, _, cars, cells = entry
+        for cell in cells:
+            keys = self._keys_by_cell.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_cell[cell]
+        for car in cars:
+            keys = self._keys_by_car.get(car.id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_car[car.id]
+
+    def invalidate_car(self, car_id: int, location: Optional[Tuple[float, float]]) -> int:
+        """Drop entries holding the car or covering its current location."""
+        with self._lock:
+            keys = set(self._keys_by_car.get(car_id, ()))
+            if location is not None:
+                for level in self._levels:
+                    degrees = SEARCH_CACHE_INVALIDATION_DEGREES * (1 << level)
+                    cell = (level, *grid_cell(location[0], location[1], degrees))
+                    keys.update(self._keys_by_cell.get(cell, ()))
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_cell.clear()
+            self._keys_by_car.clear()
+            self._levels.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
 
-    substring = _query("%" + lowered + "%", comparator="LIKE")
-    if substring:
-        return substring
 
-    return None
+search_result_cache = SearchResultCache(SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL_SECONDS)
 
 
 def fetch_available_cars(
@@ -1979,7 +4354,169 @@ def fetch_available_cars(
     seat_max: Optional[int] = None,
     require_gps: bool = False,
     fuel_types: Optional[List[str]] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+) -> List[Car]:
+    filters: Dict[str, Any] = {
+        "city": city,
+        "price_min": price_min,
+        "price_max": price_max,
+        "vehicle_types": vehicle_types,
+        "seat_min": seat_min,
+        "seat_max": seat_max,
+        "require_gps": require_gps,
+        "fuel_types": fuel_types,
+        "start_time": start_time,
+        "end_time": end_time,
+    }
+    if not radius_km or not search_result_cache.enabled:
+        return _query_car_candidates(latitude, longitude, radius_km, **filters)
+    candidates = fetch_car_candidates(latitude=latitude, longitude=longitude, radius_km=radius_km, **filters)
+    return _rank_cars(candidates, latitude, longitude, radius_km)
+
+
+def fetch_car_candidates(*, latitude: float, longitude: float, radius_km: float, **filters: Any) -> List[Car]:
+    """Return cars matching ``filters`` within at least ``radius_km``, in no particular order.
+
+    Takes the same filters as ``fetch_available_cars`` and serves them from
+    ``search_result_cache`` where possible; callers rank the result themselves.
+    """
+    if not radius_km or not search_result_cache.enabled:
+        return _query_car_candidates(latitude, longitude, radius_km, **filters)
+    key, area = _search_cache_slot(latitude, longitude, radius_km, filters)
+    cells = search_result_cache.invalidation_cells(*area)
+    # Read before the query, so a write that races with it still retires the entry.
+    version = search_area_version(cells)
+    candidates = search_result_cache.get(key, version)
+    if candidates is None:
+        candidates = _query_car_candidates(*area, **filters)
+        search_result_cache.put(key, candidates, cells, version)
+    return candidates
+
+
+def _search_cache_slot(
+    latitude: float, longitude: float, radius_km: float, filters: Mapping[str, Any]
+) -> Tuple[Tuple[Any, ...], Tuple[float, float, float]]:
+    """Return the cache key for a search and the ``(lat, lng, radius)`` area its entry covers."""
+    city = filters.get("city")
+    vehicle_types = filters.get("vehicle_types")
+    fuel_types = filters.get("fuel_types")
+    cell, centre_lat, centre_lng, reach_km = search_result_cache.snap(latitude, longitude, radius_km)
+    key = (
+        cell,
+        float(radius_km),
+        (city or "").strip().lower(),
+        filters.get("price_min"),
+        filters.get("price_max"),
+        tuple(sorted(value.lower() for value in vehicle_types or [])),
+        filters.get("seat_min"),
+        filters.get("seat_max"),
+        bool(filters.get("require_gps")),
+        tuple(sorted(value.lower() for value in fuel_types or [])),
+        filters.get("start_time"),
+        filters.get("end_time"),
+    )
+    return key, (centre_lat, centre_lng, reach_km)
+
+
+def fetch_nearest_cars(
+    *,
+    latitude: float,
+    longitude: float,
+    count: int = NEAREST_DEFAULT_COUNT,
+    max_radius_km: float = NEAREST_MAX_RADIUS_KM,
+    **filters: Any,
+) -> List[Car]:
+    """Return up to ``count`` of the closest available cars, nearest first.
+
+    The radius starts small and doubles until ``count`` available cars fall
+    inside it or ``max_radius_km`` is reached. Each step only queries the new
+    ring between the previous radius and the current one, and every car in a
+    ring is closer than anything outside it, so the hits collected so far stay
+    in order and the first ``count`` are the true nearest.
+    """
+    cars: List[Car] = []
+    inner_radius: Optional[float] = None
+    radius = min(NEAREST_START_RADIUS_KM, max_radius_km)
+    while True:
+        ring = _query_car_candidates(latitude, longitude, radius, min_radius_km=inner_radius, **filters)
+        cars.extend(car for car in ring if car.status == "Available")
+        if len(cars) >= count or radius >= max_radius_km:
+            return cars[:count]
+        inner_radius, radius = radius, min(radius * 2, max_radius_km)
+
+
+def _rank_cars(candidates: List[Car], latitude: float, longitude: float, radius_km: Optional[float]) -> List[Car]:
+    ranked = rank_by_distance(
+        latitude,
+        longitude,
+        [car.latitude for car in candidates],
+        [car.longitude for car in candidates],
+        [car.id for car in candidates],
+        radius_km,
+    )
+    return [
+        replace(candidates[index], distance_km=round(distance, 2))
+        for index, distance in ranked
+    ]
+
+
+def rank_car_page(
+    candidates: List[Car],
+    latitude: float,
+    longitude: float,
+    radius_km: Optional[float],
+    after: Optional[Tuple[float, int]],
+    limit: int,
+) -> Tuple[List[Tuple[Car, float]], int]:
+    """Return up to ``limit`` ``(car, exact distance)`` pairs after a keyset bound, and the total.
+
+    ``after`` is the unrounded ``(distance_km, id)`` of the previous page's last
+    car, so paging stays exact even if that car has since disappeared. Only the
+    page itself is turned into ``Car`` copies.
+    """
+    ranked = rank_by_distance(
+        latitude,
+        longitude,
+        [car.latitude for car in candidates],
+        [car.longitude for car in candidates],
+        [car.id for car in candidates],
+        radius_km,
+    )
+    start = 0
+    if after is not None:
+        start = bisect.bisect_right(ranked, after, key=lambda item: (item[1], candidates[item[0]].id))
+    page = [
+        (replace(candidates[index], distance_km=round(distance, 2)), distance)
+        for index, distance in ranked[start:start + limit]
+    ]
+    return page, len(ranked)
+
+
+def _query_car_candidates(
+    latitude: float,
+    longitude: float,
+    radius_km: Optional[float],
+    *,
+    city: Optional[str] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    vehicle_types: Optional[List[str]] = None,
+    seat_min: Optional[int] = None,
+    seat_max: Optional[int] = None,
+    require_gps: bool = False,
+    fuel_types: Optional[List[str]] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    min_radius_km: Optional[float] = None,
 ) -> List[Car]:
+    """Return matching active cars within ``radius_km`` as Car objects, nearest first.
+
+    With a ``start_time``/``end_time`` window, cars with an overlapping booked or
+    active rental are dropped, and the remaining cars are judged against that
+    window instead of by whether they are rented right now. ``min_radius_km``
+    leaves out cars at or inside that distance, turning the disc into a ring.
+    """
     db = get_db()
     params: List[object] = []
     predicates: List[str] = ["cars.is_active = 1"]
@@ -2009,6 +4546,41 @@ def fetch_available_cars(
         placeholders = ",".join("?" for _ in fuel_types)
         predicates.append(f"LOWER(cars.fuel_type) IN ({placeholders})")
         params.extend([ft.lower() for ft in fuel_types])
+    windowed = bool(start_time and end_time)
+    if windowed:
+        predicates.append(
+            f"""NOT EXISTS(
+                SELECT 1 FROM rentals
+                WHERE rentals.car_id = cars.id
+                  AND {OPEN_RENTAL_PREDICATE}
+                  AND {RENTAL_OVERLAP_PREDICATE}
+            )"""
+        )
+        params.extend([end_time, start_time])
+    source_clause = "cars"
+    prefilter = CAR_GEO_PREFILTER
+    if prefilter == "rtree" and not car_rtree_available(db):
+        prefilter = "grid"
+    if radius_km and prefilter == "rtree":
+        min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+        source_clause = "car_locations JOIN cars ON cars.id = car_locations.id"
+        predicates.append(
+            "car_locations.max_lat >= ? AND car_locations.min_lat <= ?"
+            " AND car_locations.max_lng >= ? AND car_locations.min_lng <= ?"
+        )
+        params.extend([min_lat, max_lat, min_lng, max_lng])
+    elif radius_km and prefilter == "grid":
+        candidate_ids = get_car_spatial_index().candidates(latitude, longitude, radius_km)
+        if not candidate_ids:
+            return []
+        predicates.append("cars.id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(sorted(candidate_ids)))
+    if min_radius_km:
+        # A car whose latitude and longitude offsets add up to no more than
+        # the inner radius in degrees is never farther than that radius, so
+        # this diamond can be skipped in SQL; the exact cut happens below.
+        predicates.append("ABS(cars.latitude - ?) + ABS(cars.longitude - ?) > ?")
+        params.extend([latitude, longitude, 0.999 * min_radius_km / KM_PER_DEGREE_LATITUDE])
 
     where_clause = " AND ".join(predicates)
 
@@ -2020,26 +4592,38 @@ def fetch_available_cars(
                EXISTS(
                    SELECT 1 FROM rentals
                    WHERE rentals.car_id = cars.id
-                     AND rentals.status IN ('booked', 'active')
+                     AND {OPEN_RENTAL_PREDICATE}
                ) AS has_active_rental
-        FROM cars
+        FROM {source_clause}
         JOIN users ON users.id = cars.owner_id
         WHERE {where_clause}
         """,
         params,
     ).fetchall()
 
-    car_ids = [row["id"] for row in rows]
+    ranked = rank_by_distance(
+        latitude,
+        longitude,
+        [row["latitude"] for row in rows],
+        [row["longitude"] for row in rows],
+        [row["id"] for row in rows],
+        radius_km,
+    )
+    if min_radius_km:
+        ranked = [(index, distance) for index, distance in ranked if distance > min_radius_km]
+    car_ids = [rows[index]["id"] for index, _ in ranked]
     images_by_car = fetch_car_images(car_ids)
     delivery_by_car = fetch_car_delivery_options(car_ids)
 
     cars: List[Car] = []
-    for row in rows:
-        distance = haversine_km(latitude, longitude,
-                                row["latitude"], row["longitude"])
-        if radius_km and distance > radius_km:
-            continue
-        is_available = row["is_available"] and not row["has_active_rental"]
+    for index, distance in ranked:
+        row = rows[index]
+        if windowed:
+            # Overlapping bookings were filtered out above; is_available only
+            # says whether the owner has the car listed.
+            is_available = row["is_available"]
+        else:
+            is_available = row["is_available"] and not row["has_active_rental"]
         owner_label = build_public_label(
             row["owner_account_name"] or row["owner_username"],
             fallback_prefix="Host",
@@ -2072,7 +4656,6 @@ def fetch_available_cars(
                 delivery_options=delivery_by_car.get(row["id"], {}),
             )
         )
-    cars.sort(key=lambda car: car.distance_km or 0)
     return cars
 
 
@@ -2097,6 +4680,7 @@ app.jinja_env.globals.update(
     support_whatsapp=COMPANY_SUPPORT_WHATSAPP,
     company_upi=COMPANY_UPI_ID,
     company_bank=COMPANY_BANK_DETAILS,
+    city_list_url=city_list_url,
 )
 
 
@@ -2130,6 +4714,43 @@ def parse_iso(value: Optional[str]) -> Optional[datetime]:
         return None
 
 
+def trip_window(start_raw: Optional[str], end_raw: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Return the ``(start, end)`` ISO strings of a requested trip, or None without a start.
+
+    A missing or inverted end falls back to the four hour default used for bookings.
+    """
+    start_dt = parse_iso(parse_datetime(start_raw))
+    if start_dt is None:
+        return None
+    end_dt = parse_iso(parse_datetime(end_raw))
+    if end_dt is None or end_dt <= start_dt:
+        end_dt = start_dt + timedelta(hours=DEFAULT_TRIP_HOURS)
+    return start_dt.isoformat(), end_dt.isoformat()
+
+
+def car_has_conflicting_rental(
+    db: sqlite3.Connection,
+    car_id: int,
+    start_iso: str,
+    end_iso: str,
+    exclude_rental_id: Optional[int] = None,
+) -> bool:
+    """Return True when an open rental of ``car_id`` overlaps the half-open window.
+
+    ``exclude_rental_id`` leaves out the rental being changed, e.g. when extending it.
+    """
+    row = db.execute(
+        f"""
+        SELECT 1 FROM rentals
+        WHERE rentals.car_id = ? AND rentals.id != ?
+          AND {OPEN_RENTAL_PREDICATE} AND {RENTAL_OVERLAP_PREDICATE}
+        LIMIT 1
+        """,
+        (car_id, exclude_rental_id if exclude_rental_id is not None else -1, end_iso, start_iso),
+    ).fetchone()
+    return row is not None
+
+
 def parse_float(value: Optional[str], default: Optional[float] = None) -> Optional[float]:
     if value in (None, ""):
         return default
@@ -2148,6 +4769,22 @@ def parse_int(value: Optional[str]) -> Optional[int]:
         return None
 
 
+def search_radius(radius_km: Optional[float]) -> float:
+    """Return the radius to search: the default when unset, capped at ``SEARCH_MAX_RADIUS_KM``."""
+    if radius_km is None or not isfinite(radius_km) or radius_km <= 0:
+        return SEARCH_DEFAULT_RADIUS_KM
+    return min(radius_km, SEARCH_MAX_RADIUS_KM)
+
+
+def valid_coordinates(latitude: Optional[float], longitude: Optional[float]) -> bool:
+    """Return True for a finite latitude/longitude pair inside the usual ranges."""
+    if latitude is None or longitude is None:
+        return False
+    if not isfinite(latitude) or not isfinite(longitude):
+        return False
+    return -90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0
+
+
 def calculate_pricing(
     rate_per_hour: float,
     daily_rate: float,
@@ -2199,6 +4836,85 @@ def calculate_pricing(
     }
 
 
+def calculate_pricing_batch(
+    rates_per_hour: Sequence[float],
+    daily_rates: Sequence[Optional[float]],
+    start: datetime,
+    end: datetime,
+    promo_code: Optional[str] = None,
+) -> List[Dict[str, object]]:
+    """Quote many cars for one trip; element ``i`` equals ``calculate_pricing`` for car ``i``.
+
+    The trip split and promo lookup are done once, and the per-car arithmetic runs
+    over whole arrays (NumPy when available). The operations match the scalar
+    version step for step so the floats round identically.
+    """
+    if end <= start:
+        end = start + timedelta(hours=4)
+    hours = max(1.0, (end - start).total_seconds() / 3600)
+    full_days = int(hours // 24)
+    remaining_hours = hours - (full_days * 24)
+    remaining_hours = ceil(remaining_hours) if remaining_hours > 0 else 0
+
+    discount_rate = 0.0
+    applied = None
+    if promo_code:
+        code = promo_code.upper().strip()
+        if code in PROMO_CODES:
+            discount_rate = PROMO_CODES[code]
+            applied = code
+
+    package_hours_list = (4, 8, 24)
+    if np is not None:
+        rates = np.asarray(rates_per_hour, dtype=float)
+        daily = np.asarray([value or 0.0 for value in daily_rates], dtype=float)
+        effective = np.where(daily != 0, daily, rates * 24)
+        base = full_days * effective
+        if remaining_hours:
+            base = base + np.minimum(effective, remaining_hours * rates)
+        base_totals = base.tolist()
+        package_columns = [
+            np.minimum(effective, rates * package_hours).tolist() for package_hours in package_hours_list
+        ]
+        discount_products = (base * discount_rate).tolist() if applied else None
+    else:
+        effective = [daily or rate * 24 for rate, daily in zip(rates_per_hour, daily_rates)]
+        base_totals = [full_days * value for value in effective]
+        if remaining_hours:
+            base_totals = [
+                total + min(value, remaining_hours * rate)
+                for total, value, rate in zip(base_totals, effective, rates_per_hour)
+            ]
+        package_columns = [
+            [min(value, rate * package_hours) for value, rate in zip(effective, rates_per_hour)]
+            for package_hours in package_hours_list
+        ]
+        discount_products = [total * discount_rate for total in base_totals] if applied else None
+
+    hours_label = round(hours, 2)
+    package_labels = [
+        (f"{package_hours}-hour pack" if package_hours != 24 else "Full day", package_hours, column)
+        for package_hours, column in zip(package_hours_list, package_columns)
+    ]
+    quotes: List[Dict[str, object]] = []
+    for index, base_total in enumerate(base_totals):
+        discount = round(discount_products[index], 2) if discount_products is not None else 0.0
+        quotes.append(
+            {
+                "hours": hours_label,
+                "base_amount": round(base_total, 2),
+                "discount": discount,
+                "total": max(0.0, round(base_total - discount, 2)),
+                "promo_applied": applied,
+                "packages": [
+                    {"label": label, "hours": package_hours, "price": round(column[index], 2)}
+                    for label, package_hours, column in package_labels
+                ],
+            }
+        )
+    return quotes
+
+
 @app.before_request
 def load_logged_in_user() -> None:
     user_id = session.get("user_id")
@@ -2674,7 +5390,6 @@ def admin_user_detail(user_id: int) -> str:
         car = dict(row)
         car["images"] = car_images.get(row["id"], [])
         cars.append(car)
-    city_entries = load_city_entries(include_coordinates=True)
     payout_row = db.execute(
         "SELECT account_holder, account_number, ifsc_code, upi_id, updated_at FROM user_payout_details WHERE user_id = ?",
         (user_id,),
@@ -2690,7 +5405,6 @@ def admin_user_detail(user_id: int) -> str:
         payout=payout,
         stats=stats,
         cars=cars,
-        city_entries=city_entries,
         delivery_choices=DELIVERY_DISTANCE_CHOICES,
         admin_message=admin_message,
         admin_error=admin_error,
@@ -2716,7 +5430,7 @@ def admin_download_user_document(user_id: int, doc_id: int):
     upload_root = UPLOAD_ROOT.resolve()
     if not str(resolved).startswith(str(upload_root)):
         abort(403)
-    return send_from_directory(resolved.parent, resolved.name, as_attachment=True)
+    return send_upload(resolved.relative_to(upload_root).as_posix(), as_attachment=True)
 
 
 @app.post("/admin/users/<int:user_id>/reset-password")
@@ -2803,12 +5517,9 @@ def admin_rentals() -> str:
     rentals = [dict(row) for row in rows]
     car_images = fetch_car_images([row["car_id"] for row in rentals])
     booking_map = generate_booking_identifier_map()
+    apply_rental_destinations(rentals)
     for rental in rentals:
         rental["images"] = car_images.get(rental["car_id"], [])
-        try:
-            rental["trip_destinations_list"] = json.loads(rental.get("trip_destinations") or "[]")
-        except (TypeError, json.JSONDecodeError):
-            rental["trip_destinations_list"] = []
         owner_share = max(0.0, float(rental.get("owner_payout_amount") or 0.0))
         rental["owner_share_amount"] = round(owner_share, 2)
         rental["owner_advance_amount"] = round(owner_share * OWNER_INITIAL_PAYOUT_RATE, 2)
@@ -3130,28 +5841,135 @@ def admin_release_owner_payout(rental_id: int) -> str:
 @login_required
 @admin_required
 def admin_map() -> str:
+    return render_template("admin_map.html")
+
+
+@app.route("/admin/map/clusters")
+@login_required
+@admin_required
+def admin_map_clusters():
+    """Clusters for the visible part of the fleet map, or single vehicles once zoomed in."""
+    try:
+        west, south, east, north = (float(part) for part in request.args.get("bbox", "").split(","))
+    except ValueError:
+        return jsonify({"error": "bbox must be west,south,east,north"}), 400
+    zoom = parse_int(request.args.get("zoom")) or 0
+    west, east = max(-180.0, west), min(180.0, east)
+    if zoom <= FLEET_CLUSTER_MAX_ZOOM:
+        index = get_fleet_cluster_index()
+        return jsonify(
+            {
+                "zoom": zoom,
+                "total": index.total,
+                "clusters": index.clusters(west, south, east, north, zoom),
+                "vehicles": [],
+            }
+        )
     db = get_db()
-    vehicle_rows = db.execute(
-        """
-        SELECT cars.id, cars.name, cars.vehicle_type, cars.latitude, cars.longitude, cars.city, users.username AS owner_username
-        FROM cars
+    if car_rtree_available(db):
+        source_clause = "car_locations JOIN cars ON cars.id = car_locations.id"
+        bbox_clause = (
+            "car_locations.max_lat >= ? AND car_locations.min_lat <= ?"
+            " AND car_locations.max_lng >= ? AND car_locations.min_lng <= ?"
+        )
+    else:
+        source_clause = "cars"
+        bbox_clause = (
+            "cars.is_active = 1 AND cars.latitude BETWEEN ? AND ? AND cars.longitude BETWEEN ? AND ?"
+        )
+    rows = db.execute(
+        f"""
+        SELECT cars.id, cars.name, cars.vehicle_type, cars.latitude, cars.longitude, cars.city,
+               users.username AS owner_username,
+               EXISTS(
+                   SELECT 1 FROM rentals WHERE rentals.car_id = cars.id AND rentals.status = 'active'
+               ) AS on_trip
+        FROM {source_clause}
         JOIN users ON users.id = cars.owner_id
-        WHERE cars.latitude IS NOT NULL AND cars.longitude IS NOT NULL
-        """
+        WHERE {bbox_clause}
+        LIMIT ?
+        """,
+        (south, north, west, east, FLEET_MAP_MAX_VEHICLES),
     ).fetchall()
-    active_ids = [row["car_id"] for row in db.execute(
-        "SELECT DISTINCT car_id FROM rentals WHERE status = 'active'"
-    ).fetchall()]
-    vehicles = [dict(row) for row in vehicle_rows]
-    for vehicle in vehicles:
+    vehicles = [
+        {
+            "id": row["id"],
+            "name": row["name"],
+            "vehicle_type": row["vehicle_type"],
+            "latitude": float(row["latitude"]),
+            "longitude": float(row["longitude"]),
+            "city": row["city"],
+            "owner_username": row["owner_username"],
+            "active": bool(row["on_trip"]),
+        }
+        for row in rows
+    ]
+    return jsonify({"zoom": zoom, "clusters": [], "vehicles": vehicles})
+
+
+@app.route("/admin/map/demand")
+@login_required
+@admin_required
+def admin_map_demand():
+    """Searches per geohash cell over the last ``hours`` next to the listings in each cell."""
+    hours = parse_int(request.args.get("hours")) or SEARCH_DEMAND_DEFAULT_HOURS
+    hours = max(1, min(SEARCH_DEMAND_MAX_HOURS, hours))
+    since = (naive_utcnow() - timedelta(hours=hours)).isoformat()[:13]
+    bbox = None
+    if request.args.get("bbox"):
         try:
-            vehicle["latitude"] = float(
-                vehicle["latitude"]) if vehicle["latitude"] is not None else None
-            vehicle["longitude"] = float(
-                vehicle["longitude"]) if vehicle["longitude"] is not None else None
-        except (TypeError, ValueError):
-            vehicle["latitude"] = vehicle["longitude"] = None
-    return render_template("admin_map.html", vehicles=vehicles, active_vehicle_ids=active_ids)
+            west, south, east, north = (float(part) for part in request.args["bbox"].split(","))
+        except ValueError:
+            return jsonify({"error": "bbox must be west,south,east,north"}), 400
+        bbox = (west, south, east, north)
+    searches = {
+        row[0]: int(row[1])
+        for row in get_db().execute(
+            "SELECT geohash, SUM(searches) FROM search_demand WHERE hour >= ? GROUP BY geohash",
+            (since,),
+        )
+    }
+    listings = get_listing_geohash_counts()
+    cells = []
+    for geohash in searches.keys() | listings.keys():
+        south_edge, west_edge, north_edge, east_edge = geohash_bounds(geohash)
+        if bbox and (
+            east_edge < bbox[0] or west_edge > bbox[2] or north_edge < bbox[1] or south_edge > bbox[3]
+        ):
+            continue
+        cells.append(
+            {
+                "geohash": geohash,
+                "bounds": [south_edge, west_edge, north_edge, east_edge],
+                "searches": searches.get(geohash, 0),
+                "cars": listings.get(geohash, 0),
+            }
+        )
+    cells.sort(key=lambda cell: (-cell["searches"], cell["geohash"]))
+    return jsonify({"hours": hours, "cells": cells})
+
+
+def collect_runtime_metrics() -> Dict[str, Any]:
+    """Return per-worker cache and index counters for capacity planning."""
+    return {
+        "pid": os.getpid(),
+        "search_cache": search_result_cache.stats(),
+        "car_grid": {"cars": len(car_spatial_index), "cell_degrees": car_spatial_index.cell_degrees},
+        "search_events": search_event_writer.stats(),
+        "visit_events": visit_event_writer.stats(),
+        "tile_memory_cache": tile_memory_cache.stats(),
+        "tile_store": tile_store.backend,
+        "tile_fetches": {**tile_fetches.stats(), **tile_fetch_counters},
+        "tile_upstream": tile_upstream_stats(),
+        "tile_disk_cache": tile_cache_janitor.stats(),
+    }
+
+
+@app.route("/admin/metrics")
+@login_required
+@admin_required
+def admin_metrics():
+    return jsonify(collect_runtime_metrics())
 
 
 @app.route("/admin/feedback")
@@ -3245,7 +6063,6 @@ def home() -> str:
         context = build_admin_dashboard_context()
         return render_template("admin_dashboard.html", **context)
     db = get_db()
-    cities = load_city_entries()
     vehicle_type_values = load_vehicle_type_options()
     additional_vehicle_types = [
         vt for vt in vehicle_type_values if vt not in POPULAR_VEHICLE_TYPES
@@ -3473,7 +6290,6 @@ def home() -> str:
         )
     return render_template(
         "home.html",
-        cities=cities,
         vehicle_types=additional_vehicle_types,
         popular_vehicle_types=POPULAR_VEHICLE_TYPES,
         fuel_types=fuel_types,
@@ -3484,6 +6300,76 @@ def home() -> str:
     )
 
 
+def parse_search_filters(values: MultiDict) -> Dict[str, Any]:
+    """Read the shared search filter fields from form data or query arguments."""
+    unit = (values.get("price_unit") or "hour").lower()
+    fuel_type_raw = (values.get("fuel_type") or "").strip()
+    return {
+        "vehicle_types": [v for v in values.getlist("vehicle_types") if v],
+        "price_min": parse_float(values.get("price_min")),
+        "price_max": parse_float(values.get("price_max")),
+        "seat_min": parse_int(values.get("seat_min")),
+        "seat_max": parse_int(values.get("seat_max")),
+        "require_gps": values.get("require_gps") in {"1", "true", "on"},
+        "price_unit": unit if unit in {"hour", "day"} else "hour",
+        "fuel_type": fuel_type_raw or None,
+        "destinations": [
+            value.strip() for value in values.getlist("destinations") if value and value.strip()
+        ],
+        "trip_window": trip_window(values.get("start_time"), values.get("end_time")),
+    }
+
+
+def search_filter_arguments(filters: Mapping[str, Any]) -> Dict[str, Any]:
+    """Translate parsed search filters into ``fetch_available_cars`` keyword arguments."""
+
+    def convert_price(value: Optional[float]) -> Optional[float]:
+        if value is None:
+            return None
+        if filters["price_unit"] == "day":
+            return value / 24
+        return value
+
+    return {
+        "price_min": convert_price(filters["price_min"]),
+        "price_max": convert_price(filters["price_max"]),
+        "vehicle_types": filters["vehicle_types"],
+        "seat_min": filters["seat_min"],
+        "seat_max": filters["seat_max"],
+        "require_gps": filters["require_gps"],
+        "fuel_types": [filters["fuel_type"]] if filters["fuel_type"] else None,
+        "start_time": filters["trip_window"][0] if filters["trip_window"] else None,
+        "end_time": filters["trip_window"][1] if filters["trip_window"] else None,
+    }
+
+
+def car_to_payload(car: Car) -> Dict[str, Any]:
+    """Return the public JSON representation of a search result."""
+    return {
+        "id": car.id,
+        "name": car.name,
+        "latitude": car.latitude,
+        "longitude": car.longitude,
+        "distance_km": car.distance_km,
+        "status": car.status,
+        "rate_per_hour": car.rate_per_hour,
+        "daily_rate": car.daily_rate,
+        "seats": car.seats,
+        "owner_public_name": car.owner_public_name,
+        "city": car.city,
+        "image_url": car.image_url,
+        "vehicle_type": car.vehicle_type,
+        "size_category": car.size_category,
+        "has_gps": car.has_gps,
+        "fuel_type": car.fuel_type,
+        "transmission": car.transmission,
+        "rating": car.rating,
+        "description": car.description,
+        "images": car.images,
+        "delivery_options": car.delivery_options,
+    }
+
+
 @app.route("/search", methods=["GET", "POST"])
 def search() -> str:
     profile_warning = None
@@ -3491,11 +6377,6 @@ def search() -> str:
     if user is not None and not getattr(g, 'profile_complete', False):
         profile_warning = "You can browse vehicles, but please complete your profile before confirming a booking."
     db = get_db()
-    city_entries = load_city_entries(include_coordinates=True)
-    city_options = [
-        _format_city_label(entry["name"], entry["state"])
-        for entry in city_entries
-    ]
 
     cars: List[Car] = []
     cars_payload: List[dict] = []
@@ -3510,106 +6391,43 @@ def search() -> str:
     detected_city = None
     start_time_raw = end_time_raw = None
     error = request.args.get("error")
+    searched = False
+    nearest_fallback = False
 
     available_vehicle_types = load_vehicle_type_options()
     fuel_types = build_fuel_type_list()
 
-    filters = {
-        "vehicle_types": [],
-        "price_min": None,
-        "price_max": None,
-        "seat_min": None,
-        "seat_max": None,
-        "require_gps": False,
-        "price_unit": "hour",
-        "fuel_type": None,
-        "destinations": [],
-    }
-
-    def normalize_unit(raw: str | None) -> str:
-        unit = (raw or "hour").lower()
-        return unit if unit in {"hour", "day"} else "hour"
-
-    def convert_price(value: Optional[float], unit: str) -> Optional[float]:
-        if value is None:
-            return None
-        if unit == "day":
-            return value / 24
-        return value
+    values = request.form if request.method == "POST" else request.args
+    filters = parse_search_filters(values)
+    filter_arguments = search_filter_arguments(filters)
+    destinations = filters["destinations"]
+    start_time_raw = values.get("start_time")
+    end_time_raw = values.get("end_time")
 
     if request.method == "POST":
-        start_time_raw = request.form.get("start_time")
-        end_time_raw = request.form.get("end_time")
-        filters["vehicle_types"] = [
-            v for v in request.form.getlist("vehicle_types") if v]
-        filters["price_unit"] = normalize_unit(request.form.get("price_unit"))
-        filters["price_min"] = parse_float(request.form.get("price_min"))
-        filters["price_max"] = parse_float(request.form.get("price_max"))
-        filters["seat_min"] = parse_int(request.form.get("seat_min"))
-        filters["seat_max"] = parse_int(request.form.get("seat_max"))
-        filters["require_gps"] = request.form.get("require_gps") == "on"
-        fuel_type_raw = request.form.get("fuel_type", "").strip()
-        filters["fuel_type"] = fuel_type_raw or None
-        destinations = [value.strip() for value in request.form.getlist(
-            "destinations") if value and value.strip()]
-        filters["destinations"] = destinations
-        price_min_hours = convert_price(
-            filters["price_min"], filters["price_unit"])
-        price_max_hours = convert_price(
-            filters["price_max"], filters["price_unit"])
         lat_raw = request.form.get("latitude", "").strip()
         lon_raw = request.form.get("longitude", "").strip()
         radius_raw = request.form.get("radius", "").strip()
         latitude = parse_float(lat_raw)
         longitude = parse_float(lon_raw)
-        radius = parse_float(radius_raw)
-        radius = radius if radius is not None else 10.0
-        if latitude is not None and longitude is not None:
+        radius = search_radius(parse_float(radius_raw))
+        if valid_coordinates(latitude, longitude):
             if not city:
                 detected_city = reverse_geocode_city(latitude, longitude)
-                city = detected_city or city
+                if detected_city:
+                    city = detected_city.split(",")[0].strip()
                 if detected_city and not city_display:
                     city_display = detected_city
-            city_filter = city if latitude is None or longitude is None else None
             cars = fetch_available_cars(
                 latitude=latitude,
                 longitude=longitude,
                 radius_km=radius,
-                city=city_filter,
-                price_min=price_min_hours,
-                price_max=price_max_hours,
-                vehicle_types=filters["vehicle_types"],
-                seat_min=filters["seat_min"],
-                seat_max=filters["seat_max"],
-                require_gps=filters["require_gps"],
-                fuel_types=[filters["fuel_type"]
-                            ] if filters["fuel_type"] else None,
+                **filter_arguments,
             )
-            if not cars:
-                error = "No cars found within the selected filters."
+            searched = True
         else:
             latitude = longitude = None
     else:
-        start_time_raw = request.args.get("start_time")
-        end_time_raw = request.args.get("end_time")
-        filters["vehicle_types"] = [
-            v for v in request.args.getlist("vehicle_types") if v]
-        filters["price_unit"] = normalize_unit(request.args.get("price_unit"))
-        filters["price_min"] = parse_float(request.args.get("price_min"))
-        filters["price_max"] = parse_float(request.args.get("price_max"))
-        filters["seat_min"] = parse_int(request.args.get("seat_min"))
-        filters["seat_max"] = parse_int(request.args.get("seat_max"))
-        filters["require_gps"] = request.args.get(
-            "require_gps") in {"1", "true", "on"}
-        fuel_type_raw = request.args.get("fuel_type", "")
-        filters["fuel_type"] = fuel_type_raw.strip() or None
-        destinations = [value.strip() for value in request.args.getlist(
-            "destinations") if value and value.strip()]
-        filters["destinations"] = destinations
-        price_min_hours = convert_price(
-            filters["price_min"], filters["price_unit"])
-        price_max_hours = convert_price(
-            filters["price_max"], filters["price_unit"])
         try:
             lat_query = request.args.get("latitude")
             lon_query = request.args.get("longitude")
@@ -3617,24 +6435,18 @@ def search() -> str:
             latitude = float(lat_query) if lat_query else None
             longitude = float(lon_query) if lon_query else None
             radius = float(radius_query) if radius_query else None
+            if not valid_coordinates(latitude, longitude):
+                latitude = longitude = None
             if latitude is not None and longitude is not None:
-                lookup_radius = radius if radius is not None else 10.0
-                city_filter = city if latitude is None or longitude is None else None
+                lookup_radius = search_radius(radius)
                 cars = fetch_available_cars(
                     latitude=latitude,
                     longitude=longitude,
                     radius_km=lookup_radius,
-                    city=city_filter,
-                    price_min=price_min_hours,
-                    price_max=price_max_hours,
-                    vehicle_types=filters["vehicle_types"],
-                    seat_min=filters["seat_min"],
-                    seat_max=filters["seat_max"],
-                    require_gps=filters["require_gps"],
-                    fuel_types=[filters["fuel_type"]
-                                ] if filters["fuel_type"] else None,
+                    **filter_arguments,
                 )
                 radius = lookup_radius
+                searched = True
         except (TypeError, ValueError):
             latitude = longitude = None
             radius = None
@@ -3645,84 +6457,63 @@ def search() -> str:
             latitude, longitude = coords
             if radius is None:
                 radius = 10.0
+            pincode = normalize_pincode(city)
+            if pincode:
+                city_display = load_pincode_index().label(pincode) or city_display
             if not city_display:
                 city_display = city
 
-    if not cars and latitude is not None and longitude is not None:
-        lookup_radius = radius if radius is not None else 10.0
-        city_filter = city if latitude is None or longitude is None else None
+    if not searched and latitude is not None and longitude is not None:
+        lookup_radius = search_radius(radius)
         cars = fetch_available_cars(
             latitude=latitude,
             longitude=longitude,
             radius_km=lookup_radius,
-            city=city_filter,
-            price_min=price_min_hours,
-            price_max=price_max_hours,
-            vehicle_types=filters["vehicle_types"],
-            seat_min=filters["seat_min"],
-            seat_max=filters["seat_max"],
-            require_gps=filters["require_gps"],
-            fuel_types=[filters["fuel_type"]
-                        ] if filters["fuel_type"] else None,
+            **filter_arguments,
         )
         radius = lookup_radius
 
+    if not cars and latitude is not None and longitude is not None:
+        cars = fetch_nearest_cars(latitude=latitude, longitude=longitude, **filter_arguments)
+        nearest_fallback = bool(cars)
+    if not cars and searched and request.method == "POST":
+        error = "No cars found within the selected filters."
+
     start_dt = parse_iso(parse_datetime(start_time_raw))
     end_dt = parse_iso(parse_datetime(end_time_raw))
 
+    logged_filters = {
+        "vehicle_types": filters["vehicle_types"],
+        "seat_min": filters["seat_min"],
+        "seat_max": filters["seat_max"],
+        "price_min": filters["price_min"],
+        "price_max": filters["price_max"],
+        "require_gps": filters["require_gps"],
+        "fuel_type": filters["fuel_type"],
+        "trip_window": filters["trip_window"],
+    }
     app.logger.info(
         "search results count=%s filters=%s lat=%s lng=%s radius=%s destinations=%s user_id=%s",
         len(cars),
-        {
-            "vehicle_types": filters["vehicle_types"],
-            "seat_min": filters["seat_min"],
-            "seat_max": filters["seat_max"],
-            "price_min": filters["price_min"],
-            "price_max": filters["price_max"],
-            "require_gps": filters["require_gps"],
-            "fuel_type": filters["fuel_type"],
-        },
+        logged_filters,
         latitude,
         longitude,
         radius,
         destinations,
         user["id"] if user else None,
     )
+    if latitude is not None and longitude is not None:
+        record_search_event(latitude, longitude, radius, len(cars), logged_filters, user["id"] if user else None)
     if cars:
-        for car in cars:
-            cars_payload.append(
-                {
-                    "id": car.id,
-                    "name": car.name,
-                    "latitude": car.latitude,
-                    "longitude": car.longitude,
-                    "distance_km": car.distance_km,
-                    "status": car.status,
-                    "rate_per_hour": car.rate_per_hour,
-                    "daily_rate": car.daily_rate,
-                    "seats": car.seats,
-                    "owner_public_name": car.owner_public_name,
-                    "city": car.city,
-                    "image_url": car.image_url,
-                    "vehicle_type": car.vehicle_type,
-                    "size_category": car.size_category,
-                    "has_gps": car.has_gps,
-                    "fuel_type": car.fuel_type,
-                    "transmission": car.transmission,
-                    "rating": car.rating,
-                    "description": car.description,
-                    "images": car.images,
-                    "delivery_options": car.delivery_options,
-                }
-            )
+        cars_payload = [car_to_payload(car) for car in cars]
         if start_dt and end_dt:
-            for car in cars:
-                pricing_map[car.id] = calculate_pricing(
-                    car.rate_per_hour,
-                    car.daily_rate,
-                    start_dt,
-                    end_dt,
-                )
+            quotes = calculate_pricing_batch(
+                [car.rate_per_hour for car in cars],
+                [car.daily_rate for car in cars],
+                start_dt,
+                end_dt,
+            )
+            pricing_map = {car.id: quote for car, quote in zip(cars, quotes)}
 
     start_display = format_trip_datetime(start_time_raw) if start_time_raw else "-"
     end_display = format_trip_datetime(end_time_raw) if end_time_raw else "-"
@@ -3743,17 +6534,159 @@ def search() -> str:
         start_time_display=start_display,
         end_time_display=end_display,
         error=error,
+        nearest_fallback=nearest_fallback,
         filters=filters,
         available_vehicle_types=available_vehicle_types,
         fuel_types=fuel_types,
         destinations=destinations,
         profile_warning=profile_warning,
-        city_options=city_options,
-        city_entries=city_entries,
         popular_vehicle_types=POPULAR_VEHICLE_TYPES,
     )
 
 
+def encode_search_cursor(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Optional[Dict[str, Any]]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def search_query_fingerprint(values: MultiDict) -> str:
+    """Hash every query argument except paging ones so a cursor only resumes its own search."""
+    items = sorted(
+        (key, value)
+        for key in values.keys()
+        if key not in {"cursor", "limit"}
+        for value in values.getlist(key)
+    )
+    return hashlib.sha1(json.dumps(items).encode("utf-8")).hexdigest()[:12]
+
+
+def search_cursor_bound(cursor: Dict[str, Any]) -> Optional[Tuple[float, int]]:
+    """Return the ``(distance_km, id)`` keyset bound stored in a cursor, or None if malformed."""
+    distance, car_id = cursor.get("d"), cursor.get("i")
+    if isinstance(distance, bool) or not isinstance(distance, (int, float)) or not isfinite(distance):
+        return None
+    if isinstance(car_id, bool) or not isinstance(car_id, int):
+        return None
+    return float(distance), car_id
+
+
+@app.route("/cities.<digest>.json")
+def city_list(digest: str):
+    """Serve the precompressed city list; the digest in the URL pins its content."""
+    artifact = get_city_list()
+    if digest != artifact.digest:
+        response = redirect(url_for("city_list", digest=artifact.digest))
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    encoding = next(
+        (name for name in ("br", "gzip") if name in artifact.encoded and request.accept_encodings[name]),
+        None,
+    )
+    etag = f"{artifact.digest}-{encoding}" if encoding else artifact.digest
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(artifact.encoded[encoding] if encoding else artifact.body)
+        response.headers["Content-Type"] = "application/json; charset=utf-8"
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+@app.route("/api/cities/suggest")
+def api_city_suggest():
+    """Top city completions for a typed prefix; ``q`` may include ``, state``."""
+    query = (request.args.get("q") or "").strip()[:80]
+    limit = parse_int(request.args.get("limit")) or CITY_SUGGEST_DEFAULT_RESULTS
+    limit = max(1, min(limit, CITY_SUGGEST_MAX_RESULTS))
+    response = jsonify({"query": query, "results": get_city_suggester().suggest(query, limit)})
+    response.headers["Cache-Control"] = f"public, max-age={CITY_SUGGEST_CACHE_SECONDS}"
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@app.route("/api/search")
+def api_search():
+    """Distance-ordered search results in pages, for lazy-loading maps and lists.
+
+    ``nearest=k`` replaces the radius with the k closest available cars.
+    """
+    args = request.args
+    filters = parse_search_filters(args)
+    latitude = parse_float(args.get("latitude"))
+    longitude = parse_float(args.get("longitude"))
+    if (latitude is not None or longitude is not None) and not valid_coordinates(latitude, longitude):
+        return jsonify({"error": "latitude must be within [-90, 90] and longitude within [-180, 180]."}), 400
+    radius = parse_float(args.get("radius"))
+    if radius is not None and (not isfinite(radius) or radius < 0):
+        return jsonify({"error": "radius must be a non-negative number of kilometres."}), 400
+    radius = search_radius(radius)
+    city = (args.get("city") or "").split(",")[0].strip()
+    if (latitude is None or longitude is None) and city:
+        coords = lookup_city_coordinates(city)
+        if coords:
+            latitude, longitude = coords
+    if latitude is None or longitude is None:
+        return jsonify({"error": "Provide latitude/longitude or a known city or PIN code."}), 400
+    limit = parse_int(args.get("limit")) or SEARCH_API_DEFAULT_PAGE_SIZE
+    limit = max(1, min(limit, SEARCH_API_MAX_PAGE_SIZE))
+    fingerprint = search_query_fingerprint(args)
+    after = None
+    if args.get("cursor"):
+        cursor = decode_search_cursor(args["cursor"])
+        after = search_cursor_bound(cursor) if cursor and cursor.get("q") == fingerprint else None
+        if after is None:
+            return jsonify({"error": "Invalid or expired cursor."}), 400
+
+    nearest = parse_int(args.get("nearest"))
+    if nearest and nearest > 0:
+        nearest = min(nearest, NEAREST_MAX_COUNT)
+        radius = None
+        candidates = fetch_nearest_cars(
+            latitude=latitude,
+            longitude=longitude,
+            count=nearest,
+            **search_filter_arguments(filters),
+        )
+    else:
+        nearest = None
+        candidates = fetch_car_candidates(
+            latitude=latitude,
+            longitude=longitude,
+            radius_km=radius,
+            **search_filter_arguments(filters),
+        )
+    page, total = rank_car_page(candidates, latitude, longitude, radius, after, limit + 1)
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last, last_distance = page[-1]
+        next_cursor = encode_search_cursor({"q": fingerprint, "i": last.id, "d": last_distance})
+    return jsonify(
+        {
+            "latitude": latitude,
+            "longitude": longitude,
+            "radius_km": radius,
+            "nearest": nearest,
+            "total_estimate": total,
+            "results": [car_to_payload(car) for car, _ in page],
+            "next_cursor": next_cursor,
+        }
+    )
+
+
 @app.route("/rentals")
 @login_required
 @role_required("renter", "owner")
@@ -3777,6 +6710,7 @@ def rentals() -> str:
     ).fetchall()
     car_ids = [row["car_id"] for row in rows]
     image_map = fetch_car_images(car_ids)
+    destination_map = fetch_rental_destinations([row["id"] for row in rows])
     rentals_list: List[Dict[str, object]] = []
     for row in rows:
         rental = dict(row)
@@ -3822,12 +6756,7 @@ def rentals() -> str:
                         "serve_upload", filename=raw_image.lstrip("/")
                     )
         rental["image_url"] = primary_image
-        try:
-            rental["trip_destinations_list"] = json.loads(
-                rental.get("trip_destinations") or "[]"
-            )
-        except (TypeError, json.JSONDecodeError):
-            rental["trip_destinations_list"] = []
+        rental["trip_destinations_list"] = [entry["name"] for entry in destination_map.get(row["id"], [])]
         total_amount = float(rental.get("total_amount") or 0.0)
         delivery_fee_value = float(rental.get("delivery_fee") or 0.0)
         base_rental_amount = float(rental.get("rental_amount") or 0.0)
@@ -3925,7 +6854,7 @@ def rent_car(car_id: int) -> str:
         "SELECT id, owner_id, is_available, rate_per_hour, daily_rate, name, brand, model FROM cars WHERE id = ?",
         (car_id,),
     ).fetchone()
-    if car is None or not car["is_available"]:
+    if car is None:
         return redirect(url_for("search", error="Car is no longer available."))
 
     start_raw = request.form.get("start_time")
@@ -3935,7 +6864,10 @@ def rent_car(car_id: int) -> str:
     start_iso = parse_datetime(start_raw) or naive_utcnow_iso()
     end_iso = parse_datetime(end_raw)
     start_dt = parse_iso(start_iso) or naive_utcnow()
-    end_dt = parse_iso(end_iso) if end_iso else start_dt + timedelta(hours=4)
+    end_dt = parse_iso(end_iso) if end_iso else start_dt + timedelta(hours=DEFAULT_TRIP_HOURS)
+
+    if not car["is_available"] or car_has_conflicting_rental(db, car_id, start_iso, end_dt.isoformat()):
+        return redirect(url_for("search", error="Car is no longer available."))
 
     delivery_type_raw = (request.form.get("delivery_type", "pickup") or "pickup").strip().lower()
     delivery_type = "delivery" if delivery_type_raw == "delivery" else "pickup"
@@ -4026,6 +6958,7 @@ def rent_car(car_id: int) -> str:
         ),
     )
     rental_id = cursor.lastrowid
+    store_rental_destinations(db, rental_id, destinations_list)
     car_name = car["name"] or f"{car['brand']} {car['model']}"
     actor_name = display_name(g.user)
     total_label = f"Rs {round(total_amount):.0f}"
@@ -4044,11 +6977,8 @@ def rent_car(car_id: int) -> str:
             "delivery_type": delivery_type,
         },
     )
-    db.execute(
-        "UPDATE cars SET is_available = 0, updated_at = ? WHERE id = ?",
-        (naive_utcnow_iso(), car_id),
-    )
     db.commit()
+    notify_car_changed(car_id)
     if delivery_type == "delivery":
         delivery_label = f"delivery fee Rs {round(delivery_fee):.0f}"
         location_label = delivery_address or "Pinned delivery location"
@@ -4378,20 +7308,8 @@ def renter_payment_page(rental_id: int) -> str:
 
 def build_renter_payment_context(rental_row: sqlite3.Row) -> Tuple[Dict[str, object], Dict[str, float]]:
     rental_dict = dict(rental_row)
-    try:
-        destinations = json.loads(rental_dict.get("trip_destinations") or "[]")
-        if isinstance(destinations, list):
-            cleaned_destinations = [
-                str(destination).strip()
-                for destination in destinations
-                if isinstance(destination, (str, int, float)) and str(destination).strip()
-            ]
-        else:
-            cleaned_destinations = []
-    except (TypeError, ValueError, json.JSONDecodeError):
-        cleaned_destinations = []
-    rental_dict["trip_destinations_list"] = cleaned_destinations
-    rental_dict["trip_destinations_text"] = ", ".join(cleaned_destinations)
+    apply_rental_destinations([rental_dict])
+    rental_dict["trip_destinations_text"] = ", ".join(rental_dict["trip_destinations_list"])
     car_label = rental_dict.get("car_name") or f"{rental_dict.get('brand', '')} {rental_dict.get('model', '')}".strip()
     rental_dict["car_label"] = car_label.strip() or "Vehicle"
     current_channel = (rental_dict.get("payment_channel") or "upi/netbanking").strip().lower()
@@ -4605,10 +7523,6 @@ def cancel_rental(rental_id: int) -> str:
         "UPDATE rentals SET status = 'cancelled', end_time = ?, renter_response = 'cancelled_by_renter', renter_response_at = ? WHERE id = ?",
         (cancelled_at, cancelled_at, rental_id),
     )
-    db.execute(
-        "UPDATE cars SET is_available = 1, updated_at = ? WHERE id = ?",
-        (naive_utcnow_iso(), rental["car_id"]),
-    )
     actor_name = display_name(g.user)
     log_rental_activity(
         rental_id,
@@ -4619,6 +7533,7 @@ def cancel_rental(rental_id: int) -> str:
         message="Renter cancelled the booking.",
     )
     db.commit()
+    notify_car_changed(rental["car_id"])
     return redirect(url_for("rentals"))
 
 
@@ -4680,20 +7595,6 @@ def build_owner_dashboard_context(owner_id: int) -> Dict[str, object]:
         """,
         (owner_id,),
     ).fetchall()
-    city_entries = load_city_entries(include_coordinates=True)
-    label_lookup: Dict[str, Tuple[float, float]] = {}
-    for entry in city_entries:
-        try:
-            lat_val = entry.get("latitude")
-            lng_val = entry.get("longitude")
-            if lat_val is None or lng_val is None:
-                continue
-            label_lookup[_format_city_label(entry["name"], entry["state"]).strip().lower()] = (
-                float(lat_val),
-                float(lng_val),
-            )
-        except (ValueError, TypeError):
-            continue
     rentals_data: List[Dict[str, object]] = []
     for row in rental_rows:
         rental = dict(row)
@@ -4712,12 +7613,6 @@ def build_owner_dashboard_context(owner_id: int) -> Dict[str, object]:
         rental["renter_public_name"] = renter_label
         rental["renter_username"] = renter_label
         rental.pop("renter_account_name", None)
-        try:
-            rental["trip_destinations_list"] = json.loads(
-                rental.get("trip_destinations") or "[]"
-            )
-        except (TypeError, json.JSONDecodeError):
-            rental["trip_destinations_list"] = []
         total_amount = float(rental.get("total_amount") or 0.0)
         delivery_fee_value = float(rental.get("delivery_fee") or 0.0)
         base_rental_amount = float(rental.get("rental_amount") or 0.0)
@@ -4764,21 +7659,8 @@ def build_owner_dashboard_context(owner_id: int) -> Dict[str, object]:
         car_lng = rental.get("car_longitude")
         rental["car_latitude"] = float(car_lat) if car_lat is not None else None
         rental["car_longitude"] = float(car_lng) if car_lng is not None else None
-        destinations_with_coords: List[Dict[str, object]] = []
-        for destination in rental["trip_destinations_list"]:
-            entry: Dict[str, object] = {"name": destination}
-            coords = lookup_city_coordinates(destination)
-            if not coords:
-                lookup_key = destination.strip().lower()
-                coords = label_lookup.get(lookup_key)
-            if not coords and "," in destination:
-                first_part = destination.split(",", 1)[0].strip().lower()
-                coords = label_lookup.get(first_part)
-            if coords:
-                entry["latitude"], entry["longitude"] = coords
-            destinations_with_coords.append(entry)
-        rental["trip_destinations_map"] = destinations_with_coords
         rentals_data.append(rental)
+    apply_rental_destinations(rentals_data)
     booking_map = generate_booking_identifier_map()
     for rental in rentals_data:
         rental_id = rental.get("id")
@@ -4904,7 +7786,6 @@ def build_owner_dashboard_context(owner_id: int) -> Dict[str, object]:
         "completed_trips": completed_trips,
         "trip_history": trip_history,
         "commission_rate": int(COMPANY_COMMISSION_RATE * 100),
-        "city_entries": city_entries,
         "popular_vehicle_types": POPULAR_VEHICLE_TYPES,
         "other_vehicle_types": other_vehicle_types,
         "fuel_types": fuel_types,
@@ -5075,6 +7956,7 @@ def owner_add_car() -> str:
         delivery_values[distance] = float(price_value)
     save_car_delivery_options(car_id, delivery_values)
     db.commit()
+    notify_car_changed(car_id)
     return redirect(
         url_for(
             "owner_cars",
@@ -5101,6 +7983,7 @@ def owner_toggle_availability(car_id: int) -> str:
         (new_state, naive_utcnow_iso(), car_id),
     )
     db.commit()
+    notify_car_changed(car_id)
     return redirect(url_for("owner_cars"))
 
 
@@ -5121,6 +8004,7 @@ def owner_update_location(car_id: int) -> str:
     db.commit()
     if updated.rowcount == 0:
         abort(404)
+    notify_car_changed(car_id)
     return redirect(url_for("owner_cars"))
 
 
@@ -5337,6 +8221,7 @@ def owner_update_car(car_id: int):
     save_car_delivery_options(car_id, delivery_updates)
 
     db.commit()
+    notify_car_changed(car_id)
 
     if is_admin:
         updated = db.execute("SELECT * FROM cars WHERE id = ?", (car_id,)).fetchone()
@@ -5409,6 +8294,12 @@ def owner_start_rental(rental_id: int) -> str:
     ).fetchone()
     if rental is None or rental["payment_status"] != "paid":
         abort(404)
+    other_trip = db.execute(
+        "SELECT 1 FROM rentals WHERE car_id = ? AND status = 'active' AND id != ? LIMIT 1",
+        (rental["car_id"], rental_id),
+    ).fetchone()
+    if other_trip is not None:
+        return redirect(url_for("owner_cars", message="Finish the car's current trip before starting another one."))
     now_iso = naive_utcnow_iso()
     db.execute(
         "UPDATE rentals SET status = 'active', owner_started_at = ? WHERE id = ?",
@@ -5425,6 +8316,7 @@ def owner_start_rental(rental_id: int) -> str:
         metadata={"timestamp": now_iso},
     )
     db.commit()
+    notify_car_changed(rental["car_id"])
     car_label = rental["car_name"] or f"{rental['brand']} {rental['model']}"
     create_notification(
         rental["renter_id"],
@@ -5458,6 +8350,10 @@ def owner_extend_rental(rental_id: int) -> str:
         abort(404)
     end_dt = parse_iso(rental["end_time"]) or naive_utcnow()
     new_end = end_dt + timedelta(hours=extra_hours)
+    if car_has_conflicting_rental(
+        db, rental["car_id"], end_dt.isoformat(), new_end.isoformat(), exclude_rental_id=rental_id
+    ):
+        return redirect(url_for("owner_cars", message="The car is booked by another renter during that extension."))
     additional_amount = round(rental["rate_per_hour"] * extra_hours, 2)
     base_rental_amount = float(rental["rental_amount"] or 0)
     delivery_fee = float(rental["delivery_fee"] or 0)
@@ -5545,6 +8441,7 @@ def owner_extend_rental(rental_id: int) -> str:
         },
     )
     db.commit()
+    notify_car_changed(rental["car_id"])
     car_label = rental["car_name"] or f"{rental['brand']} {rental['model']}"
     create_notification(
         rental["renter_id"],
@@ -5668,10 +8565,6 @@ def owner_complete_rental(rental_id: int) -> str:
             rental_id,
         ),
     )
-    db.execute(
-        "UPDATE cars SET is_available = 1, updated_at = ? WHERE id = ?",
-        (now_iso, rental["car_id"]),
-    )
     log_rental_activity(
         rental_id,
         "trip_completed",
@@ -5686,6 +8579,7 @@ def owner_complete_rental(rental_id: int) -> str:
         },
     )
     db.commit()
+    notify_car_changed(rental["car_id"])
     car_label = rental["car_name"] or f"{rental['brand']} {rental['model']}"
     create_notification(
         rental["renter_id"],
@@ -5814,10 +8708,6 @@ def owner_respond_rental(rental_id: int) -> str:
             "UPDATE rentals SET owner_response = 'rejected', owner_response_at = ?, status = 'cancelled', cancel_reason = ? WHERE id = ?",
             (now.isoformat(), reason, rental_id),
         )
-        db.execute(
-            "UPDATE cars SET is_available = 1, updated_at = ? WHERE id = ?",
-            (now.isoformat(), rental["car_id"]),
-        )
         log_rental_activity(
             rental_id,
             "booking_rejected",
@@ -5827,6 +8717,7 @@ def owner_respond_rental(rental_id: int) -> str:
             message="Host declined the booking request." + (f" Reason: {reason}" if reason else ""),
         )
         db.commit()
+        notify_car_changed(rental["car_id"])
         create_notification(
             rental["renter_id"],
             f"{g.user['username']} declined your booking for {car_label}.",
@@ -6035,15 +8926,23 @@ with app.app_context():
 
 @app.route("/map/tiles/<int:z>/<int:x>/<int:y>.png")
 def serve_osm_tile(z: int, x: int, y: int):
-    tile_bytes = fetch_osm_tile(z, x, y)
-    if tile_bytes is None:
+    if FILE_SERVING_MODE != "python" and tile_store.backend == "files":
+        response = tile_file_response(z, x, y)
+        if response is not None:
+            return response
+    tile = fetch_osm_tile(z, x, y)
+    if tile is None:
         return make_png_response(EMPTY_TILE_BYTES, max_age=300)
-    return make_png_response(tile_bytes)
+    schedule_tile_refresh(z, x, y, tile.modified)
+    response = make_png_response(tile.data, max_age=TILE_BROWSER_MAX_AGE_SECONDS)
+    response.set_etag(tile.etag)
+    response.last_modified = datetime.fromtimestamp(tile.modified, timezone.utc)
+    return response.make_conditional(request)
 
 
 @app.route("/uploads/<path:filename>")
 def serve_upload(filename: str):
-    return send_from_directory(UPLOAD_ROOT, filename)
+    return send_upload(filename)
 
 
 @app.route("/contact")
@@ -0,0 +1,1180 @@
+"""Micro-benchmarks for the search and geo hot paths in app.py.
+
+Every run works on a throwaway database inside a temporary directory, so it is
+safe to execute on a machine that also hosts real data:
+
+    python benchmarks.py spatial --cars 20000 --queries 200
+
+Subcommands that also check results against a reference implementation exit
+with status 1 on the first mismatch, so the checks can run unattended:
+
+    python benchmarks.py pricing --check-only
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import http.client
+import http.server
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+from urllib.request import Request, urlopen
+
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+BENCH_ROOT = Path(tempfile.mkdtemp(prefix="carrental-bench-"))
+atexit.register(shutil.rmtree, BENCH_ROOT, ignore_errors=True)
+os.environ["CARRENTAL_DATA_DIR"] = str(BENCH_ROOT)
+os.environ["CARRENTAL_DB_PATH"] = str(BENCH_ROOT.joinpath("bench.db"))
+
+METRO_CENTRES: List[Tuple[str, float, float]] = [
+    ("Delhi", 28.6139, 77.2090),
+    ("Mumbai", 19.0760, 72.8777),
+    ("Bengaluru", 12.9716, 77.5946),
+    ("Chennai", 13.0827, 80.2707),
+    ("Kolkata", 22.5726, 88.3639),
+    ("Hyderabad", 17.3850, 78.4867),
+    ("Pune", 18.5204, 73.8567),
+    ("Guwahati", 26.1445, 91.7362),
+]
+
+
+def _prepare_database() -> None:
+    """Create a placeholder city so importing app.py skips the dataset download."""
+    from import_indian_cities import ensure_table
+
+    conn = sqlite3.connect(os.environ["CARRENTAL_DB_PATH"])
+    try:
+        ensure_table(conn)
+        conn.executemany(
+            "INSERT OR REPLACE INTO cities (id, name, state, latitude, longitude) VALUES (?, ?, '', ?, ?)",
+            [(index, name, lat, lng) for index, (name, lat, lng) in enumerate(METRO_CENTRES, start=1)],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+_prepare_database()
+
+import app as carrental  # noqa: E402
+import tile_store  # noqa: E402
+
+
+def random_point(rng: random.Random) -> Tuple[float, float]:
+    """Return a point near a metro centre (80%) or anywhere in mainland India."""
+    if rng.random() < 0.8:
+        _, lat, lng = rng.choice(METRO_CENTRES)
+        return lat + rng.gauss(0, 0.25), lng + rng.gauss(0, 0.25)
+    return rng.uniform(8.0, 34.0), rng.uniform(69.0, 96.0)
+
+
+def seed_cars(count: int, rng: random.Random) -> None:
+    db = carrental.get_db()
+    cursor = db.execute(
+        "INSERT INTO users (username, password_hash, role) VALUES (?, '!', 'owner')",
+        (f"bench-owner-{rng.random()}",),
+    )
+    owner_id = cursor.lastrowid
+    rows = []
+    for index in range(count):
+        lat, lng = random_point(rng)
+        rows.append(
+            (
+                owner_id,
+                f"Bench car {index}",
+                "Bench",
+                "Model",
+                f"BN{index:06d}",
+                rng.choice([2, 4, 5, 7]),
+                round(rng.uniform(80, 600), 2),
+                lat,
+                lng,
+                rng.choice(["Petrol", "Diesel", "Electric"]),
+            )
+        )
+    db.executemany(
+        """
+        INSERT INTO cars (owner_id, name, brand, model, licence_plate, seats, rate_per_hour,
+                          latitude, longitude, fuel_type)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+    db.commit()
+
+
+def time_calls(label: str, func: Callable[[], object], repeat: int) -> List[float]:
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(
+        f"{label:<28} median {statistics.median(samples):8.3f} ms   "
+        f"p95 {p95:8.3f} ms   n={len(samples)}"
+    )
+    return samples
+
+
+def bench_spatial(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    with carrental.app.app_context():
+        seed_cars(args.cars, rng)
+        queries = [random_point(rng) for _ in range(args.queries)]
+        query_iter = itertools.cycle(queries)
+
+        def run_search() -> object:
+            lat, lng = next(query_iter)
+            return carrental.fetch_available_cars(latitude=lat, longitude=lng, radius_km=args.radius)
+
+        print(f"{args.cars} cars, radius {args.radius} km, {args.queries} queries")
+        carrental.search_result_cache.ttl_seconds = 0
+        carrental.get_car_spatial_index()
+        medians = {}
+        for mode, label in (
+            ("none", "full-table scan"),
+            ("grid", "grid index prefilter"),
+            ("rtree", "R*Tree bbox prefilter"),
+        ):
+            carrental.CAR_GEO_PREFILTER = mode
+            medians[mode] = statistics.median(time_calls(label, run_search, len(queries)))
+        for mode in ("grid", "rtree"):
+            print(f"speed-up vs scan ({mode}, median): {medians['none'] / medians[mode]:.1f}x")
+
+        for lat, lng in queries[:20]:
+            results = []
+            for mode in ("none", "grid", "rtree"):
+                carrental.CAR_GEO_PREFILTER = mode
+                results.append([
+                    car.id
+                    for car in carrental.fetch_available_cars(latitude=lat, longitude=lng, radius_km=args.radius)
+                ])
+            if results[0] != results[1] or results[0] != results[2]:
+                raise SystemExit(f"Result mismatch at ({lat:.4f}, {lng:.4f})")
+        print("results identical on 20 sampled queries")
+
+
+def bench_distance(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    points = [random_point(rng) for _ in range(args.points)]
+    latitudes = [lat for lat, _ in points]
+    longitudes = [lng for _, lng in points]
+    ids = list(range(len(points)))
+    origin_lat, origin_lng = METRO_CENTRES[0][1], METRO_CENTRES[0][2]
+    print(f"{args.points} candidate points, radius {args.radius} km")
+    numpy_module = carrental.np
+    carrental.np = None
+    scalar = carrental.rank_by_distance(origin_lat, origin_lng, latitudes, longitudes, ids, args.radius)
+    scalar_ms = statistics.median(time_calls(
+        "scalar haversine loop",
+        lambda: carrental.rank_by_distance(origin_lat, origin_lng, latitudes, longitudes, ids, args.radius),
+        args.repeat,
+    ))
+    carrental.np = numpy_module
+    if numpy_module is None:
+        print("NumPy is not installed; only the scalar path was measured.")
+        return
+    batched = carrental.rank_by_distance(origin_lat, origin_lng, latitudes, longitudes, ids, args.radius)
+    batch_ms = statistics.median(time_calls(
+        "NumPy batch haversine",
+        lambda: carrental.rank_by_distance(origin_lat, origin_lng, latitudes, longitudes, ids, args.radius),
+        args.repeat,
+    ))
+    print(f"speed-up (median): {scalar_ms / batch_ms:.1f}x")
+    if [index for index, _ in scalar] != [index for index, _ in batched]:
+        raise SystemExit("Scalar and batched rankings differ")
+    drift = max((abs(a[1] - b[1]) for a, b in zip(scalar, batched)), default=0.0)
+    print(f"rankings identical, {len(batched)} survivors, max distance drift {drift:.2e} km")
+
+
+def seed_rentals(per_car: int, rng: random.Random, horizon_days: int) -> List[Tuple[int, str, str, str]]:
+    """Give every car ``per_car`` rentals of one to three days over the horizon."""
+    db = carrental.get_db()
+    renter_id = db.execute(
+        "INSERT INTO users (username, password_hash, role) VALUES (?, '!', 'renter')",
+        (f"bench-renter-{rng.random()}",),
+    ).lastrowid
+    origin = datetime(2030, 1, 1)
+    rows = []
+    for (car_id,) in db.execute("SELECT id FROM cars").fetchall():
+        for _ in range(per_car):
+            start = origin + timedelta(hours=rng.randrange(horizon_days * 24))
+            end = start + timedelta(hours=rng.randrange(24, 72))
+            status = rng.choice(["booked", "booked", "completed", "cancelled"])
+            rows.append((car_id, status, start.isoformat(), end.isoformat()))
+    db.executemany(
+        "INSERT INTO rentals (car_id, renter_id, status, start_time, end_time) VALUES (?, ?, ?, ?, ?)",
+        [(car_id, renter_id, status, start, end) for car_id, status, start, end in rows],
+    )
+    db.commit()
+    return rows
+
+
+def unlist_some_cars(fraction: float, rng: random.Random) -> set:
+    """Switch ``fraction`` of the cars off the way an owner would; returns their ids."""
+    db = carrental.get_db()
+    car_ids = [row[0] for row in db.execute("SELECT id FROM cars").fetchall()]
+    unlisted = set(rng.sample(car_ids, int(len(car_ids) * fraction)))
+    db.executemany("UPDATE cars SET is_available = 0 WHERE id = ?", [(car_id,) for car_id in unlisted])
+    db.commit()
+    return unlisted
+
+
+def bench_availability(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    with carrental.app.app_context():
+        seed_cars(args.cars, rng)
+        rentals = seed_rentals(args.rentals_per_car, rng, args.horizon_days)
+        unlisted = unlist_some_cars(0.05, rng)
+        db = carrental.get_db()
+        db.execute("ANALYZE")
+        origin = datetime(2030, 1, 1)
+        queries = []
+        for _ in range(args.queries):
+            lat, lng = random_point(rng)
+            start = origin + timedelta(hours=rng.randrange(args.horizon_days * 24))
+            end = start + timedelta(hours=rng.randrange(4, 96))
+            queries.append((lat, lng, start.isoformat(), end.isoformat()))
+        query_iter = itertools.cycle(queries)
+
+        def run_search() -> object:
+            lat, lng, start, end = next(query_iter)
+            return carrental.fetch_available_cars(
+                latitude=lat, longitude=lng, radius_km=args.radius, start_time=start, end_time=end
+            )
+
+        print(
+            f"{args.cars} cars, {len(rentals)} rentals ({args.rentals_per_car} per car), "
+            f"radius {args.radius} km, {args.queries} queries"
+        )
+        carrental.search_result_cache.ttl_seconds = 0
+        index_sql = db.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'idx_rentals_open_windows'"
+        ).fetchone()[0]
+        db.execute("DROP INDEX idx_rentals_open_windows")
+        db.commit()
+        unindexed = statistics.median(time_calls("overlap check, no index", run_search, len(queries)))
+        db.execute(index_sql)
+        db.execute("ANALYZE")
+        db.commit()
+        indexed = statistics.median(time_calls("overlap check, window index", run_search, len(queries)))
+        print(f"speed-up (median): {unindexed / indexed:.1f}x")
+
+        busy: dict = {}
+        for car_id, status, start, end in rentals:
+            if status in ("booked", "active"):
+                busy.setdefault(car_id, []).append((start, end))
+        for lat, lng, start, end in queries[:50]:
+            expected = [
+                car.id
+                for car in carrental.fetch_available_cars(latitude=lat, longitude=lng, radius_km=args.radius)
+                if not any(s < end and e > start for s, e in busy.get(car.id, []))
+            ]
+            found = carrental.fetch_available_cars(
+                latitude=lat, longitude=lng, radius_km=args.radius, start_time=start, end_time=end
+            )
+            statuses_ok = all(
+                car.status == ("Unavailable" if car.id in unlisted else "Available") for car in found
+            )
+            if [car.id for car in found] != expected or not statuses_ok:
+                raise SystemExit(f"Window mismatch for {start} - {end} at ({lat:.4f}, {lng:.4f})")
+        print(
+            f"windowed results match a brute-force interval check on 50 queries "
+            f"({len(unlisted)} owner-unlisted cars stay Unavailable)"
+        )
+
+
+def bench_pricing(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    origin = datetime(2030, 1, 1)
+    promo_choices = [None, "", "zoom10", " WEEKEND15 ", "FIRSTDRIVE", "NOPE"]
+
+    def random_case() -> Tuple[List[float], List[object], datetime, datetime, object]:
+        count = rng.randint(1, 40)
+        rates = [round(rng.uniform(20, 900), rng.choice([0, 2, 4])) for _ in range(count)]
+        dailies = [rng.choice([None, 0.0, round(rate * rng.uniform(8, 30), 2)]) for rate in rates]
+        start = origin + timedelta(minutes=rng.randrange(60 * 24 * 365))
+        end = start + timedelta(minutes=rng.randrange(-600, 60 * 24 * 21))
+        return rates, dailies, start, end, rng.choice(promo_choices)
+
+    numpy_module = carrental.np
+    for case_index in range(args.cases):
+        rates, dailies, start, end, promo = random_case()
+        expected = [carrental.calculate_pricing(rate, daily, start, end, promo) for rate, daily in zip(rates, dailies)]
+        for module in (numpy_module, None):
+            carrental.np = module
+            if carrental.calculate_pricing_batch(rates, dailies, start, end, promo) != expected:
+                carrental.np = numpy_module
+                raise SystemExit(
+                    f"Pricing mismatch in case {case_index} (numpy={module is not None}): "
+                    f"{start.isoformat()} - {end.isoformat()}, promo={promo!r}"
+                )
+        carrental.np = numpy_module
+    print(f"batch pricing matches calculate_pricing on {args.cases} random cases")
+    if args.check_only:
+        return
+
+    rates = [round(rng.uniform(20, 900), 2) for _ in range(args.cars)]
+    dailies = [round(rate * 20, 2) for rate in rates]
+    start, end = origin, origin + timedelta(hours=53, minutes=20)
+    per_car = statistics.median(time_calls(
+        "calculate_pricing per car",
+        lambda: [carrental.calculate_pricing(r, d, start, end, "ZOOM10") for r, d in zip(rates, dailies)],
+        args.repeat,
+    ))
+    batched = statistics.median(time_calls(
+        "calculate_pricing_batch",
+        lambda: carrental.calculate_pricing_batch(rates, dailies, start, end, "ZOOM10"),
+        args.repeat,
+    ))
+    print(f"speed-up (median): {per_car / batched:.1f}x for {args.cars} cars")
+
+
+def bench_fleetmap(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    with carrental.app.app_context():
+        seed_cars(args.cars, rng)
+        db = carrental.get_db()
+        car_ids = [row[0] for row in db.execute("SELECT id FROM cars").fetchall()]
+        renter_id = db.execute(
+            "INSERT INTO users (username, password_hash, role) VALUES ('bench-map-renter', '!', 'renter')"
+        ).lastrowid
+        db.executemany(
+            "INSERT INTO rentals (car_id, renter_id, status, start_time) VALUES (?, ?, 'active', '2030-01-01T00:00:00')",
+            [(car_id, renter_id) for car_id in rng.sample(car_ids, len(car_ids) // 10)],
+        )
+        db.commit()
+        print(f"{args.cars} cars, {len(car_ids) // 10} on trips")
+
+        def load_everything() -> object:
+            rows = db.execute(
+                """
+                SELECT cars.id, cars.name, cars.vehicle_type, cars.latitude, cars.longitude, cars.city,
+                       users.username AS owner_username
+                FROM cars
+                JOIN users ON users.id = cars.owner_id
+                WHERE cars.latitude IS NOT NULL AND cars.longitude IS NOT NULL
+                """
+            ).fetchall()
+            active = {row[0] for row in db.execute("SELECT DISTINCT car_id FROM rentals WHERE status = 'active'")}
+            return json.dumps([dict(row, active=row["id"] in active) for row in rows])
+
+        time_calls("old page payload (all cars)", load_everything, 5)
+        carrental.FLEET_CLUSTER_REFRESH_SECONDS = 0
+        time_calls("cluster index rebuild", carrental.get_fleet_cluster_index, 5)
+        carrental.FLEET_CLUSTER_REFRESH_SECONDS = 3600
+        index = carrental.get_fleet_cluster_index()
+        views = [(5, 21.0, 79.0, 14.0, 16.0), (8, 19.07, 72.88, 1.8, 2.2), (11, 28.61, 77.21, 0.25, 0.3)]
+        for zoom, lat, lng, lat_span, lng_span in views:
+            box = (lng - lng_span, lat - lat_span, lng + lng_span, lat + lat_span)
+            clusters = index.clusters(*box, zoom)
+            time_calls(f"clusters at zoom {zoom}", lambda: json.dumps(index.clusters(*box, zoom)), args.repeat)
+            print(f"  {len(clusters)} clusters covering {sum(c['count'] for c in clusters)} cars")
+        if index.total != len(car_ids) or sum(c["count"] for c in index.clusters(-180, -85, 180, 85, 0)) != index.total:
+            raise SystemExit("Cluster counts do not add up to the fleet size")
+        print("world view clusters account for every car")
+
+
+def bench_searchlog(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    with carrental.app.app_context():
+        db = carrental.get_db()
+        events = [random_point(rng) for _ in range(args.events)]
+        filters = {"vehicle_types": ["SUV"], "seat_min": 4, "trip_window": None}
+
+        def insert_inline(lat: float, lng: float) -> None:
+            carrental._write_search_events(
+                db,
+                [(
+                    carrental.naive_utcnow_iso(), lat, lng, 10.0,
+                    carrental.encode_geohash(lat, lng, carrental.SEARCH_DEMAND_GEOHASH_PRECISION),
+                    5, json.dumps(filters, sort_keys=True), None,
+                )],
+            )
+            db.commit()
+
+        inline_iter = itertools.cycle(events)
+        queued_iter = itertools.cycle(events)
+        print(f"{args.events} search events")
+        inline = statistics.median(time_calls(
+            "inline insert + commit", lambda: insert_inline(*next(inline_iter)), args.events
+        ))
+        queued = statistics.median(time_calls(
+            "queued for batch writer",
+            lambda: carrental.record_search_event(*next(queued_iter), 10.0, 5, filters, None),
+            args.events,
+        ))
+        print(f"request-path speed-up (median): {inline / queued:.1f}x")
+        started = time.perf_counter()
+        carrental.search_event_writer.flush()
+        print(f"drained the remaining queue in {(time.perf_counter() - started) * 1000:.1f} ms")
+        print(carrental.search_event_writer.stats())
+        stored = db.execute("SELECT COUNT(*) FROM search_events").fetchone()[0]
+        bucketed = db.execute("SELECT SUM(searches) FROM search_demand").fetchone()[0]
+        if stored != 2 * args.events or bucketed != stored:
+            raise SystemExit(f"Expected {2 * args.events} events, stored {stored}, bucketed {bucketed}")
+        print("every event stored once and counted once in the demand buckets")
+
+
+VISIT_SHUTDOWN_SCRIPT = """
+import sys
+import app
+client = app.app.test_client()
+for index in range(int(sys.argv[1])):
+    client.get("/shutdown-check", headers={"User-Agent": "Mozilla/5.0", "X-Forwarded-For": f"10.9.{index // 250}.{index % 250}"})
+"""
+
+
+def bench_visitlog(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    # No lookups leave the machine: every visitor IP already has a cached location.
+    carrental.IP_LOOKUP_ENDPOINT = "http://127.0.0.1:9/{ip}/json/"
+    ips = [f"49.{rng.randrange(32, 64)}.{rng.randrange(256)}.{rng.randrange(1, 255)}" for _ in range(args.visitors)]
+    paths = ["/", "/search", "/cars/1", "/contact", "/terms-and-conditions"]
+    with carrental.app.app_context():
+        db = carrental.get_db()
+        db.executemany(
+            "INSERT OR REPLACE INTO ip_location_cache (ip_address, city, region, country, latitude, longitude, org, updated_at)"
+            " VALUES (?, 'Guwahati', 'Assam', 'India', 26.14, 91.73, '', ?)",
+            [(ip, carrental.naive_utcnow_iso()) for ip in set(ips)],
+        )
+        db.commit()
+        visits = [(rng.choice(ips), rng.choice(paths)) for _ in range(args.visits)]
+
+        def insert_inline(ip: str, path: str) -> None:
+            # What record_visit used to do per page view: look up, insert and commit.
+            carrental._write_visit_events(
+                db, [(ip, path, "GET", "Mozilla/5.0", "", "other", 0, carrental.naive_utcnow_iso())]
+            )
+            db.commit()
+
+        inline_iter = iter(visits)
+        print(f"{args.visits} page views from {len(set(ips))} visitors")
+        inline = statistics.median(time_calls(
+            "inline insert + commit", lambda: insert_inline(*next(inline_iter)), args.visits
+        ))
+        queued_iter = iter(visits)
+        with carrental.app.test_request_context("/", headers={"User-Agent": "Mozilla/5.0"}):
+
+            def record_queued() -> None:
+                ip, path = next(queued_iter)
+                carrental.request.environ["HTTP_X_FORWARDED_FOR"] = ip
+                carrental.request.environ["PATH_INFO"] = path
+                carrental.record_visit()
+
+            queued = statistics.median(time_calls("queued for batch writer", record_queued, args.visits))
+        print(f"request-path speed-up (median): {inline / queued:.1f}x")
+        started = time.perf_counter()
+        carrental.visit_event_writer.flush()
+        print(f"drained the remaining queue in {(time.perf_counter() - started) * 1000:.1f} ms")
+        print(carrental.visit_event_writer.stats())
+        stored, new, located = db.execute(
+            "SELECT COUNT(*), SUM(is_new_visitor), SUM(city = 'Guwahati') FROM visit_logs"
+        ).fetchone()
+        if (stored, new, located) != (2 * args.visits, len({ip for ip, _ in visits}), 2 * args.visits):
+            raise SystemExit(f"Expected {2 * args.visits} located visits, got {stored} ({new} new, {located} located)")
+        print("every visit stored once, first visits marked once per IP, locations attached")
+
+    def write_slowly(conn: sqlite3.Connection, rows: List[object]) -> None:
+        time.sleep(0.05)
+
+    overloaded = carrental.BackgroundBatchWriter(
+        "visit-overload", write_slowly, batch_size=50, flush_seconds=0.01, max_pending=args.max_pending
+    )
+    submits = time_calls("submit while the writer lags", lambda: overloaded.submit(("x",)), args.visits)
+    stats = overloaded.stats()
+    print(f"overload: {stats['dropped']} of {args.visits} rows dropped, slowest submit {submits[-1]:.3f} ms")
+    if not stats["dropped"] or stats["pending"] > args.max_pending + overloaded.batch_size:
+        raise SystemExit("Queue was not bounded under overload")
+    overloaded.flush()
+
+    subprocess.run(
+        [sys.executable, "-c", VISIT_SHUTDOWN_SCRIPT, str(args.shutdown_visits)],
+        cwd=Path(__file__).resolve().parent,
+        check=True,
+    )
+    conn = sqlite3.connect(os.environ["CARRENTAL_DB_PATH"])
+    try:
+        flushed = conn.execute("SELECT COUNT(*) FROM visit_logs WHERE path = '/shutdown-check'").fetchone()[0]
+    finally:
+        conn.close()
+    print(f"worker exiting right after {args.shutdown_visits} page views: {flushed} stored by the exit flush")
+    if flushed != args.shutdown_visits:
+        raise SystemExit("Queued visits were lost on shutdown")
+
+
+def seed_tiles(count: int, rng: random.Random, zoom: int = 12) -> List[Tuple[int, int, int]]:
+    """Write ``count`` fake tiles of 8-24 KB into a benchmark-only tile directory."""
+    carrental.tile_store = tile_store.FileTileStore(BENCH_ROOT.joinpath("tiles"))
+    base_x, base_y = 2920, 1710
+    side = int(count ** 0.5) + 1
+    keys = []
+    for index in range(count):
+        key = (zoom, base_x + index % side, base_y + index // side)
+        carrental.tile_store.write(*key, rng.randbytes(rng.randrange(8 * 1024, 24 * 1024)))
+        keys.append(key)
+    return keys
+
+
+def bench_tiles(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    keys = seed_tiles(args.tiles, rng)
+    # Map views revisit a small set of popular tiles far more than the long tail.
+    requests_seq = [keys[min(len(keys) - 1, int(rng.paretovariate(1.2)) - 1)] for _ in range(args.requests)]
+    print(f"{args.tiles} tiles on disk, {args.requests} requests, memory budget {args.memory_mb} MB")
+    cache = carrental.tile_memory_cache
+    cache.max_bytes = 0
+    disk_iter = iter(requests_seq)
+    disk = statistics.median(time_calls(
+        "disk cache only", lambda: carrental.fetch_osm_tile(*next(disk_iter)), len(requests_seq)
+    ))
+    cache.max_bytes = args.memory_mb * 1024 * 1024
+    cache.clear()
+    cache.hits = cache.misses = cache.evictions = 0
+    memory_iter = iter(requests_seq)
+    memory = statistics.median(time_calls(
+        "memory LRU + disk", lambda: carrental.fetch_osm_tile(*next(memory_iter)), len(requests_seq)
+    ))
+    print(f"speed-up (median): {disk / memory:.1f}x")
+    print(cache.stats())
+    for key in set(requests_seq):
+        if carrental.fetch_osm_tile(*key).data != carrental.tile_store.read(*key):
+            raise SystemExit(f"Memory cache returned stale bytes for {key}")
+    print("every served tile matches the file on disk")
+
+
+def bench_tilestore(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    keys = seed_tiles(args.tiles, rng)
+    files = carrental.tile_store
+    target = BENCH_ROOT.joinpath("tiles.mbtiles")
+    tile_store.migrate(files.root, target, batch_size=500)
+    mbtiles = tile_store.MBTilesTileStore(target)
+    if len(mbtiles) != len(keys):
+        raise SystemExit(f"Migrated {len(mbtiles)} of {len(keys)} tiles")
+    for key in keys:
+        if mbtiles.read(*key) != files.read(*key):
+            raise SystemExit(f"Tile {key} differs after migration")
+    print(f"{len(keys)} tiles migrated and identical in both stores")
+
+    requests_seq = [rng.choice(keys) for _ in range(args.reads)]
+    results = {}
+    for label, store in (("file tree read", files), ("MBTiles read", mbtiles)):
+        reads = iter(requests_seq)
+        results[label] = statistics.median(time_calls(label, lambda: store.read(*next(reads)), len(requests_seq)))
+    missing = iter([(14, rng.randrange(1 << 14), rng.randrange(1 << 14)) for _ in range(args.reads)])
+    time_calls("MBTiles miss", lambda: mbtiles.read(*next(missing)), args.reads)
+    print(f"MBTiles vs file tree (median): {results['file tree read'] / results['MBTiles read']:.2f}x")
+    file_count = sum(1 for _ in files.iter_tiles())
+    print(f"file tree: {file_count} files; MBTiles: 1 file of {target.stat().st_size / 1e6:.1f} MB")
+
+
+def start_tile_standin(latency: float, behaviour: Optional[Dict[str, object]] = None) -> Tuple[str, Counter]:
+    """Serve fake tiles from a local thread after ``latency`` seconds; return the URL template and hit counts.
+
+    ``behaviour`` may be changed while the server runs: ``status`` and ``latency``
+    override the defaults for every following request, and ``handshake`` delays
+    each new connection once, standing in for TCP + TLS setup to a remote server.
+    """
+    hits: Counter = Counter()
+    behaviour = behaviour if behaviour is not None else {}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this, keep-alive
+        # connections stall on Nagle + delayed ACK like no real tile server does.
+        disable_nagle_algorithm = True
+
+        def setup(self) -> None:
+            super().setup()
+            time.sleep(float(behaviour.get("handshake", 0)))
+
+        def do_GET(self) -> None:
+            hits[self.path] += 1
+            time.sleep(float(behaviour.get("latency", latency)))
+            status = int(behaviour.get("status", 200))
+            body = f"tile {self.path}".encode() * 64 if status == 200 else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_: object) -> None:
+            pass
+
+    class Server(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 256
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    atexit.register(server.shutdown)
+    return f"http://127.0.0.1:{server.server_address[1]}/{{z}}/{{x}}/{{y}}.png", hits
+
+
+def _fetch_without_coordination(z: int, x: int, y: int) -> object:
+    """What serve_osm_tile did before single-flight: every miss goes upstream."""
+    data = carrental.tile_store.read(z, x, y)
+    if data is None:
+        data = carrental.download_osm_tile(z, x, y)
+        carrental.tile_store.write(z, x, y, data)
+    return data
+
+
+def _storm(fetch: Callable[[int, int, int], object], keys: List[Tuple[int, int, int]], clients: int) -> float:
+    """Have ``clients`` threads request every key at the same moment; return the wall time in ms."""
+    barrier = threading.Barrier(clients)
+
+    def client(seed: int) -> None:
+        order = list(keys)
+        random.Random(seed).shuffle(order)
+        barrier.wait()
+        for key in order:
+            if fetch(*key) is None:
+                raise SystemExit(f"Tile {key} was not served")
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (time.perf_counter() - started) * 1000
+
+
+def _storm_worker(keys: List[Tuple[int, int, int]], clients: int, barrier) -> None:
+    carrental.tile_memory_cache.clear()
+    barrier.wait()
+    _storm(carrental.fetch_osm_tile, keys, clients)
+
+
+def bench_tilestorm(args: argparse.Namespace) -> None:
+    url, hits = start_tile_standin(args.latency_ms / 1000)
+    carrental.OSM_TILE_TEMPLATE = url
+    carrental.TILE_LOCK_ROOT = BENCH_ROOT.joinpath("tile_locks")
+    carrental.TILE_LOCK_ROOT.mkdir(exist_ok=True)
+    keys = [(15, 23000 + index, 14000) for index in range(args.tiles)]
+    print(
+        f"{args.tiles} uncached tiles, upstream latency {args.latency_ms} ms, "
+        f"{args.clients} concurrent clients per worker"
+    )
+
+    def fresh_store(name: str) -> None:
+        carrental.tile_store = tile_store.FileTileStore(BENCH_ROOT.joinpath(name))
+        carrental.tile_memory_cache.clear()
+        hits.clear()
+
+    fresh_store("storm-plain")
+    elapsed = _storm(_fetch_without_coordination, keys, args.clients)
+    print(f"{'no coordination':<28} {elapsed:8.1f} ms   upstream fetches {sum(hits.values())}")
+
+    fresh_store("storm-single")
+    elapsed = _storm(carrental.fetch_osm_tile, keys, args.clients)
+    print(f"{'single-flight, 1 worker':<28} {elapsed:8.1f} ms   upstream fetches {sum(hits.values())}")
+    if sum(hits.values()) != len(keys):
+        raise SystemExit("Single-flight let duplicate fetches through")
+
+    fresh_store("storm-workers")
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(args.workers + 1)
+    workers = [
+        context.Process(target=_storm_worker, args=(keys, args.clients, barrier)) for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = (time.perf_counter() - started) * 1000
+    print(
+        f"{f'lock files, {args.workers} workers':<28} {elapsed:8.1f} ms   upstream fetches {sum(hits.values())}"
+    )
+    if any(worker.exitcode for worker in workers):
+        raise SystemExit("A worker failed to serve every tile")
+    if max(hits.values()) != 1:
+        raise SystemExit(f"Duplicate upstream fetches across workers: {hits.most_common(3)}")
+    print("every tile fetched upstream exactly once")
+
+
+def bench_tilehttp(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    url, hits = start_tile_standin(args.latency_ms / 1000)
+    carrental.OSM_TILE_TEMPLATE = url
+    carrental.TILE_LOCK_ROOT = BENCH_ROOT.joinpath("tile_locks")
+    carrental.TILE_LOCK_ROOT.mkdir(exist_ok=True)
+    keys = seed_tiles(args.tiles, rng)
+    client = carrental.app.test_client()
+    paths = [f"/map/tiles/{z}/{x}/{y}.png" for z, x, y in keys]
+    etags = {path: client.get(path).headers["ETag"] for path in paths}
+    print(f"{args.tiles} cached tiles, upstream stand-in latency {args.latency_ms} ms")
+
+    path_iter = itertools.cycle(paths)
+    time_calls("full 200 response", lambda: client.get(next(path_iter)), args.requests)
+    sent = {"bytes": 0}
+
+    def revalidate() -> None:
+        path = next(path_iter)
+        response = client.get(path, headers={"If-None-Match": etags[path]})
+        if response.status_code != 304:
+            raise SystemExit(f"Expected 304 for {path}, got {response.status_code}")
+        sent["bytes"] += len(response.data)
+
+    time_calls("If-None-Match -> 304", revalidate, args.requests)
+    average = sum(len(carrental.tile_store.read(*key)) for key in keys) / len(keys)
+    print(f"body bytes per repeat view: {sent['bytes'] / args.requests:.0f} with 304s vs {average:.0f} before")
+
+    # Age every tile past the stale limit: requests must stay fast while the pool refreshes them.
+    old = int(time.time() - carrental.TILE_STALE_AFTER_SECONDS - 60)
+    for key in keys:
+        carrental.tile_store.write(*key, carrental.tile_store.read(*key), modified=old)
+    carrental.tile_memory_cache.clear()
+    hits.clear()
+    stale_iter = iter(paths)
+    time_calls("stale tile, SWR", lambda: client.get(next(stale_iter)), len(paths))
+    deadline = time.monotonic() + 30
+    while carrental.tile_fetch_counters["refreshed"] < len(keys) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    refreshed = [carrental.tile_store.read_tile(*key) for key in keys]
+    if sum(hits.values()) != len(keys) or any(tile.modified == old for tile in refreshed):
+        raise SystemExit(f"Expected {len(keys)} background refreshes, saw {sum(hits.values())}")
+    changed = sum(client.get(path, headers={"If-None-Match": etags[path]}).status_code == 200 for path in paths)
+    print(f"background pool refreshed all {len(keys)} tiles; {changed} now answer a stale ETag with a new 200")
+
+
+def _reset_tile_upstream(store_name: str) -> None:
+    carrental.tile_store = tile_store.FileTileStore(BENCH_ROOT.joinpath(store_name))
+    carrental.tile_memory_cache.clear()
+    carrental.tile_negative_cache = carrental.TileNegativeCache(carrental.TILE_NEGATIVE_CACHE_MAX_ENTRIES)
+    carrental.tile_breaker = carrental.CircuitBreaker(
+        carrental.TILE_BREAKER_WINDOW,
+        carrental.TILE_BREAKER_MIN_CALLS,
+        carrental.TILE_BREAKER_FAILURE_RATIO,
+        carrental.TILE_BREAKER_COOLDOWN_SECONDS,
+    )
+
+
+def bench_tileupstream(args: argparse.Namespace) -> None:
+    behaviour: Dict[str, object] = {}
+    behaviour["handshake"] = args.handshake_ms / 1000
+    url, hits = start_tile_standin(args.latency_ms / 1000, behaviour)
+    carrental.OSM_TILE_TEMPLATE = url
+    carrental.TILE_LOCK_ROOT = BENCH_ROOT.joinpath("tile_locks")
+    carrental.TILE_LOCK_ROOT.mkdir(exist_ok=True)
+    tiles = iter(itertools.count())
+
+    def next_key() -> Tuple[int, int, int]:
+        index = next(tiles)
+        return 16, 40000 + index % 1000, 20000 + index // 1000
+
+    def download_unpooled() -> object:
+        z, x, y = next_key()
+        request = Request(url.format(z=z, x=x, y=y), headers={"User-Agent": carrental.OSM_TILE_USER_AGENT})
+        with urlopen(request, timeout=carrental.TILE_UPSTREAM_TIMEOUT_SECONDS) as response:
+            return response.read()
+
+    print(
+        f"healthy stand-in upstream, {args.latency_ms} ms latency, {args.handshake_ms} ms connection setup, "
+        f"{args.requests} distinct misses"
+    )
+    _reset_tile_upstream("upstream-healthy")
+    unpooled = statistics.median(time_calls("urlopen per tile", download_unpooled, args.requests))
+    pooled = statistics.median(time_calls(
+        "pooled keep-alive session", lambda: carrental.download_osm_tile(*next_key()), args.requests
+    ))
+    stats = carrental.tile_upstream_stats()
+    print(
+        f"speed-up (median): {unpooled / pooled:.1f}x; pooled run opened "
+        f"{stats['connections_opened']} connection(s) for {stats['requests_sent']} requests"
+    )
+
+    _reset_tile_upstream("upstream-missing")
+    behaviour["status"] = 404
+    hits.clear()
+    missing = next_key()
+    for _ in range(args.requests):
+        if carrental.fetch_osm_tile(*missing) is not None:
+            raise SystemExit("A missing tile was served")
+    print(f"404 tile requested {args.requests} times: {sum(hits.values())} upstream call(s)")
+    if sum(hits.values()) != 1:
+        raise SystemExit("Negative cache did not absorb repeat misses")
+
+    _reset_tile_upstream("upstream-outage")
+    behaviour.update(status=503, latency=args.outage_latency_ms / 1000)
+    hits.clear()
+    outage = time_calls("misses during an outage", lambda: carrental.fetch_osm_tile(*next_key()), args.requests)
+    print(
+        f"{sum(hits.values())} of {args.requests} misses reached the failing upstream; "
+        f"breaker {carrental.tile_breaker.state}, fastest {outage[0]:.3f} ms, "
+        f"slowest {outage[-1]:.1f} ms"
+    )
+    if carrental.tile_breaker.state != "open" or sum(hits.values()) > carrental.TILE_BREAKER_WINDOW:
+        raise SystemExit("Circuit breaker did not open")
+
+    behaviour.update(status=200, latency=args.latency_ms / 1000)
+    carrental.tile_breaker.cooldown_seconds = 0.2
+    time.sleep(0.25)
+    if carrental.fetch_osm_tile(*next_key()) is None or carrental.tile_breaker.state != "closed":
+        raise SystemExit("Breaker did not close after a successful trial request")
+    print("breaker closed again after one successful trial request")
+
+
+def _seed_evict_tiles(args: argparse.Namespace, rng: random.Random) -> List[Tuple[int, int, int]]:
+    """Half the tiles at zoom 12 and half at 16, all last used an hour ago, indexed from scratch."""
+    shutil.rmtree(BENCH_ROOT.joinpath("tiles"), ignore_errors=True)
+    for stale in BENCH_ROOT.glob("tile_index.db*"):
+        stale.unlink()
+    keys = seed_tiles(args.tiles // 2, rng, zoom=12) + seed_tiles(args.tiles - args.tiles // 2, rng, zoom=16)
+    an_hour_ago = time.time() - 3600
+    for key in keys:
+        os.utime(carrental.tile_store.path(*key), (an_hour_ago, an_hour_ago))
+    carrental.TILE_CACHE_MAX_BYTES = 0
+    carrental.tile_cache_janitor = carrental.TileCacheJanitor(BENCH_ROOT.joinpath("tile_index.db"), 3600)
+    carrental.tile_cache_janitor.run_once()
+    return keys
+
+
+def _check_tile_budget(budget: int) -> int:
+    """Compare the index with the files really on disk; return the bytes on disk."""
+    janitor = carrental.tile_cache_janitor
+    on_disk = [size for *_, size, _ in carrental.tile_store.scan()]
+    if (len(on_disk), sum(on_disk)) != (janitor.indexed_tiles, janitor.indexed_bytes):
+        raise SystemExit(f"Index says {janitor.indexed_tiles} tiles, disk has {len(on_disk)}")
+    if sum(on_disk) > budget * carrental.TILE_CACHE_TRIM_RATIO:
+        raise SystemExit(f"{sum(on_disk)} bytes left on disk, budget {budget}")
+    return sum(on_disk)
+
+
+def bench_tileevict(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    keys = _seed_evict_tiles(args, rng)
+    janitor = carrental.tile_cache_janitor
+    total = janitor.indexed_bytes
+    print(
+        f"{len(keys)} tiles, {total / 1e6:.1f} MB on disk, indexed in "
+        f"{(time.perf_counter() - started) * 1000:.0f} ms including seeding"
+    )
+
+    hot = rng.sample(keys, len(keys) // 10)
+    for key in hot:
+        janitor.touched(key)
+    budget = carrental.TILE_CACHE_MAX_BYTES = total * args.budget_percent // 100
+    started = time.perf_counter()
+    # The evictor thread may get there first; either way the counters add up.
+    janitor.run_once()
+    evicted_tiles, evicted_bytes = janitor.evicted_tiles, janitor.evicted_bytes
+    print(
+        f"LRU pass to a {budget / 1e6:.1f} MB budget: evicted {evicted_tiles} tiles "
+        f"({evicted_bytes / 1e6:.1f} MB) in {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+    left = _check_tile_budget(budget)
+    if any(carrental.tile_store.read(*key) is None for key in hot):
+        raise SystemExit("A recently used tile was evicted")
+    print(f"{left / 1e6:.1f} MB left, index matches disk, all {len(hot)} recently used tiles kept")
+
+    keys = _seed_evict_tiles(args, rng)
+    janitor = carrental.tile_cache_janitor
+    deep = [key for key in keys if key[0] == 16]
+    deep_bytes = sum(len(carrental.tile_store.read(*key)) for key in deep)
+    carrental.TILE_EVICT_HIGH_ZOOM_FROM = 16
+    for key in keys:
+        if key[0] == 16:
+            janitor.touched(key)
+    budget = carrental.TILE_CACHE_MAX_BYTES = max(total - deep_bytes // 2, 1)
+    janitor.run_once()
+    evicted_tiles = janitor.evicted_tiles
+    _check_tile_budget(budget)
+    shallow_left = sum(carrental.tile_store.contains(*key) for key in keys if key[0] == 12)
+    print(
+        f"high zoom first: evicted {evicted_tiles} tiles; {shallow_left} of {len(keys) - len(deep)} "
+        f"zoom 12 tiles kept although every zoom 16 tile was used more recently"
+    )
+    if shallow_left != len(keys) - len(deep):
+        raise SystemExit("Low zoom tiles were evicted before high zoom ones")
+    print(janitor.stats())
+
+    # Timed last: noting thousands of reads makes every tile recently used.
+    kept = [key for key in keys if carrental.tile_store.contains(*key)]
+    reads = iter(rng.choice(kept) for _ in range(args.requests))
+    noted = statistics.median(time_calls("note access in memory", lambda: janitor.touched(next(reads)), args.requests))
+    reads = iter(rng.choice(kept) for _ in range(args.requests))
+    touched = statistics.median(time_calls(
+        "os.utime on the tile file", lambda: os.utime(carrental.tile_store.path(*next(reads))), args.requests
+    ))
+    print(f"access tracking speed-up (median): {touched / noted:.0f}x")
+    walk = statistics.median(time_calls(
+        "size by walking the tree", lambda: sum(size for *_, size, _ in carrental.tile_store.scan()), 5
+    ))
+    indexed = statistics.median(time_calls("size from the index", janitor._index.usage, 5))
+    print(f"cache size lookup speed-up (median): {walk / indexed:.0f}x")
+
+
+def start_offload_standin(upstream: str, locations: Dict[str, Path]) -> Tuple[str, Counter]:
+    """Run an nginx-like proxy in front of ``upstream``; return its base URL and traffic counters.
+
+    ``locations`` maps internal URI prefixes to directories, like
+    ``location /prefix/ { internal; alias dir/; }``: clients asking for them get
+    a 404, while an ``X-Accel-Redirect`` (or an ``X-Sendfile`` path inside one of
+    the directories) from the app is answered by sending that file with
+    ``socket.sendfile``. ``app_body_bytes`` counts the body bytes the app wrote.
+    """
+    counts: Counter = Counter()
+    parsed = urlsplit(upstream)
+    roots = {prefix: root.resolve() for prefix, root in locations.items()}
+    hop_headers = {"connection", "content-length", "keep-alive", "transfer-encoding", "x-accel-redirect", "x-sendfile"}
+
+    def resolve(uri: Optional[str], path: Optional[str]) -> Optional[Path]:
+        if uri is not None:
+            uri = unquote(uri)
+            for prefix, root in roots.items():
+                if uri.startswith(prefix):
+                    path = str(root.joinpath(uri[len(prefix):]))
+        if path is None:
+            return None
+        target = Path(os.path.normpath(path))
+        if not any(target.is_relative_to(root) for root in roots.values()):
+            return None
+        return target if target.is_file() else None
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self) -> None:
+            super().setup()
+            self.upstream = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+
+        def do_GET(self) -> None:
+            if any(self.path.startswith(prefix) for prefix in roots):
+                self.reply(404, [], None)
+                return
+            forwarded = {name: value for name, value in self.headers.items() if name.lower() not in hop_headers}
+            self.upstream.request("GET", self.path, headers=forwarded)
+            response = self.upstream.getresponse()
+            body = response.read()
+            counts["app_body_bytes"] += len(body)
+            headers = [(name, value) for name, value in response.getheaders() if name.lower() not in hop_headers]
+            accel, sendfile = response.getheader("X-Accel-Redirect"), response.getheader("X-Sendfile")
+            if accel is None and sendfile is None:
+                self.reply(response.status, headers, body)
+                return
+            counts["offloaded"] += 1
+            target = resolve(accel, sendfile)
+            if target is None:
+                self.reply(404, [], None)
+                return
+            self.send_response(response.status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(target.stat().st_size))
+            self.end_headers()
+            with target.open("rb") as handle:
+                counts["proxy_body_bytes"] += self.connection.sendfile(handle)
+
+        def reply(self, status: int, headers: List[Tuple[str, str]], body: Optional[bytes]) -> None:
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body or b"")))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def log_message(self, *_: object) -> None:
+            pass
+
+    class Server(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 256
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    atexit.register(server.shutdown)
+    return f"http://127.0.0.1:{server.server_address[1]}", counts
+
+
+def bench_fileserve(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    keys = seed_tiles(args.tiles, rng)
+    carrental.UPLOAD_ROOT = BENCH_ROOT.joinpath("uploads")
+    photos = carrental.UPLOAD_ROOT.joinpath("cars")
+    photos.mkdir(parents=True)
+    uploads = []
+    for index in range(args.uploads):
+        photos.joinpath(f"car-{index}.jpg").write_bytes(rng.randbytes(rng.randrange(200 * 1024, 2 * 1024 * 1024)))
+        uploads.append(f"cars/car-{index}.jpg")
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *_: object) -> None:
+            pass
+
+    server = make_server("127.0.0.1", 0, carrental.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    atexit.register(server.shutdown)
+    base, counts = start_offload_standin(
+        f"http://127.0.0.1:{server.server_port}",
+        {
+            carrental.X_ACCEL_TILES_LOCATION: carrental.tile_store.root,
+            carrental.X_ACCEL_UPLOADS_LOCATION: carrental.UPLOAD_ROOT,
+        },
+    )
+    print(f"{len(keys)} tiles and {len(uploads)} uploads behind an nginx-style stand-in proxy")
+    tile_paths = [f"/map/tiles/{z}/{x}/{y}.png" for z, x, y in keys]
+    upload_paths = [f"/uploads/{name}" for name in uploads]
+    expected = {path: carrental.tile_store.read(*key) for path, key in zip(tile_paths, keys)}
+    expected.update({path: carrental.UPLOAD_ROOT.joinpath(name).read_bytes() for path, name in zip(upload_paths, uploads)})
+
+    for mode in ("python", "sendfile", "x-accel", "x-sendfile"):
+        carrental.FILE_SERVING_MODE = mode
+        carrental.tile_memory_cache.clear()
+        client = requests.Session()
+        for path in tile_paths + upload_paths:
+            response = client.get(base + path)
+            leaked = {"x-accel-redirect", "x-sendfile"} & {name.lower() for name in response.headers}
+            if response.status_code != 200 or response.content != expected[path] or leaked:
+                raise SystemExit(f"{mode}: {path} answered {response.status_code} with wrong bytes or {leaked}")
+        counts.clear()
+        tiles = iter(rng.choice(tile_paths) for _ in range(args.requests))
+        time_calls(f"{mode}: tile", lambda: client.get(base + next(tiles)).content, args.requests)
+        photos_seq = iter(rng.choice(upload_paths) for _ in range(args.requests // 10))
+        time_calls(f"{mode}: upload", lambda: client.get(base + next(photos_seq)).content, args.requests // 10)
+        print(
+            f"{mode}: app wrote {counts['app_body_bytes'] / 1e6:.1f} MB of bodies, proxy sent "
+            f"{counts['proxy_body_bytes'] / 1e6:.1f} MB itself for {counts['offloaded']} responses"
+        )
+        if mode in ("x-accel", "x-sendfile") and counts["app_body_bytes"]:
+            raise SystemExit(f"{mode}: the app still copied file bytes")
+
+    carrental.FILE_SERVING_MODE = "x-accel"
+    first = requests.get(base + tile_paths[0])
+    revalidated = requests.get(base + tile_paths[0], headers={"If-None-Match": first.headers["ETag"]})
+    internal = requests.get(base + carrental.X_ACCEL_TILES_LOCATION + "{}/{}/{}.png".format(*keys[0]))
+    escape = requests.get(base + "/uploads/..%2f..%2fapp.py")
+    if (revalidated.status_code, internal.status_code, escape.status_code) != (304, 404, 404):
+        raise SystemExit(f"Expected 304/404/404, got {revalidated.status_code}/{internal.status_code}/{escape.status_code}")
+    print("every mode served identical bytes; 304s, internal locations and path escapes behave")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark car rental hot paths.")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed for generated data.")
+    sub = parser.add_subparsers(dest="cmd")
+
+    spatial = sub.add_parser("spatial", help="Radius search: grid / R*Tree prefilter vs full scan.")
+    spatial.add_argument("--cars", type=int, default=20000)
+    spatial.add_argument("--queries", type=int, default=200)
+    spatial.add_argument("--radius", type=float, default=10.0)
+    spatial.set_defaults(func=bench_spatial)
+
+    distance = sub.add_parser("distance", help="Distance ranking: NumPy batch vs scalar loop.")
+    distance.add_argument("--points", type=int, default=50000)
+    distance.add_argument("--radius", type=float, default=50.0)
+    distance.add_argument("--repeat", type=int, default=20)
+    distance.set_defaults(func=bench_distance)
+
+    availability = sub.add_parser("availability", help="Trip-window search with many rentals per car.")
+    availability.add_argument("--cars", type=int, default=1000)
+    availability.add_argument("--rentals-per-car", type=int, default=20)
+    availability.add_argument("--horizon-days", type=int, default=365)
+    availability.add_argument("--queries", type=int, default=50)
+    availability.add_argument("--radius", type=float, default=25.0)
+    availability.set_defaults(func=bench_availability)
+
+    pricing = sub.add_parser("pricing", help="Batch quotes vs calculate_pricing, with a parity check.")
+    pricing.add_argument("--cases", type=int, default=2000)
+    pricing.add_argument("--cars", type=int, default=500)
+    pricing.add_argument("--repeat", type=int, default=50)
+    pricing.add_argument("--check-only", action="store_true", help="Run the parity check and skip the timings.")
+    pricing.set_defaults(func=bench_pricing)
+
+    fleetmap = sub.add_parser("fleetmap", help="Admin map: clustered grid vs shipping every car.")
+    fleetmap.add_argument("--cars", type=int, default=100000)
+    fleetmap.add_argument("--repeat", type=int, default=50)
+    fleetmap.set_defaults(func=bench_fleetmap)
+
+    searchlog = sub.add_parser("searchlog", help="Search event logging: batch writer vs inline inserts.")
+    searchlog.add_argument("--events", type=int, default=2000)
+    searchlog.set_defaults(func=bench_searchlog)
+
+    visitlog = sub.add_parser("visitlog", help="Visit logging: batch writer vs per-request insert + commit.")
+    visitlog.add_argument("--visits", type=int, default=2000)
+    visitlog.add_argument("--visitors", type=int, default=300)
+    visitlog.add_argument("--max-pending", type=int, default=200)
+    visitlog.add_argument("--shutdown-visits", type=int, default=500)
+    visitlog.set_defaults(func=bench_visitlog)
+
+    tiles = sub.add_parser("tiles", help="Tile serving: in-memory LRU vs disk cache reads.")
+    tiles.add_argument("--tiles", type=int, default=4000)
+    tiles.add_argument("--requests", type=int, default=20000)
+    tiles.add_argument("--memory-mb", type=int, default=16)
+    tiles.set_defaults(func=bench_tiles)
+
+    tilestore = sub.add_parser("tilestore", help="Tile storage: MBTiles file vs z/x/y.png tree, after migration.")
+    tilestore.add_argument("--tiles", type=int, default=5000)
+    tilestore.add_argument("--reads", type=int, default=20000)
+    tilestore.set_defaults(func=bench_tilestore)
+
+    tilestorm = sub.add_parser("tilestorm", help="Concurrent misses on the same tiles: single-flight + lock files.")
+    tilestorm.add_argument("--tiles", type=int, default=8)
+    tilestorm.add_argument("--clients", type=int, default=32)
+    tilestorm.add_argument("--workers", type=int, default=4)
+    tilestorm.add_argument("--latency-ms", type=int, default=150)
+    tilestorm.set_defaults(func=bench_tilestorm)
+
+    tilehttp = sub.add_parser("tilehttp", help="Tile responses: 304 revalidation and stale-while-revalidate.")
+    tilehttp.add_argument("--tiles", type=int, default=200)
+    tilehttp.add_argument("--requests", type=int, default=2000)
+    tilehttp.add_argument("--latency-ms", type=int, default=150)
+    tilehttp.set_defaults(func=bench_tilehttp)
+
+    tileupstream = sub.add_parser("tileupstream", help="Tile upstream: keep-alive pool, negative cache, breaker.")
+    tileupstream.add_argument("--requests", type=int, default=200)
+    tileupstream.add_argument("--latency-ms", type=int, default=2)
+    tileupstream.add_argument("--handshake-ms", type=int, default=40, help="Simulated TCP + TLS setup per connection")
+    tileupstream.add_argument("--outage-latency-ms", type=int, default=300)
+    tileupstream.set_defaults(func=bench_tileupstream)
+
+    tileevict = sub.add_parser("tileevict", help="Tile disk budget: batched access notes and LRU eviction.")
+    tileevict.add_argument("--tiles", type=int, default=4000)
+    tileevict.add_argument("--requests", type=int, default=20000)
+    tileevict.add_argument("--budget-percent", type=int, default=50)
+    tileevict.set_defaults(func=bench_tileevict)
+
+    fileserve = sub.add_parser("fileserve", help="Tiles and uploads: Python bytes vs sendfile / X-Accel-Redirect.")
+    fileserve.add_argument("--tiles", type=int, default=500)
+    fileserve.add_argument("--uploads", type=int, default=20)
+    fileserve.add_argument("--requests", type=int, default=1000)
+    fileserve.set_defaults(func=bench_fileserve)
+
+    args = parser.parse_args()
+    if hasattr(args, "func"):
+        args.func(args)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Pre-fill the OSM tile cache for an area so first visitors never wait on upstream.
+
+Seed a bounding box, or a few cities from the ``cities`` table, for a range of
+zoom levels:
+
+    python seed_tiles.py --bbox 77.0,28.4,77.4,28.8 --min-zoom 10 --max-zoom 14
+    python seed_tiles.py --cities Delhi Mumbai --radius-km 20 --max-zoom 15
+
+Tiles already in the cache are skipped, so an interrupted run simply picks up
+where it stopped when started again. Requests go through a small thread pool
+behind a shared rate limit. Please respect the tile server's usage policy:
+https://operations.osmfoundation.org/policies/tiles/
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from math import cos, floor, log, pi, radians, tan
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import requests
+
+from tile_store import (
+    DATA_ROOT,
+    TILE_CACHE_BACKEND,
+    TILE_CACHE_BACKENDS,
+    TILE_CACHE_ROOT,
+    TILE_INDEX_PATH,
+    TILE_MBTILES_PATH,
+    TILE_URL_TEMPLATE,
+    TILE_USER_AGENT,
+    TileCacheIndex,
+    open_tile_store,
+)
+
+DB_PATH = Path(os.environ.get("CARRENTAL_DB_PATH") or DATA_ROOT.joinpath("car_rental.db"))
+MAX_TILE_ZOOM = 19
+KM_PER_DEGREE_LATITUDE = 111.195
+MAX_LATITUDE = 85.05112878
+FETCH_TIMEOUT_SECONDS = 10
+FETCH_ATTEMPTS = 3
+
+BBox = Tuple[float, float, float, float]
+
+
+def tile_xy(latitude: float, longitude: float, z: int) -> Tuple[int, int]:
+    """Return the XYZ tile containing a point at zoom ``z``."""
+    scale = 1 << z
+    lat = radians(min(MAX_LATITUDE, max(-MAX_LATITUDE, latitude)))
+    x = int(floor((longitude + 180.0) / 360.0 * scale))
+    y = int(floor((1.0 - log(tan(lat) + 1.0 / cos(lat)) / pi) / 2.0 * scale))
+    return min(scale - 1, max(0, x)), min(scale - 1, max(0, y))
+
+
+def tiles_for_bbox(bbox: BBox, z: int) -> Iterator[Tuple[int, int, int]]:
+    west, south, east, north = bbox
+    min_x, min_y = tile_xy(north, west, z)
+    max_x, max_y = tile_xy(south, east, z)
+    for x in range(min_x, max_x + 1):
+        for y in range(min_y, max_y + 1):
+            yield z, x, y
+
+
+def plan_tiles(boxes: List[BBox], min_zoom: int, max_zoom: int) -> List[Tuple[int, int, int]]:
+    """Every tile covering ``boxes`` from ``min_zoom`` to ``max_zoom``, low zooms first, without repeats."""
+    seen: Set[Tuple[int, int, int]] = set()
+    planned: List[Tuple[int, int, int]] = []
+    for z in range(min_zoom, max_zoom + 1):
+        for bbox in boxes:
+            for tile in tiles_for_bbox(bbox, z):
+                if tile not in seen:
+                    seen.add(tile)
+                    planned.append(tile)
+    return planned
+
+
+def parse_bbox(raw: str) -> BBox:
+    try:
+        west, south, east, north = (float(part) for part in raw.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError("bbox must be west,south,east,north") from None
+    if not (west < east and south < north):
+        raise argparse.ArgumentTypeError("bbox must satisfy west < east and south < north")
+    return west, south, east, north
+
+
+def city_bbox(name: str, radius_km: float) -> Optional[BBox]:
+    """Box of ``radius_km`` around a city, picked like the app's city lookup."""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        row = conn.execute(
+            """
+            SELECT latitude, longitude FROM cities
+            WHERE name = ? COLLATE NOCASE AND latitude IS NOT NULL AND longitude IS NOT NULL
+            ORDER BY (pincode IS NULL), pincode, id
+            LIMIT 1
+            """,
+            (name.strip(),),
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    latitude, longitude = float(row[0]), float(row[1])
+    lat_span = radius_km / KM_PER_DEGREE_LATITUDE
+    lng_span = radius_km / (KM_PER_DEGREE_LATITUDE * max(0.01, cos(radians(latitude))))
+    return longitude - lng_span, latitude - lat_span, longitude + lng_span, latitude + lat_span
+
+
+class RateLimiter:
+    """Spread requests from all threads at most ``rate`` per second apart."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self.interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+    def back_off(self, seconds: float) -> None:
+        with self._lock:
+            self._next_at = max(self._next_at, time.monotonic() + seconds)
+
+
+class TileSeeder:
+    def __init__(self, store, tile_url: str, user_agent: str, limiter: RateLimiter) -> None:
+        self.store = store
+        self.tile_url = tile_url
+        self.limiter = limiter
+        self._local = threading.local()
+        self.user_agent = user_agent
+        self.counts: Dict[str, int] = {"fetched": 0, "skipped": 0, "missing": 0, "failed": 0}
+        self.bytes_fetched = 0
+        self.stored: List[Tuple[int, int, int, int, int]] = []
+        self._lock = threading.Lock()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers["User-Agent"] = self.user_agent
+            self._local.session = session
+        return session
+
+    def _count(self, outcome: str, size: int = 0) -> None:
+        with self._lock:
+            self.counts[outcome] += 1
+            self.bytes_fetched += size
+
+    def seed(self, z: int, x: int, y: int) -> str:
+        if self.store.contains(z, x, y):
+            self._count("skipped")
+            return "skipped"
+        url = self.tile_url.format(z=z, x=x, y=y)
+        for attempt in range(FETCH_ATTEMPTS):
+            self.limiter.wait()
+            try:
+                response = self._session().get(url, timeout=FETCH_TIMEOUT_SECONDS)
+            except requests.RequestException:
+                time.sleep(2 ** attempt)
+                continue
+            if response.status_code == 200 and response.content:
+                tile = self.store.write(z, x, y, response.content)
+                with self._lock:
+                    self.stored.append((z, x, y, len(tile.data), tile.modified))
+                self._count("fetched", len(response.content))
+                return "fetched"
+            if response.status_code == 404:
+                self._count("missing")
+                return "missing"
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_after = response.headers.get("Retry-After", "")
+                self.limiter.back_off(float(retry_after) if retry_after.isdigit() else 2.0 ** (attempt + 1))
+                continue
+            break
+        self._count("failed")
+        return "failed"
+
+
+def format_progress(done: int, total: int, seeder: TileSeeder, started: float) -> str:
+    elapsed = max(time.monotonic() - started, 1e-6)
+    rate = done / elapsed
+    eta = (total - done) / rate if rate else 0.0
+    counts = seeder.counts
+    return (
+        f"{done}/{total} tiles ({done / total:.0%}) "
+        f"fetched={counts['fetched']} skipped={counts['skipped']} "
+        f"missing={counts['missing']} failed={counts['failed']} "
+        f"{seeder.bytes_fetched / 1e6:.1f} MB {rate:.1f} tiles/s eta {eta:.0f}s"
+    )
+
+
+def run(tiles: List[Tuple[int, int, int]], seeder: TileSeeder, concurrency: int, progress_seconds: float) -> int:
+    """Seed ``tiles`` with at most ``concurrency`` fetches in flight; return the number done."""
+    started = last_report = time.monotonic()
+    total = len(tiles)
+    done = 0
+    pending: Set[Future] = set()
+    remaining = iter(tiles)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="seed") as pool:
+        try:
+            while True:
+                # Keep the queue short so an interrupt does not leave thousands of submitted jobs.
+                while len(pending) < concurrency * 2:
+                    tile = next(remaining, None)
+                    if tile is None:
+                        break
+                    pending.add(pool.submit(seeder.seed, *tile))
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    future.result()
+                    done += 1
+                if time.monotonic() - last_report >= progress_seconds:
+                    print(format_progress(done, total, seeder, started), flush=True)
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            print("\nInterrupted; run the same command again to resume.", file=sys.stderr)
+            raise
+    print(format_progress(done, total, seeder, started), flush=True)
+    return done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-fill the OSM tile cache for an area and zoom range.")
+    area = parser.add_mutually_exclusive_group(required=True)
+    area.add_argument("--bbox", type=parse_bbox, action="append", help="west,south,east,north (repeatable)")
+    area.add_argument("--cities", nargs="+", help="City names from the cities table")
+    parser.add_argument("--radius-km", type=float, default=15.0, help="Area around each city (default 15 km)")
+    parser.add_argument("--min-zoom", type=int, default=10)
+    parser.add_argument("--max-zoom", type=int, default=14)
+    parser.add_argument("--concurrency", type=int, default=2, help="Parallel fetches (default 2)")
+    parser.add_argument("--rate", type=float, default=2.0, help="Maximum requests per second, 0 for no limit")
+    parser.add_argument("--tile-url", default=TILE_URL_TEMPLATE, help="Upstream URL with {z}/{x}/{y}")
+    parser.add_argument("--user-agent", default=TILE_USER_AGENT)
+    parser.add_argument("--backend", choices=TILE_CACHE_BACKENDS, default=TILE_CACHE_BACKEND)
+    parser.add_argument("--tile-root", type=Path, default=TILE_CACHE_ROOT)
+    parser.add_argument("--mbtiles", type=Path, default=TILE_MBTILES_PATH)
+    parser.add_argument("--index", type=Path, default=TILE_INDEX_PATH, help="Disk budget index shared with the app")
+    parser.add_argument("--max-tiles", type=int, default=50000, help="Refuse larger plans (default 50000)")
+    parser.add_argument("--progress-seconds", type=float, default=5.0)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the tiles that would be seeded")
+    args = parser.parse_args()
+
+    if not 0 <= args.min_zoom <= args.max_zoom <= MAX_TILE_ZOOM:
+        parser.error(f"zoom range must satisfy 0 <= min-zoom <= max-zoom <= {MAX_TILE_ZOOM}")
+    if args.concurrency < 1:
+        parser.error("concurrency must be at least 1")
+
+    boxes: List[BBox] = list(args.bbox or [])
+    for name in args.cities or []:
+        bbox = city_bbox(name, args.radius_km)
+        if bbox is None:
+            print(f"City not found in {DB_PATH.name}: {name}", file=sys.stderr)
+            sys.exit(1)
+        boxes.append(bbox)
+
+    tiles = plan_tiles(boxes, args.min_zoom, args.max_zoom)
+    print(f"{len(tiles)} tiles for zoom {args.min_zoom}-{args.max_zoom} over {len(boxes)} area(s).")
+    if args.dry_run:
+        return
+    if len(tiles) > args.max_tiles:
+        print(f"Refusing to seed more than {args.max_tiles} tiles; narrow the area or raise --max-tiles.", file=sys.stderr)
+        sys.exit(1)
+
+    store = open_tile_store(args.backend, args.tile_root, args.mbtiles)
+    seeder = TileSeeder(store, args.tile_url, args.user_agent, RateLimiter(args.rate))
+    try:
+        run(tiles, seeder, args.concurrency, args.progress_seconds)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    finally:
+        # Count the new tiles against the disk budget; an index that was never
+        # built will scan the whole store on the app's first eviction pass anyway.
+        index = TileCacheIndex(args.index, store.location)
+        if index.is_built:
+            index.record(writes=seeder.stored)
+    if seeder.counts["failed"]:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
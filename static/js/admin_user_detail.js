@@ -1,7 +1,12 @@
 document.addEventListener('DOMContentLoaded', () => {
     const MAX_GALLERY_IMAGES = 8;
     const DEFAULT_MAP_VIEW = { lat: 20.5937, lng: 78.9629, zoom: 5 };
-    const CITY_ENTRIES = Array.isArray(window.ADMIN_CITY_ENTRIES) ? window.ADMIN_CITY_ENTRIES : [];
+    let CITY_ENTRIES = [];
+    if (window.CityList) {
+        window.CityList.load().then((entries) => {
+            CITY_ENTRIES = entries;
+        });
+    }
 
     const formatCurrency = (value) => {
         const numeric = Number(value);
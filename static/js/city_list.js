@@ -0,0 +1,83 @@
+(() => {
+    const script = document.currentScript;
+    const listUrl = script ? script.dataset.src || '' : '';
+    const suggestUrl = script ? script.dataset.suggestUrl || '' : '';
+    const SUGGEST_LIMIT = 12;
+    const suggestions = new Map();
+    let pending = null;
+
+    const buildLabel = (entry) => {
+        if (!entry) {
+            return '';
+        }
+        const name = (entry.name || '').trim();
+        const state = (entry.state || '').trim();
+        return state ? `${name}, ${state}` : name;
+    };
+
+    // The full list lives at a content-hashed URL, so every page shares one cached download.
+    const load = () => {
+        if (!pending) {
+            pending = listUrl
+                ? fetch(listUrl, { credentials: 'same-origin' })
+                    .then((response) => (response.ok ? response.json() : []))
+                    .then((entries) => (Array.isArray(entries) ? entries : []))
+                    .catch(() => [])
+                : Promise.resolve([]);
+        }
+        return pending;
+    };
+
+    // Ranked matches from the server; only the typed prefix travels, never the whole list.
+    const suggest = (term, limit = SUGGEST_LIMIT) => {
+        if (!suggestUrl) {
+            return Promise.resolve([]);
+        }
+        const query = (term || '').trim().toLowerCase();
+        const key = `${limit}:${query}`;
+        if (!suggestions.has(key)) {
+            const params = new URLSearchParams({ q: query, limit: String(limit) });
+            suggestions.set(
+                key,
+                fetch(`${suggestUrl}?${params.toString()}`, { credentials: 'same-origin' })
+                    .then((response) => (response.ok ? response.json() : { results: [] }))
+                    .then((payload) => (Array.isArray(payload.results) ? payload.results : []))
+                    .catch(() => {
+                        suggestions.delete(key);
+                        return [];
+                    })
+            );
+        }
+        return suggestions.get(key);
+    };
+
+    const refreshDatalist = (input) => {
+        const datalist = input.list;
+        if (!datalist || !datalist.hasAttribute('data-city-options')) {
+            return;
+        }
+        const term = input.value;
+        suggest(term).then((results) => {
+            if (input.value !== term) {
+                return;
+            }
+            const fragment = document.createDocumentFragment();
+            results.forEach((entry) => {
+                const option = document.createElement('option');
+                option.value = entry.label || buildLabel(entry);
+                fragment.appendChild(option);
+            });
+            datalist.replaceChildren(fragment);
+        });
+    };
+
+    ['focusin', 'input'].forEach((eventName) => {
+        document.addEventListener(eventName, (event) => {
+            if (event.target instanceof HTMLInputElement) {
+                refreshDatalist(event.target);
+            }
+        });
+    });
+
+    window.CityList = { load, suggest, buildLabel };
+})();
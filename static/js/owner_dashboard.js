@@ -11,7 +11,12 @@ document.addEventListener('DOMContentLoaded', () => {
     const deliveryIcon = buildLocationIcon('map-pin-delivery', 'D');
     const carIcon = buildLocationIcon('map-pin-car', 'C');
     const destinationIcon = (index) => buildLocationIcon('map-pin-destination', String(index + 1));
-    const CITY_ENTRIES = Array.isArray(window.OWNER_CITY_ENTRIES) ? window.OWNER_CITY_ENTRIES : [];
+    let CITY_ENTRIES = [];
+    if (window.CityList) {
+        window.CityList.load().then((entries) => {
+            CITY_ENTRIES = entries;
+        });
+    }
 
     const buildCityLabel = (entry) => {
         if (!entry) {
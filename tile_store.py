@@ -0,0 +1,461 @@
+"""Storage backends and upstream settings for the OSM tile cache.
+
+``FileTileStore`` keeps one PNG per tile under ``<root>/z/x/y.png``.
+``MBTilesTileStore`` keeps every tile in one SQLite file using the MBTiles
+layout, which uses far fewer inodes and copies between nodes as one file.
+
+``TileCacheIndex`` is a sidecar SQLite file with the size and last access
+time of every stored tile, so the cache can be trimmed to a disk budget
+without walking the tree.
+
+Import an existing directory tree into an MBTiles file with:
+
+    python tile_store.py migrate --source tile_cache --target data/tiles.mbtiles
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+APP_ROOT = Path(__file__).resolve().parent
+DATA_ROOT = Path(os.environ.get("CARRENTAL_DATA_DIR") or APP_ROOT.joinpath("data"))
+TILE_CACHE_BACKENDS = ("files", "mbtiles")
+TILE_CACHE_ROOT = APP_ROOT.joinpath("tile_cache")
+# "files" keeps tile_cache/z/x/y.png; "mbtiles" keeps every tile in one SQLite file.
+TILE_CACHE_BACKEND = os.environ.get("CARRENTAL_TILE_CACHE_BACKEND", "files").strip().lower()
+TILE_MBTILES_PATH = Path(
+    os.environ.get("CARRENTAL_TILE_MBTILES_PATH") or DATA_ROOT.joinpath("tiles.mbtiles")
+)
+TILE_INDEX_PATH = Path(os.environ.get("CARRENTAL_TILE_INDEX_PATH") or DATA_ROOT.joinpath("tile_index.db"))
+# Upstream tile server; point it at a local stand-in for testing.
+TILE_URL_TEMPLATE = os.environ.get("CARRENTAL_TILE_URL") or "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+TILE_USER_AGENT = "CarRentalNTravel/1.0 (support@carrentalntravel.com)"
+
+
+@dataclass(frozen=True)
+class StoredTile:
+    """Tile bytes plus the whole-second time they were stored, used for HTTP validators."""
+
+    data: bytes
+    modified: int
+
+    @property
+    def etag(self) -> str:
+        return tile_etag(self.modified, len(self.data))
+
+
+def tile_etag(modified: int, size: int) -> str:
+    # Metadata only: a refreshed tile always gets a new timestamp, so no hashing needed.
+    return f"{modified:x}-{size:x}"
+
+
+def tms_row(z: int, y: int) -> int:
+    """MBTiles stores rows bottom-up (TMS); the map requests them top-down (XYZ)."""
+    return (1 << z) - 1 - y
+
+
+class FileTileStore:
+    """One file per tile under ``root``."""
+
+    backend = "files"
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        self.location = f"files:{self.root.resolve()}"
+
+    def path(self, z: int, x: int, y: int) -> Path:
+        return self.root.joinpath(str(z), str(x), f"{y}.png")
+
+    def contains(self, z: int, x: int, y: int) -> bool:
+        return self.path(z, x, y).is_file()
+
+    def read(self, z: int, x: int, y: int) -> Optional[bytes]:
+        try:
+            return self.path(z, x, y).read_bytes()
+        except OSError:
+            return None
+
+    def read_tile(self, z: int, x: int, y: int) -> Optional[StoredTile]:
+        try:
+            with self.path(z, x, y).open("rb") as handle:
+                modified = int(os.fstat(handle.fileno()).st_mtime)
+                return StoredTile(handle.read(), modified)
+        except OSError:
+            return None
+
+    def write(self, z: int, x: int, y: int, data: bytes, modified: Optional[int] = None) -> StoredTile:
+        tile = StoredTile(data, int(time.time()) if modified is None else modified)
+        path = self.path(z, x, y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Readers in other workers must never see a half-written tile.
+        partial = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+        partial.write_bytes(data)
+        os.utime(partial, (tile.modified, tile.modified))
+        os.replace(partial, path)
+        return tile
+
+    def delete(self, z: int, x: int, y: int) -> int:
+        """Remove a tile and return the bytes freed (0 if it was already gone)."""
+        path = self.path(z, x, y)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return 0
+        return size
+
+    def scan(self) -> Iterator[Tuple[int, int, int, int, int]]:
+        """Yield ``(z, x, y, size, modified)`` for every stored tile."""
+        for z, x, y, path in self.iter_tiles():
+            try:
+                info = path.stat()
+            except OSError:
+                continue
+            yield z, x, y, info.st_size, int(info.st_mtime)
+
+    def iter_tiles(self) -> Iterator[Tuple[int, int, int, Path]]:
+        """Yield ``(z, x, y, path)`` for every tile file, skipping anything else."""
+        if not self.root.is_dir():
+            return
+        for z_dir in self.root.iterdir():
+            if not (z_dir.is_dir() and z_dir.name.isdigit()):
+                continue
+            for x_dir in z_dir.iterdir():
+                if not (x_dir.is_dir() and x_dir.name.isdigit()):
+                    continue
+                for tile in x_dir.iterdir():
+                    if tile.suffix == ".png" and tile.stem.isdigit():
+                        yield int(z_dir.name), int(x_dir.name), int(tile.stem), tile
+
+
+class MBTilesTileStore:
+    """Tiles in a single SQLite file using the MBTiles 1.3 schema.
+
+    Each thread gets its own connection. WAL mode lets workers keep reading
+    while another one writes a tile.
+    """
+
+    backend = "mbtiles"
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.location = f"mbtiles:{self.path.resolve()}"
+        self._local = threading.local()
+        conn = self._connect()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tiles (
+                    zoom_level INTEGER,
+                    tile_column INTEGER,
+                    tile_row INTEGER,
+                    tile_data BLOB,
+                    updated_at INTEGER
+                )
+                """
+            )
+            try:
+                conn.execute("ALTER TABLE tiles ADD COLUMN updated_at INTEGER")
+            except sqlite3.OperationalError:
+                pass
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row)"
+            )
+            if conn.execute("SELECT 1 FROM metadata LIMIT 1").fetchone() is None:
+                conn.executemany(
+                    "INSERT INTO metadata (name, value) VALUES (?, ?)",
+                    [("name", "OpenStreetMap tile cache"), ("format", "png"), ("type", "baselayer")],
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def contains(self, z: int, x: int, y: int) -> bool:
+        return self._connect().execute(
+            "SELECT 1 FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, tms_row(z, y)),
+        ).fetchone() is not None
+
+    def read(self, z: int, x: int, y: int) -> Optional[bytes]:
+        row = self._connect().execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, tms_row(z, y)),
+        ).fetchone()
+        return bytes(row[0]) if row is not None else None
+
+    def read_tile(self, z: int, x: int, y: int) -> Optional[StoredTile]:
+        row = self._connect().execute(
+            "SELECT tile_data, updated_at FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, tms_row(z, y)),
+        ).fetchone()
+        # Tiles imported before updated_at existed count as stale and get refreshed.
+        return StoredTile(bytes(row[0]), int(row[1] or 0)) if row is not None else None
+
+    def write(self, z: int, x: int, y: int, data: bytes, modified: Optional[int] = None) -> StoredTile:
+        tile = StoredTile(data, int(time.time()) if modified is None else modified)
+        self.write_many([(z, x, y, data, tile.modified)])
+        return tile
+
+    def write_many(self, tiles: Iterable[Tuple[int, int, int, bytes, int]]) -> None:
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                ((z, x, tms_row(z, y), sqlite3.Binary(data), modified) for z, x, y, data, modified in tiles),
+            )
+
+    def delete(self, z: int, x: int, y: int) -> int:
+        """Remove a tile and return its size; freed pages are reused by later writes."""
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                "SELECT length(tile_data) FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, tms_row(z, y)),
+            ).fetchone()
+            if row is None:
+                return 0
+            conn.execute(
+                "DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, tms_row(z, y)),
+            )
+        return int(row[0] or 0)
+
+    def scan(self) -> Iterator[Tuple[int, int, int, int, int]]:
+        """Yield ``(z, x, y, size, modified)`` for every stored tile."""
+        rows = self._connect().execute(
+            "SELECT zoom_level, tile_column, tile_row, length(tile_data), updated_at FROM tiles"
+        )
+        for z, x, row, size, modified in rows:
+            yield z, x, tms_row(z, row), int(size or 0), int(modified or 0)
+
+    def __len__(self) -> int:
+        return int(self._connect().execute("SELECT COUNT(*) FROM tiles").fetchone()[0])
+
+
+class TileCacheIndex:
+    """Sidecar index of tile sizes and last access times for one tile store.
+
+    Callers batch their updates; nothing here runs per request. The index
+    remembers which store it describes and starts empty again (needing a
+    ``rebuild``) if pointed at a different one.
+    """
+
+    def __init__(self, path: Path, location: str) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.location = location
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS index_meta (name TEXT PRIMARY KEY, value TEXT)")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS tile_usage (
+                        z INTEGER NOT NULL,
+                        x INTEGER NOT NULL,
+                        y INTEGER NOT NULL,
+                        size INTEGER NOT NULL,
+                        last_access INTEGER NOT NULL,
+                        PRIMARY KEY (z, x, y)
+                    ) WITHOUT ROWID
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_tile_usage_access ON tile_usage(last_access)")
+                row = conn.execute("SELECT value FROM index_meta WHERE name = 'location'").fetchone()
+                if row is None or row[0] != location:
+                    conn.execute("DELETE FROM tile_usage")
+                    conn.execute("DELETE FROM index_meta")
+                    conn.execute("INSERT INTO index_meta (name, value) VALUES ('location', ?)", (location,))
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @property
+    def is_built(self) -> bool:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM index_meta WHERE name = 'built_at'").fetchone() is not None
+        finally:
+            conn.close()
+
+    def rebuild(self, store) -> int:
+        """Replace the index with one row per tile in ``store``; returns the tile count."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM tile_usage")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO tile_usage (z, x, y, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    store.scan(),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO index_meta (name, value) VALUES ('built_at', ?)", (str(int(time.time())),)
+                )
+                return int(conn.execute("SELECT COUNT(*) FROM tile_usage").fetchone()[0])
+        finally:
+            conn.close()
+
+    def record(
+        self,
+        writes: Iterable[Tuple[int, int, int, int, int]] = (),
+        accesses: Iterable[Tuple[int, int, int, int]] = (),
+    ) -> None:
+        """Apply batched ``(z, x, y, size, time)`` writes and ``(z, x, y, time)`` reads."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT INTO tile_usage (z, x, y, size, last_access) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(z, x, y) DO UPDATE SET
+                        size = excluded.size,
+                        last_access = MAX(last_access, excluded.last_access)
+                    """,
+                    writes,
+                )
+                conn.executemany(
+                    "UPDATE tile_usage SET last_access = MAX(last_access, ?) WHERE z = ? AND x = ? AND y = ?",
+                    ((at, z, x, y) for z, x, y, at in accesses),
+                )
+        finally:
+            conn.close()
+
+    def usage(self) -> Tuple[int, int]:
+        """Return ``(tiles, bytes)`` currently indexed."""
+        conn = self._connect()
+        try:
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tile_usage").fetchone()
+            return int(count), int(size)
+        finally:
+            conn.close()
+
+    def trim(self, store, target_bytes: int, high_zoom_from: Optional[int] = None, batch: int = 500) -> Tuple[int, int]:
+        """Delete least recently used tiles until the index is at most ``target_bytes``.
+
+        With ``high_zoom_from`` set, tiles at that zoom or deeper go first (still
+        oldest first), because they are the most numerous and cheapest to refetch.
+        Returns ``(tiles, bytes)`` removed.
+        """
+        if high_zoom_from is None:
+            order = "last_access"
+            params: Tuple[int, ...] = ()
+        else:
+            order = "(z < ?), last_access"
+            params = (high_zoom_from,)
+        removed_tiles = removed_bytes = 0
+        conn = self._connect()
+        try:
+            while True:
+                # BEGIN IMMEDIATE serialises evictors running in several workers.
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    total = int(conn.execute("SELECT COALESCE(SUM(size), 0) FROM tile_usage").fetchone()[0])
+                    if total <= target_bytes:
+                        conn.execute("COMMIT")
+                        break
+                    victims: List[Tuple[int, int, int]] = []
+                    freed = 0
+                    candidates = conn.execute(
+                        f"SELECT z, x, y, size FROM tile_usage ORDER BY {order} LIMIT ?", (*params, batch)
+                    ).fetchall()
+                    for z, x, y, size in candidates:
+                        victims.append((z, x, y))
+                        freed += size
+                        if total - freed <= target_bytes:
+                            break
+                    for z, x, y in victims:
+                        removed_bytes += store.delete(z, x, y)
+                    conn.executemany("DELETE FROM tile_usage WHERE z = ? AND x = ? AND y = ?", victims)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                removed_tiles += len(victims)
+                if not victims:
+                    break
+        finally:
+            conn.close()
+        return removed_tiles, removed_bytes
+
+
+def open_tile_store(
+    backend: str = TILE_CACHE_BACKEND,
+    root: Path = TILE_CACHE_ROOT,
+    mbtiles_path: Path = TILE_MBTILES_PATH,
+):
+    """Return the tile store selected by ``backend`` ("files" or "mbtiles")."""
+    if backend == "mbtiles":
+        return MBTilesTileStore(mbtiles_path)
+    if backend != "files":
+        raise ValueError(f"Unknown tile cache backend {backend!r}; expected one of {TILE_CACHE_BACKENDS}")
+    return FileTileStore(root)
+
+
+def migrate(source: Path, target: Path, batch_size: int) -> int:
+    """Copy every tile under ``source`` into the MBTiles file ``target``."""
+    files = FileTileStore(source)
+    store = MBTilesTileStore(target)
+    batch: List[Tuple[int, int, int, bytes, int]] = []
+    copied = 0
+    started = time.monotonic()
+    for z, x, y, path in files.iter_tiles():
+        try:
+            batch.append((z, x, y, path.read_bytes(), int(path.stat().st_mtime)))
+        except OSError as exc:
+            print(f"Skipping {path}: {exc}", file=sys.stderr)
+            continue
+        if len(batch) >= batch_size:
+            store.write_many(batch)
+            copied += len(batch)
+            batch.clear()
+            print(f"  {copied} tiles copied …", flush=True)
+    if batch:
+        store.write_many(batch)
+        copied += len(batch)
+    print(f"Copied {copied} tiles into {target} in {time.monotonic() - started:.1f}s.")
+    return copied
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the OSM tile cache.")
+    sub = parser.add_subparsers(dest="cmd")
+    migrate_parser = sub.add_parser("migrate", help="Import a z/x/y.png directory tree into an MBTiles file.")
+    migrate_parser.add_argument("--source", type=Path, default=TILE_CACHE_ROOT)
+    migrate_parser.add_argument("--target", type=Path, default=TILE_MBTILES_PATH)
+    migrate_parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    if args.cmd != "migrate":
+        parser.print_help()
+        sys.exit(1)
+    if not args.source.is_dir():
+        print(f"No tile directory at {args.source}", file=sys.stderr)
+        sys.exit(1)
+    migrate(args.source, args.target, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()